@@ -0,0 +1,54 @@
+import io
+import logging
+import timeit
+from django.core.management.base import BaseCommand
+from todo_project.log import JSONFormatter, SampledLogger
+
+PAYLOAD = {'title': 'Write report', 'description': 'Quarterly numbers', 'due_date': '2025-05-01', 'completed': False}
+
+
+class Command(BaseCommand):
+    help = 'Measure the per-call cost of the task payload log line against the old print().'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=200000)
+
+    def handle(self, *args, **options):
+        calls = options['calls']
+        sink = io.StringIO()
+
+        base = logging.getLogger('bench.tasks')
+        base.propagate = False
+        handler = logging.StreamHandler(sink)
+        handler.setFormatter(JSONFormatter())
+        base.addHandler(handler)
+
+        def old_print():
+            print(f"Received data: {PAYLOAD}", file=sink)
+
+        cases = [
+            ('print()', None, None),
+            # The shipped configuration: DEBUG disabled for the tasks loggers
+            ('disabled level', logging.INFO, 0.01),
+            # DEBUG switched on with the configured 1% sampling
+            ('enabled, 1% sampled', logging.DEBUG, 0.01),
+            # DEBUG switched on without sampling, every call formatted as JSON
+            ('enabled, unsampled', logging.DEBUG, 1.0),
+        ]
+
+        for name, level, rate in cases:
+            if level is None:
+                fn = old_print
+            else:
+                base.setLevel(level)
+                logger = SampledLogger(base, rate)
+
+                def fn():
+                    logger.debug('Received task data: %s', PAYLOAD)
+
+            seconds = timeit.timeit(fn, number=calls)
+            sink.seek(0)
+            sink.truncate()
+            self.stdout.write(f'{name:22} {seconds / calls * 1e9:10.0f} ns/call')
+
+        base.removeHandler(handler)
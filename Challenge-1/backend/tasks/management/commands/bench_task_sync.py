@@ -0,0 +1,85 @@
+import datetime
+import json
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from tasks.models import Task
+
+
+class Command(BaseCommand):
+    help = (
+        'Time a full create/update/delete sync of N tasks through per-item API '
+        'calls and through the bulk endpoints, on a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=1000,
+                            help='Tasks per sync (default: 1000)')
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # ALLOWED_HOSTS is empty in development, which only admits localhost
+            client = Client(SERVER_NAME='localhost')
+            payload = [
+                {'title': f'Task {i}', 'description': 'synced', 'due_date': str(datetime.date.today())}
+                for i in range(options['tasks'])
+            ]
+            per_item = self.sync_per_item(client, payload)
+            Task.objects.all().delete()
+            bulk = self.sync_bulk(client, payload)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        for phase in ('create', 'update', 'delete'):
+            self.stdout.write(
+                f'{phase:7} per-item {per_item[phase]:8.3f}s   bulk {bulk[phase]:8.3f}s   '
+                f'({per_item[phase] / bulk[phase]:.1f}x)'
+            )
+
+    def timed(self, results, phase, fn):
+        start = time.perf_counter()
+        fn()
+        results[phase] = time.perf_counter() - start
+
+    def sync_per_item(self, client, payload):
+        results = {}
+        ids = []
+
+        def create():
+            for item in payload:
+                ids.append(client.post('/api/tasks/', item, content_type='application/json').json()['id'])
+
+        def update():
+            for task_id in ids:
+                client.patch(f'/api/tasks/{task_id}/', {'completed': True}, content_type='application/json')
+
+        def delete():
+            for task_id in ids:
+                client.delete(f'/api/tasks/{task_id}/')
+
+        self.timed(results, 'create', create)
+        self.timed(results, 'update', update)
+        self.timed(results, 'delete', delete)
+        return results
+
+    def sync_bulk(self, client, payload):
+        results = {}
+        ids = []
+
+        def create():
+            response = client.post('/api/tasks/bulk/', json.dumps(payload), content_type='application/json')
+            ids.extend(task['id'] for task in response.json())
+
+        def update():
+            client.patch('/api/tasks/bulk/', [{'id': task_id, 'completed': True} for task_id in ids],
+                         content_type='application/json')
+
+        def delete():
+            client.delete('/api/tasks/bulk/', {'ids': ids}, content_type='application/json')
+
+        self.timed(results, 'create', create)
+        self.timed(results, 'update', update)
+        self.timed(results, 'delete', delete)
+        return results
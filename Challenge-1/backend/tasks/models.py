@@ -6,5 +6,13 @@ class Task(models.Model):
     due_date = models.DateField()
     completed = models.BooleanField(default=False)
 
+    class Meta:
+        # Django renders boolean filters as bare "completed" / "NOT completed",
+        # which SQLite only matches against partial indexes, not a composite key
+        indexes = [
+            models.Index(fields=['due_date'], condition=models.Q(completed=False), name='tasks_task_open_due_idx'),
+            models.Index(fields=['due_date'], condition=models.Q(completed=True), name='tasks_task_done_due_idx'),
+        ]
+
     def __str__(self):
         return self.title
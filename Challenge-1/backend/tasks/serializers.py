@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from .models import Task
 from datetime import datetime
+from todo_project.log import get_logger
+
+logger = get_logger(__name__)
 
 class TaskSerializer(serializers.ModelSerializer):
     class Meta:
@@ -19,7 +22,7 @@ class TaskSerializer(serializers.ModelSerializer):
     
     def to_internal_value(self, data):
         """
-        Print received data for debugging
+        Log received data for debugging (DEBUG level, off by default)
         """
-        print(f"Received data: {data}")
-        return super().to_internal_value(data) 
\ No newline at end of file
+        logger.debug('Received task data: %s', data)
+        return super().to_internal_value(data)
@@ -1,3 +1,127 @@
+import re
+from datetime import date, timedelta
+from unittest import skipUnless
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from .models import Task
 
-# Create your tests here.
+URL = '/api/tasks/bulk/'
+
+
+def statements(queries):
+    # The transaction.atomic() in each view is a savepoint inside the test's transaction
+    return [query['sql'] for query in queries if 'SAVEPOINT' not in query['sql']]
+
+
+class BulkTaskTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.first = Task.objects.create(title='First', due_date=date(2024, 1, 1))
+        self.second = Task.objects.create(title='Second', due_date=date(2024, 1, 2))
+
+    def test_create(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(URL, [
+                {'title': 'Third', 'due_date': '2024-01-03'},
+                {'title': 'Fourth', 'due_date': '2024-01-04'},
+            ], format='json')
+        self.assertEqual(len(statements(queries)), 1)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([task['title'] for task in response.data], ['Third', 'Fourth'])
+        self.assertEqual(Task.objects.count(), 4)
+
+    def test_create_writes_nothing_if_an_item_is_invalid(self):
+        response = self.client.post(URL, [
+            {'title': 'Third', 'due_date': '2024-01-03'},
+            {'title': 'Fourth'},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'][0], {})
+        self.assertIn('due_date', response.data['errors'][1])
+        self.assertEqual(Task.objects.count(), 2)
+
+    def test_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(URL, [
+                {'id': self.first.id, 'completed': True},
+                {'id': self.second.id, 'title': 'Renamed'},
+            ], format='json')
+        self.assertEqual(response.status_code, 200)
+        # One SELECT of both tasks, one UPDATE of both
+        self.assertEqual(len(statements(queries)), 2)
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertTrue(self.first.completed)
+        self.assertEqual(self.second.title, 'Renamed')
+
+    def test_update_rejects_unknown_ids(self):
+        response = self.client.patch(URL, [
+            {'id': self.first.id, 'completed': True},
+            {'id': 999, 'completed': True},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'], [{}, {'id': ['Task not found.']}])
+        self.first.refresh_from_db()
+        self.assertFalse(self.first.completed)
+
+    def test_update_rejects_repeated_ids(self):
+        response = self.client.patch(URL, [
+            {'id': self.first.id, 'title': 'One'},
+            {'id': self.first.id, 'title': 'Two'},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['errors'], [{}, {'id': ['Task listed more than once.']}])
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.title, 'First')
+
+    def test_update_rejects_boolean_ids(self):
+        response = self.client.patch(URL, [{'id': True, 'title': 'One'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.title, 'First')
+
+    def test_delete(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(URL, {'ids': [self.first.id, 999]}, format='json')
+        self.assertEqual(len(statements(queries)), 1)
+        self.assertEqual(response.data, {'deleted': 1})
+        self.assertEqual(list(Task.objects.values_list('id', flat=True)), [self.second.id])
+
+    def test_delete_rejects_boolean_and_repeated_ids(self):
+        for ids in ([True], [self.first.id, self.first.id], ['1']):
+            response = self.client.delete(URL, {'ids': ids}, format='json')
+            self.assertEqual(response.status_code, 400, ids)
+        self.assertEqual(Task.objects.count(), 2)
+
+
+# Plan lines that mean a query reads a whole table or sorts outside an index
+BAD_PLAN = re.compile(r'\bSCAN (?!.*\bUSING (COVERING )?INDEX\b)|USE TEMP B-TREE')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plan checks only understand SQLite plans')
+class QueryPlanTests(TestCase):
+    """The hot task queries read through an index, never a full scan or a temporary sort."""
+
+    @classmethod
+    def setUpTestData(cls):
+        today = date.today()
+        Task.objects.bulk_create([
+            Task(title=f'Task {i}', due_date=today + timedelta(days=i % 365 - 30), completed=i % 3 == 0)
+            for i in range(2000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_hot_queries_use_indexes(self):
+        today = date.today()
+        hot_queries = [
+            ('open tasks by due date', Task.objects.filter(completed=False).order_by('due_date')[:50]),
+            ('completed tasks by due date', Task.objects.filter(completed=True).order_by('due_date')[:50]),
+            ('overdue open tasks', Task.objects.filter(completed=False, due_date__lt=today)),
+        ]
+        for name, queryset in hot_queries:
+            plan = queryset.explain()
+            with self.subTest(name, plan=plan):
+                self.assertIsNone(BAD_PLAN.search(plan))
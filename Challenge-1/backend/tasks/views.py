@@ -1,7 +1,96 @@
-from rest_framework import viewsets
+from django.db import transaction
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from .models import Task
 from .serializers import TaskSerializer
 
+def is_task_id(value):
+    # bool is a subclass of int, but true is not task 1
+    return type(value) is int
+
+
 class TaskViewSet(viewsets.ModelViewSet):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Create a list of tasks in one transaction.
+
+        Nothing is written unless every item is valid; otherwise the response
+        carries one error dict per item, in request order.
+        """
+        serializer = self.get_serializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            return Response({'errors': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            tasks = Task.objects.bulk_create(
+                [Task(**item) for item in serializer.validated_data]
+            )
+        return Response(self.get_serializer(tasks, many=True).data, status=status.HTTP_201_CREATED)
+
+    @bulk.mapping.patch
+    def bulk_update(self, request):
+        """
+        Partially update a list of tasks, each identified by its ``id``.
+
+        All tasks are loaded in one query and written back with a single
+        ``bulk_update``; any invalid, unknown or repeated item aborts the whole
+        batch.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response({'error': 'Expected a list of items'}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            ids = [item.get('id') for item in items if isinstance(item, dict)]
+            tasks = Task.objects.select_for_update().in_bulk(
+                [task_id for task_id in ids if is_task_id(task_id)]
+            )
+
+            errors = []
+            updated = []
+            fields = set()
+            seen = set()
+            for item in items:
+                task_id = item.get('id') if isinstance(item, dict) else None
+                task = tasks.get(task_id) if is_task_id(task_id) else None
+                if task is None:
+                    errors.append({'id': ['Task not found.']})
+                    continue
+                if task_id in seen:
+                    errors.append({'id': ['Task listed more than once.']})
+                    continue
+                seen.add(task_id)
+                serializer = self.get_serializer(task, data=item, partial=True)
+                if not serializer.is_valid():
+                    errors.append(serializer.errors)
+                    continue
+                errors.append({})
+                for field, value in serializer.validated_data.items():
+                    setattr(task, field, value)
+                fields.update(serializer.validated_data)
+                updated.append(task)
+
+            if any(errors):
+                return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+
+            if fields:
+                Task.objects.bulk_update(updated, fields)
+        return Response(self.get_serializer(updated, many=True).data)
+
+    @bulk.mapping.delete
+    def bulk_destroy(self, request):
+        """Delete every task whose id is listed in ``ids`` with a single query."""
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not all(is_task_id(task_id) for task_id in ids):
+            return Response({'ids': ['Expected a list of task ids.']}, status=status.HTTP_400_BAD_REQUEST)
+        if len(set(ids)) != len(ids):
+            return Response({'ids': ['Task ids must not repeat.']}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            deleted, _ = Task.objects.filter(id__in=ids).delete()
+        return Response({'deleted': deleted})
@@ -0,0 +1,74 @@
+"""
+Logging helpers for the project: a JSON formatter for the LOGGING setting and
+``get_logger()``, which returns a logger sampled at the rate configured for
+its name in ``LOG_SAMPLE_RATES``.
+"""
+import json
+import logging
+import random
+from django.conf import settings
+
+# Attributes every LogRecord has; anything else on a record came from ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """Render a record and its ``extra`` fields as one JSON object per line."""
+
+    def format(self, record):
+        payload = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        payload.update(
+            (key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRS
+        )
+        if record.exc_info:
+            payload['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class SampledLogger(logging.LoggerAdapter):
+    """
+    Logger that keeps roughly ``rate`` of its records below WARNING.
+
+    The sampling decision is taken in ``isEnabledFor``, before a LogRecord is
+    built or any argument is formatted, so a skipped call costs about the same
+    as a disabled level. Warnings and errors are always kept.
+    """
+
+    def __init__(self, logger, rate=1.0):
+        super().__init__(logger, {})
+        self.rate = rate
+
+    def isEnabledFor(self, level):
+        if not self.logger.isEnabledFor(level):
+            return False
+        return level >= logging.WARNING or self.rate >= 1.0 or random.random() < self.rate
+
+    # debug(), the level the task serializer logs payloads at, skips
+    # LoggerAdapter.log/process and hands the caller's arguments, including
+    # ``extra``, straight to the wrapped logger; stacklevel makes the record
+    # point at the caller rather than this module
+
+    def debug(self, msg, *args, stacklevel=1, **kwargs):
+        if self.isEnabledFor(logging.DEBUG):
+            self.logger.debug(msg, *args, stacklevel=stacklevel + 1, **kwargs)
+
+    def process(self, msg, kwargs):
+        return msg, kwargs
+
+
+def get_logger(name):
+    """Return a logger for ``name`` sampled at its most specific configured rate."""
+    rates = getattr(settings, 'LOG_SAMPLE_RATES', {})
+    rate = 1.0
+    prefix = name
+    while prefix:
+        if prefix in rates:
+            rate = rates[prefix]
+            break
+        prefix = prefix.rpartition('.')[0]
+    return SampledLogger(logging.getLogger(name), rate)
@@ -144,3 +144,37 @@ REST_FRAMEWORK = {
         'rest_framework.renderers.BrowsableAPIRenderer',
     ),
 }
+
+# Logging
+# https://docs.djangoproject.com/en/5.2/topics/logging/
+#
+# Records are written as JSON lines. Set the 'tasks' level to DEBUG to see
+# incoming task payloads; LOG_SAMPLE_RATES keeps that affordable under load.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'todo_project.log.JSONFormatter',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json',
+        },
+    },
+    'loggers': {
+        'tasks': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Fraction of records below WARNING kept per logger (see todo_project.log)
+LOG_SAMPLE_RATES = {
+    'tasks.serializers': 0.01,
+}
@@ -0,0 +1,91 @@
+"""
+Stateless access-token authentication.
+
+simplejwt's JWTAuthentication loads the user row on every authenticated
+request. ClaimsJWTAuthentication instead builds request.user from claims
+signed into the token by ``add_user_claims``: the user id, username, active
+flag and token version. The result is a ClaimsUser, a real User instance
+whose other fields are deferred, so a view that touches them costs one query
+and one that doesn't costs none.
+
+Tokens are revoked per user by bumping the user's TokenVersion. Each request
+compares the version in its token with the current one. The current version
+is held in the cache for TOKEN_CLAIMS['VERSION_TTL'] seconds, so with a cache
+that isn't shared between processes a revocation can take that long to reach
+every process. Credential changes (password, username, active flag) revoke
+automatically, see the signals module.
+
+Tokens issued before these claims existed are still accepted, through the
+regular database lookup.
+
+Challenge-4's chat.authentication is the same scheme plus async variants and
+WebSocket auth cache invalidation, which this service has no use for. The
+projects are deployed separately and share no package, so each keeps its own
+copy.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router, transaction
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from .models import ClaimsUser, TokenVersion
+
+TOKEN_CLAIMS = {
+    'VERSION_CACHE': 'default',
+    'VERSION_TTL': 60,  # seconds
+    **getattr(settings, 'TOKEN_CLAIMS', {}),
+}
+
+
+def _version_key(user_id):
+    return f'token_version:{user_id}'
+
+
+def token_version(user_id):
+    """The user's current token version, from the cache when possible."""
+    cache = caches[TOKEN_CLAIMS['VERSION_CACHE']]
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        version = TokenVersion.objects.filter(user_id=user_id).values_list('version', flat=True).first() or 0
+        cache.set(_version_key(user_id), version, TOKEN_CLAIMS['VERSION_TTL'])
+    return version
+
+
+def revoke_tokens(user_id):
+    """Invalidate every token issued to the user so far."""
+    TokenVersion.objects.get_or_create(user_id=user_id)
+    TokenVersion.objects.filter(user_id=user_id).update(version=F('version') + 1)
+    cache = caches[TOKEN_CLAIMS['VERSION_CACHE']]
+    transaction.on_commit(lambda: cache.delete(_version_key(user_id)))
+
+
+def add_user_claims(token, user):
+    """Sign the claims ClaimsJWTAuthentication needs into a refresh token and the access tokens it issues."""
+    token['username'] = user.get_username()
+    token['active'] = user.is_active
+    token['ver'] = token_version(user.pk)
+    return token
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication returning a ClaimsUser built from the token instead of loading the row."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+            username, active, version = validated_token['username'], validated_token['active'], validated_token['ver']
+        except KeyError:
+            # Issued before these claims were added
+            return super().get_user(validated_token)
+
+        if not active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if version != token_version(user_id):
+            raise AuthenticationFailed(_('Token has been revoked'), code='token_revoked')
+
+        values = {api_settings.USER_ID_FIELD: user_id, ClaimsUser.USERNAME_FIELD: username, 'is_active': active}
+        fields = [field.attname for field in ClaimsUser._meta.concrete_fields if field.attname in values]
+        return ClaimsUser.from_db(router.db_for_read(ClaimsUser), fields, [values[name] for name in fields])
@@ -0,0 +1,155 @@
+"""
+Refresh-token blacklist checks answered mostly from memory.
+
+simplejwt asks "is this token blacklisted?" with a query joining
+BlacklistedToken to OutstandingToken on every refresh and logout. Here a
+check goes through, in order:
+
+1. a per-process LRU of tokens the database already reported blacklisted,
+2. the shared cache, which holds every token blacklisted since startup until
+   it expires, so a logout in one process is seen by the others,
+3. a per-process Bloom filter of blacklisted tokens, warmed from the
+   database on first use. A token the filter has never seen is not
+   blacklisted.
+
+Only filter hits the LRU can't answer (false positives, and blacklisted tokens
+evicted from the LRU) reach the database. Blacklisting is permanent, so only
+"blacklisted" answers are kept in the LRU.
+
+Step 3 is only sound when the cache is shared by every server process (Redis,
+Memcached, the database cache) and doesn't evict keys early: otherwise a token
+blacklisted in another process never reaches this process's filter. With a
+per-process cache (local memory, the default, or the dummy cache) the filter is
+skipped and every check the LRU can't answer asks the database.
+"""
+import hashlib
+import math
+import threading
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+
+TOKEN_BLACKLIST_CACHE = {
+    'CACHE': 'default',
+    'CAPACITY': 100_000,  # blacklisted tokens the Bloom filter is sized for
+    'FALSE_POSITIVE_RATE': 0.01,
+    'LRU_SIZE': 10_000,
+    **getattr(settings, 'TOKEN_BLACKLIST_CACHE', {}),
+}
+
+
+class BloomFilter:
+    def __init__(self, capacity, false_positive_rate):
+        self.capacity = capacity
+        self.size = math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # k positions from two halves of one digest (Kirsch-Mitzenmacher)
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        a, b = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little')
+        return [(a + i * b) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class LRUCache:
+    def __init__(self, size):
+        self.size = size
+        self._items = OrderedDict()
+
+    def get(self, key):
+        """Return the cached value, or None if ``key`` isn't cached."""
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        if len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+
+class TokenBlacklist:
+    def __init__(self, config):
+        self.config = config
+        self._lock = threading.Lock()
+        self._filter = None
+        self._answers = LRUCache(config['LRU_SIZE'])
+
+    def _cache_key(self, jti):
+        return f'token_blacklist:{jti}'
+
+    def warm(self):
+        """
+        Rebuild the Bloom filter from the unexpired blacklisted tokens, and seed the
+        LRU with the most recently blacklisted ones; returns how many there are.
+        """
+        jtis = list(
+            BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+            .order_by('id')
+            .values_list('token__jti', flat=True)
+        )
+        bloom = BloomFilter(max(self.config['CAPACITY'], 2 * len(jtis)), self.config['FALSE_POSITIVE_RATE'])
+        for jti in jtis:
+            bloom.add(jti)
+        with self._lock:
+            self._filter = bloom
+            # Newest last, so they are the last to be evicted
+            for jti in jtis[-self.config['LRU_SIZE']:]:
+                self._answers.set(jti, True)
+        return len(jtis)
+
+    def add(self, jti, expires_at):
+        """Record a newly blacklisted token, for this process and in the shared cache."""
+        timeout = max(math.ceil((expires_at - timezone.now()).total_seconds()), 1)
+        caches[self.config['CACHE']].set(self._cache_key(jti), True, timeout)
+        with self._lock:
+            self._answers.set(jti, True)
+            if self._filter is not None:
+                self._filter.add(jti)
+                if self._filter.count > self._filter.capacity:
+                    # Rebuilt, without the tokens that expired since, on the next check
+                    self._filter = None
+
+    def cache_is_shared(self):
+        """Whether the configured cache is visible to every server process."""
+        return not isinstance(caches[self.config['CACHE']], (LocMemCache, DummyCache))
+
+    def contains(self, jti):
+        """Whether the token with this ``jti`` is blacklisted."""
+        with self._lock:
+            if self._answers.get(jti):
+                return True
+        if caches[self.config['CACHE']].get(self._cache_key(jti)):
+            return True
+
+        if self.cache_is_shared():
+            bloom = self._filter
+            if bloom is None:
+                self.warm()
+                bloom = self._filter
+            if jti not in bloom:
+                return False
+
+        blacklisted = BlacklistedToken.objects.filter(token__jti=jti).exists()
+        if blacklisted:
+            with self._lock:
+                self._answers.set(jti, True)
+        return blacklisted
+
+token_blacklist = TokenBlacklist(TOKEN_BLACKLIST_CACHE)
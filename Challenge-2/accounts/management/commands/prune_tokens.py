@@ -0,0 +1,43 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete expired outstanding refresh tokens and their blacklist entries, '
+        'one id range at a time. Meant to run on a schedule, e.g. hourly from cron.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Tokens deleted per transaction (default: 1000)')
+        parser.add_argument('--pause', type=float, default=0.0,
+                            help='Seconds to sleep between batches to spare a busy database (default: 0)')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        expired = OutstandingToken.objects.filter(expires_at__lte=timezone.now())
+        tokens = blacklisted = 0
+        last_id = 0
+        while True:
+            ids = list(
+                expired.filter(pk__gt=last_id).order_by('pk')
+                .values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                _, deleted = OutstandingToken.objects.filter(pk__in=ids).delete()
+            tokens += deleted.get(OutstandingToken._meta.label, 0)
+            blacklisted += deleted.get(BlacklistedToken._meta.label, 0)
+            last_id = ids[-1]
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {tokens} expired tokens ({blacklisted} blacklisted) '
+            f'in {time.perf_counter() - start:.2f}s'
+        ))
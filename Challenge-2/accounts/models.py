@@ -1,3 +1,28 @@
+from django.contrib.auth.models import User
 from django.db import models
 
-# Create your models here.
+
+class TokenVersion(models.Model):
+    """Per-user counter signed into access tokens; bumping it revokes every token issued before."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='token_version')
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.user_id}: {self.version}'
+
+
+class ClaimsUser(User):
+    """
+    A User built from access-token claims by ClaimsJWTAuthentication. Only
+    id, username and is_active are set; the first access to any other field
+    loads all of them in one query.
+    """
+
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        deferred = self.get_deferred_fields()
+        if fields is not None and set(fields) <= deferred:
+            fields = deferred
+        super().refresh_from_db(using, fields, **kwargs)
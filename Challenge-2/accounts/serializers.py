@@ -1,6 +1,12 @@
-from rest_framework import serializers
-from django.contrib.auth.models import User
+from rest_framework import exceptions, serializers
+from django.contrib.auth.models import User, update_last_login
 from django.contrib.auth.password_validation import validate_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from .authentication import add_user_claims
+from .credentials import authenticate_user, registration_conflicts
+from .tokens import RefreshToken
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, required=True, validators=[validate_password])
@@ -10,17 +16,24 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ('username', 'email', 'password', 'password2')
         extra_kwargs = {
-            'email': {'required': True}
+            'email': {'required': True},
+            # Uniqueness is checked in validate(), together with the email
+            'username': {'validators': [UnicodeUsernameValidator()]},
         }
 
     def validate(self, attrs):
         if attrs['password'] != attrs['password2']:
             raise serializers.ValidationError({"password": "Password fields didn't match."})
         
-        # Validate email is unique
-        email = attrs.get('email')
-        if User.objects.filter(email=email).exists():
-            raise serializers.ValidationError({"email": "Email address already in use."})
+        # Validate username and email are unique, in one query
+        taken = registration_conflicts(self.context['request'], attrs['username'], attrs['email'])
+        errors = {}
+        if 'username' in taken:
+            errors['username'] = "A user with that username already exists."
+        if 'email' in taken:
+            errors['email'] = "Email address already in use."
+        if errors:
+            raise serializers.ValidationError(errors)
         
         return attrs
 
@@ -34,4 +47,32 @@ class UserSerializer(serializers.ModelSerializer):
             password=validated_data['password']
         )
         
-        return user 
\ No newline at end of file
+        return user
+
+
+class LoginSerializer(TokenObtainPairSerializer):
+    """TokenObtainPairSerializer checking credentials through accounts.credentials."""
+    token_class = RefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        return add_user_claims(super().get_token(user), user)
+
+    def validate(self, attrs):
+        user = authenticate_user(self.context['request'], attrs[self.username_field], attrs['password'])
+        if user is None:
+            raise exceptions.AuthenticationFailed(
+                self.error_messages['no_active_account'],
+                'no_active_account',
+            )
+        self.user = user
+
+        refresh = self.get_token(user)
+        if api_settings.UPDATE_LAST_LOGIN:
+            update_last_login(None, user)
+        return {'refresh': str(refresh), 'access': str(refresh.access_token)}
+
+
+class RefreshSerializer(TokenRefreshSerializer):
+    """TokenRefreshSerializer checking the blacklist through accounts.blacklist."""
+    token_class = RefreshToken
@@ -0,0 +1,61 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from .authentication import revoke_tokens
+from .blacklist import token_blacklist
+from .models import ClaimsUser
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def remember_blacklisted_token(sender, instance, created, **kwargs):
+    # Logouts, rotations and the admin all blacklist through this model
+    if created:
+        token = instance.token
+        transaction.on_commit(lambda: token_blacklist.add(token.jti, token.expires_at))
+
+
+# Signed into tokens by add_user_claims, or (password) must not outlive a change
+CREDENTIAL_FIELDS = ('password', 'username', 'is_active')
+
+
+def _remember_credentials(instance):
+    # Deferred fields aren't in __dict__ and are left out
+    instance._saved_credentials = {
+        name: instance.__dict__[name] for name in CREDENTIAL_FIELDS if name in instance.__dict__
+    }
+
+
+@receiver(post_init, sender=User)
+@receiver(post_init, sender=ClaimsUser)
+def remember_loaded_credentials(sender, instance, **kwargs):
+    _remember_credentials(instance)
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=ClaimsUser)
+def revoke_tokens_on_credential_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding:
+        return
+    fields = set(CREDENTIAL_FIELDS) - instance.get_deferred_fields()
+    if update_fields is not None:
+        fields &= set(update_fields)
+    if not fields:
+        return
+    # Compared with the values the instance was loaded with; only fields loaded
+    # later, e.g. a deferred password, need a query
+    saved = getattr(instance, '_saved_credentials', {})
+    changed = any(saved[name] != getattr(instance, name) for name in fields & saved.keys())
+    unknown = fields - saved.keys()
+    if not changed and unknown:
+        current = User.objects.filter(pk=instance.pk).values(*unknown).first()
+        changed = bool(current) and any(current[name] != getattr(instance, name) for name in unknown)
+    if changed:
+        revoke_tokens(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=ClaimsUser)
+def remember_saved_credentials(sender, instance, **kwargs):
+    _remember_credentials(instance)
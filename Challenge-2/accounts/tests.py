@@ -1,3 +1,214 @@
-from django.test import TestCase
+import tempfile
+from unittest import mock
+from datetime import timedelta
+from django.contrib.auth.models import User, update_last_login
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from .authentication import ClaimsJWTAuthentication, add_user_claims, token_version
+from .blacklist import TOKEN_BLACKLIST_CACHE, LRUCache, TokenBlacklist, token_blacklist
+from .credentials import AUTH_RATE_LIMIT
+from .tokens import RefreshToken
+from .views import TestProtectedView
 
-# Create your tests here.
+SHARED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.mkdtemp()},
+}
+
+
+def blacklist_elsewhere(token):
+    """Blacklist the way another server process would: no signal reaches this one."""
+    outstanding = OutstandingToken.objects.get(jti=token['jti'])
+    BlacklistedToken.objects.bulk_create([BlacklistedToken(token=outstanding)])
+
+
+class RefreshRevocationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        token_blacklist._filter = None
+        token_blacklist._answers = LRUCache(TOKEN_BLACKLIST_CACHE['LRU_SIZE'])
+        self.user = User.objects.create_user('alice', password='correct horse')
+        response = self.client.post('/api/auth/login/', {'username': 'alice', 'password': 'correct horse'})
+        self.assertEqual(response.status_code, 200)
+        self.refresh, self.access = response.data['refresh'], response.data['access']
+
+    def refresh_status(self):
+        return self.client.post('/api/auth/refresh/', {'refresh': self.refresh}).status_code
+
+    def test_refresh_after_logout_is_rejected(self):
+        self.assertEqual(self.refresh_status(), 200)
+        response = self.client.post(
+            '/api/auth/logout/', {'refresh': self.refresh}, HTTP_AUTHORIZATION=f'Bearer {self.access}',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh_status(), 401)
+
+    def test_token_blacklisted_by_another_process_is_rejected(self):
+        self.assertEqual(self.refresh_status(), 200)
+        blacklist_elsewhere(RefreshToken(self.refresh))
+        self.assertEqual(self.refresh_status(), 401)
+
+    def test_password_change_revokes_refresh_token(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('battery staple')
+            self.user.save()
+        self.assertEqual(self.refresh_status(), 401)
+
+    def test_expired_refresh_token_is_rejected(self):
+        token = RefreshToken.for_user(self.user)
+        token.set_exp(lifetime=-timedelta(seconds=1))
+        self.refresh = str(token)
+        self.assertEqual(self.refresh_status(), 401)
+
+
+class TokenBlacklistTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+
+    def blacklist(self, cache_name='default', lru_size=10):
+        return TokenBlacklist({**TOKEN_BLACKLIST_CACHE, 'CACHE': cache_name, 'LRU_SIZE': lru_size})
+
+    def test_blacklisted_answer_is_kept_but_not_a_negative_one(self):
+        blacklist = self.blacklist()
+        token = RefreshToken.for_user(self.user)
+        self.assertFalse(blacklist.contains(token['jti']))
+
+        blacklist_elsewhere(token)
+        self.assertTrue(blacklist.contains(token['jti']))
+        with self.assertNumQueries(0):
+            self.assertTrue(blacklist.contains(token['jti']))
+
+    def test_local_cache_asks_the_database_on_a_filter_miss(self):
+        blacklist = self.blacklist()
+        blacklist.warm()
+        token = RefreshToken.for_user(self.user)
+        blacklist_elsewhere(token)
+        self.assertTrue(blacklist.contains(token['jti']))
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_shared_cache_answers_a_filter_miss_without_a_query(self):
+        blacklist = self.blacklist('shared')
+        blacklist.warm()
+        with self.assertNumQueries(0):
+            self.assertFalse(blacklist.contains('never-issued'))
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_shared_cache_sees_tokens_blacklisted_by_another_process(self):
+        here, elsewhere = self.blacklist('shared'), self.blacklist('shared')
+        here.warm()
+        token = RefreshToken.for_user(self.user)
+        elsewhere.add(token['jti'], timezone.now() + timedelta(hours=1))
+        with self.assertNumQueries(0):
+            self.assertTrue(here.contains(token['jti']))
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_filter_false_positive_is_settled_by_the_database(self):
+        blacklist = self.blacklist('shared')
+        blacklist.warm()
+        token = RefreshToken.for_user(self.user)
+        blacklist._filter.add(token['jti'])  # as if another token shared its bits
+        with self.assertNumQueries(1):
+            self.assertFalse(blacklist.contains(token['jti']))
+
+    def test_warm_skips_expired_tokens(self):
+        blacklist = self.blacklist()
+        live, expired = RefreshToken.for_user(self.user), RefreshToken.for_user(self.user)
+        OutstandingToken.objects.filter(jti=expired['jti']).update(expires_at=timezone.now() - timedelta(seconds=1))
+        blacklist_elsewhere(live)
+        blacklist_elsewhere(expired)
+
+        self.assertEqual(blacklist.warm(), 1)
+        self.assertIn(live['jti'], blacklist._filter)
+        self.assertTrue(blacklist._answers.get(live['jti']))
+        self.assertIsNone(blacklist._answers.get(expired['jti']))
+
+    def test_lru_evicts_least_recently_used(self):
+        lru = LRUCache(2)
+        lru.set('a', True)
+        lru.set('b', True)
+        lru.get('a')
+        lru.set('c', True)
+        self.assertIsNone(lru.get('b'))
+        self.assertTrue(lru.get('a'))
+        self.assertTrue(lru.get('c'))
+
+
+class CredentialChangeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('alice', password='correct horse')
+        self.user = User.objects.get(username='alice')
+
+    def test_save_without_credential_change_only_writes(self):
+        with self.assertNumQueries(1):
+            update_last_login(None, self.user)
+        self.user.first_name = 'Alice'
+        with self.assertNumQueries(1):
+            self.user.save()
+        self.assertEqual(token_version(self.user.pk), 0)
+
+    def test_credential_change_revokes_tokens(self):
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(token_version(self.user.pk), 1)
+
+    def test_change_to_a_deferred_password_revokes_tokens(self):
+        user = User.objects.only('id').get(pk=self.user.pk)
+        user.set_password('battery staple')
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertEqual(token_version(user.pk), 1)
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice')
+        token = add_user_claims(RefreshToken.for_user(self.user), self.user).access_token
+        self.headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+    def test_default_loads_the_user(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/auth/test/', **self.headers)
+        self.assertEqual(response.data['user'], 'alice')
+
+    @mock.patch.object(TestProtectedView, 'authentication_classes', [ClaimsJWTAuthentication])
+    def test_opt_in_takes_the_user_from_claims(self):
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/auth/test/', **self.headers)
+        self.assertEqual(response.data['user'], 'alice')
+
+
+class LoginLockoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('bob', password='correct horse')
+        self.window = AUTH_RATE_LIMIT['WINDOW']
+        self.limit = AUTH_RATE_LIMIT['LOGIN_FAILURES_PER_USERNAME']
+
+    def login(self, password):
+        return self.client.post('/api/auth/login/', {'username': 'bob', 'password': password}).status_code
+
+    @mock.patch('accounts.credentials.time')
+    def test_lockout_window_slides(self, clock):
+        start = self.window * 1_000_000
+        clock.time.return_value = start
+        for _ in range(self.limit):
+            self.assertEqual(self.login('wrong'), 401)
+        # Locked out, even with the right password
+        self.assertEqual(self.login('correct horse'), 429)
+
+        # A window later every failure still overlaps the sliding window
+        clock.time.return_value = start + self.window
+        self.assertEqual(self.login('correct horse'), 429)
+
+        # Half a window on, only half of them count
+        clock.time.return_value = start + self.window * 1.5
+        self.assertEqual(self.login('correct horse'), 200)
+
+    def test_successful_logins_are_not_counted(self):
+        for _ in range(self.limit + 1):
+            self.assertEqual(self.login('correct horse'), 200)
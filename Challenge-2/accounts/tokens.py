@@ -0,0 +1,22 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from .authentication import token_version
+from .blacklist import token_blacklist
+
+
+class RefreshToken(tokens.RefreshToken):
+    """
+    RefreshToken checking the blacklist through accounts.blacklist instead of
+    a query, and refusing tokens revoked by a token version bump.
+    """
+
+    def verify(self, *args, **kwargs):
+        super().verify(*args, **kwargs)
+        if 'ver' in self.payload and self.payload['ver'] != token_version(self.payload[api_settings.USER_ID_CLAIM]):
+            raise TokenError(_('Token has been revoked'))
+
+    def check_blacklist(self):
+        if token_blacklist.contains(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
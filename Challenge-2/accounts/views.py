@@ -2,8 +2,8 @@ from django.shortcuts import render
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
 from .serializers import UserSerializer
+from .tokens import RefreshToken
 
 class RegisterView(generics.CreateAPIView):
     serializer_class = UserSerializer
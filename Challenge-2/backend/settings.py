@@ -136,6 +136,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
+        # Loads the user row on every request. Opt in to
+        # 'accounts.authentication.ClaimsJWTAuthentication' to build request.user
+        # from token claims instead, see the README
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     )
 }
@@ -147,6 +150,8 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': False,
     'BLACKLIST_AFTER_ROTATION': True,
     'UPDATE_LAST_LOGIN': False,
+    'TOKEN_OBTAIN_SERIALIZER': 'accounts.serializers.LoginSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'accounts.serializers.RefreshSerializer',
     
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
@@ -158,6 +163,28 @@ SIMPLE_JWT = {
     'TOKEN_TYPE_CLAIM': 'token_type',
 }
 
+# Login and registration rate limits, see accounts/credentials.py for the defaults.
+# Counted in the default cache, which must be shared between processes in production.
+AUTH_RATE_LIMIT = {
+    'LOGIN_FAILURES_PER_IP': 20,
+    'LOGIN_FAILURES_PER_USERNAME': 5,
+    'REGISTRATIONS_PER_IP': 10,
+}
+
+# Current token versions are cached this long; revoking a user's tokens takes up to
+# VERSION_TTL to reach processes that don't share the cache
+TOKEN_CLAIMS = {
+    'VERSION_TTL': 60,  # seconds
+}
+
+# Refresh-token blacklist lookups, see accounts/blacklist.py. Prune expired
+# tokens on a schedule with `python manage.py prune_tokens`.
+TOKEN_BLACKLIST_CACHE = {
+    'CAPACITY': 100_000,
+    'FALSE_POSITIVE_RATE': 0.01,
+    'LRU_SIZE': 10_000,
+}
+
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True  # Only for development!
 CORS_ALLOW_CREDENTIALS = True
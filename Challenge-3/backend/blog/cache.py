@@ -0,0 +1,127 @@
+import hashlib
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+CACHE_ALIAS = getattr(settings, 'BLOG_CACHE_ALIAS', 'default')
+CACHE_TIMEOUT = getattr(settings, 'BLOG_CACHE_TIMEOUT', 300)
+
+FEED_VERSION_KEY = 'blog:version:feed'
+
+
+def post_version_key(pk):
+    return f'blog:version:post:{pk}'
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def get_version(key):
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock rather than 1 so an evicted counter can never
+        # come back at a version whose responses are still cached
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    cache = get_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def bump_feed_version():
+    bump_version(FEED_VERSION_KEY)
+
+
+def bump_post_version(pk):
+    bump_version(post_version_key(pk))
+
+
+class CacheStats:
+    """In-process hit/miss counters for the blog response cache."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.not_modified = 0
+
+    def record(self, outcome):
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def as_dict(self):
+        with self._lock:
+            served = self.hits + self.misses + self.not_modified
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'hit_rate': (self.hits + self.not_modified) / served if served else 0.0,
+            }
+
+
+cache_stats = CacheStats()
+
+
+class VersionedCacheMixin:
+    """
+    Serve GET responses from the blog cache.
+
+    Entries are keyed by the version counters returned from
+    ``get_cache_versions()`` together with the request URL, so bumping a
+    counter on write makes every dependent response miss without having to
+    find and delete it. The same key doubles as the ETag, which lets
+    ``If-None-Match`` requests be answered with a 304 before touching the
+    database or the cached body.
+
+    By default the counters are the ``cache_version_keys`` of the view.
+    Override ``get_cache_versions()`` for keys that depend on the request. A
+    view with no keys is only refreshed when its entries time out after
+    BLOG_CACHE_TIMEOUT seconds.
+    """
+    cache_version_keys = ()
+
+    def get_cache_versions(self):
+        return list(self.cache_version_keys)
+
+    def get(self, request, *args, **kwargs):
+        versions = ':'.join(str(get_version(key)) for key in self.get_cache_versions())
+        digest = hashlib.md5(
+            f'{versions}|{request.build_absolute_uri()}|{request.META.get("HTTP_ACCEPT", "")}'.encode()
+        ).hexdigest()
+        etag = f'"{digest}"'
+
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            cache_stats.record('not_modified')
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        cache = get_cache()
+        key = f'blog:response:{digest}'
+        data = cache.get(key)
+        if data is not None:
+            cache_stats.record('hits')
+            return Response(data, headers={'ETag': etag, 'X-Cache': 'HIT'})
+
+        cache_stats.record('misses')
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, CACHE_TIMEOUT)
+            response['ETag'] = etag
+            response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,18 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from blog.search import rebuild_index, search_available
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the blog post and comment search index from the blog tables.'
+
+    def handle(self, *args, **options):
+        if not search_available():
+            raise CommandError('The search index tables do not exist (needs SQLite with FTS5)')
+        start = time.perf_counter()
+        with transaction.atomic():
+            posts, comments = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {posts} posts and {comments} comments in {time.perf_counter() - start:.2f}s'
+        ))
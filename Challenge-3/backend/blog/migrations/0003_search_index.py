@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # Only SQLite builds with FTS5 get the index. Without it search is unavailable:
+    # /api/search/ answers 503 and the index signals do nothing (blog.search.search_available)
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        if 'ENABLE_FTS5' not in {row[0] for row in cursor.fetchall()}:
+            return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE blog_post_fts USING fts5(title, content, tokenize='unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE blog_comment_fts USING fts5(content, tokenize='unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute('INSERT INTO blog_post_fts(rowid, title, content) SELECT id, title, content FROM blog_post')
+    schema_editor.execute('INSERT INTO blog_comment_fts(rowid, content) SELECT id, content FROM blog_comment')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS blog_post_fts')
+        schema_editor.execute('DROP TABLE IF EXISTS blog_comment_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_post_comment_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -10,6 +10,12 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Newest-first feed
+            models.Index(fields=['-created_at', '-id'], name='blog_post_created_id_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -19,5 +25,11 @@ class Comment(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Comments of a post in date order
+            models.Index(fields=['post', 'created_at'], name='blog_comment_post_created_idx'),
+        ]
+
     def __str__(self):
         return f'Comment by {self.author.username} on {self.post.title}'
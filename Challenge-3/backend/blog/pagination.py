@@ -0,0 +1,50 @@
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class PostCursorPagination(CursorPagination):
+    page_size = 20
+    ordering = ('-created_at', '-id')
+
+
+class CommentCursorPagination(CursorPagination):
+    page_size = 50
+    ordering = ('created_at', 'id')
+
+
+class SearchPagination(BasePagination):
+    """
+    Page numbers over ranked search results. Relevance has no stable cursor,
+    and one extra row per page tells whether there is a next one without
+    counting every match.
+    """
+    page_size = 20
+    max_page_size = 50
+    page_query_param = 'page'
+    page_size_query_param = 'page_size'
+
+    def get_window(self, request):
+        """Return the (offset, limit) of the requested page; limit includes the look-ahead row."""
+        self.request = request
+        try:
+            self.page = max(int(request.query_params.get(self.page_query_param, 1)), 1)
+            self.size = min(max(int(request.query_params.get(self.page_size_query_param, self.page_size)), 1),
+                            self.max_page_size)
+        except ValueError:
+            self.page, self.size = 1, self.page_size
+        return (self.page - 1) * self.size, self.size + 1
+
+    def get_paginated_response(self, results):
+        has_next = len(results) > self.size
+        return Response({
+            'next': self.get_page_link(self.page + 1) if has_next else None,
+            'previous': self.get_page_link(self.page - 1) if self.page > 1 else None,
+            'results': results[:self.size],
+        })
+
+    def get_page_link(self, page):
+        url = self.request.build_absolute_uri()
+        if page == 1:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, page)
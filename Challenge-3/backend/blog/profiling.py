@@ -0,0 +1,163 @@
+"""
+Per-request profiling: query counts, DB time, duplicate SQL, rendering time
+and response size for a sample of requests, kept in a bounded ring buffer and
+summarised per view on demand.
+
+Enable it by adding ``blog.profiling.ProfilingMiddleware`` to MIDDLEWARE and
+tune it with the ``REQUEST_PROFILING`` setting.
+"""
+import random
+import re
+import threading
+import time
+from collections import Counter, deque, namedtuple
+from django.conf import settings
+from django.db import connection
+
+PROFILING = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 1.0,
+    'BUFFER_SIZE': 2000,
+    **getattr(settings, 'REQUEST_PROFILING', {}),
+}
+
+# Upper bounds (ms) of the latency histogram buckets; the last one is open
+LATENCY_BUCKETS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+
+
+def fingerprint(sql):
+    """Reduce a statement to its shape so repeats with different values match."""
+    sql = _LITERALS.sub('?', sql)
+    return _IN_LISTS.sub('(...)', sql)
+
+
+RequestSample = namedtuple('RequestSample', [
+    'view', 'method', 'status', 'duration_ms', 'queries', 'db_ms',
+    'render_ms', 'response_bytes', 'duplicates',
+])
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+
+def _percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class ProfileStore:
+    """Ring buffer of the most recent request samples."""
+
+    def __init__(self, size):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, sample):
+        with self._lock:
+            self._samples.append(sample)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+    def report(self):
+        """Summarise the buffered samples per view, slowest views first."""
+        with self._lock:
+            samples = list(self._samples)
+
+        by_view = {}
+        for sample in samples:
+            by_view.setdefault(sample.view, []).append(sample)
+
+        views = []
+        for view, view_samples in by_view.items():
+            durations = sorted(s.duration_ms for s in view_samples)
+            histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+            for duration in durations:
+                histogram[next((i for i, bound in enumerate(LATENCY_BUCKETS) if duration <= bound),
+                               len(LATENCY_BUCKETS))] += 1
+            duplicates = Counter()
+            for s in view_samples:
+                duplicates.update(dict(s.duplicates))
+            count = len(view_samples)
+            views.append({
+                'view': view,
+                'requests': count,
+                'errors': sum(1 for s in view_samples if s.status >= 500),
+                'latency_ms': {
+                    'p50': round(_percentile(durations, 50), 3),
+                    'p95': round(_percentile(durations, 95), 3),
+                    'p99': round(_percentile(durations, 99), 3),
+                    'max': round(durations[-1], 3),
+                },
+                'latency_histogram': {
+                    **{f'le_{bound}': n for bound, n in zip(LATENCY_BUCKETS, histogram)},
+                    'inf': histogram[-1],
+                },
+                'queries_avg': round(sum(s.queries for s in view_samples) / count, 2),
+                'queries_max': max(s.queries for s in view_samples),
+                'db_ms_avg': round(sum(s.db_ms for s in view_samples) / count, 3),
+                'render_ms_avg': round(sum(s.render_ms for s in view_samples) / count, 3),
+                'response_bytes_avg': round(sum(s.response_bytes for s in view_samples) / count),
+                'duplicate_queries': [
+                    {'sql': sql, 'executions': n} for sql, n in duplicates.most_common(5)
+                ],
+            })
+
+        views.sort(key=lambda v: v['latency_ms']['p95'], reverse=True)
+        return {'samples': len(samples), 'buffer_size': self._samples.maxlen, 'views': views}
+
+
+profile_store = ProfileStore(PROFILING['BUFFER_SIZE'])
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not PROFILING['ENABLED'] or random.random() >= PROFILING['SAMPLE_RATE']:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        request._profiling_render_start = None
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        end = time.perf_counter()
+
+        render_start = request._profiling_render_start
+        match = request.resolver_match
+        profile_store.add(RequestSample(
+            view=match.view_name if match else 'unresolved',
+            method=request.method,
+            status=response.status_code,
+            duration_ms=(end - start) * 1000,
+            queries=recorder.count,
+            db_ms=recorder.seconds * 1000,
+            # DRF and template responses are rendered after the view returns
+            render_ms=(end - render_start) * 1000 if render_start else 0.0,
+            response_bytes=0 if response.streaming else len(response.content),
+            duplicates=tuple((sql, n) for sql, n in recorder.fingerprints.items() if n > 1),
+        ))
+        return response
+
+    def process_template_response(self, request, response):
+        request._profiling_render_start = time.perf_counter()
+        return response
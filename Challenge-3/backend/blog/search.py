@@ -0,0 +1,164 @@
+"""
+Full-text search over blog posts and comments.
+
+Posts (title and content) and comments are indexed in two SQLite FTS5 tables
+keyed by row id. Migration 0003 creates them when SQLite has FTS5. The
+signals in blog.signals keep them in step with saves and deletes, and
+``manage.py rebuild_search_index`` rebuilds them from the blog tables.
+
+Results are ranked by bm25 relevance scaled down by age. A match that is
+BLOG_SEARCH_RECENCY_DAYS old counts half as much as an equally relevant new one.
+"""
+import re
+from django.conf import settings
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from .models import Post, Comment
+
+RECENCY_DAYS = getattr(settings, 'BLOG_SEARCH_RECENCY_DAYS', 30)
+# Title matches weigh this much more than content matches in post relevance
+TITLE_WEIGHT = getattr(settings, 'BLOG_SEARCH_TITLE_WEIGHT', 2.0)
+
+POST_TABLE = 'blog_post_fts'
+COMMENT_TABLE = 'blog_comment_fts'
+KINDS = ('post', 'comment')
+
+WORD = re.compile(r'\w+')
+
+_available = None
+
+
+def search_available():
+    """
+    Whether the FTS5 tables exist. Without them SearchView answers 503, the
+    signals skip indexing, and only the admin's search box falls back, to its
+    LIKE lookups over search_fields.
+    """
+    global _available
+    if _available is None:
+        _available = POST_TABLE in connection.introspection.table_names()
+    return _available
+
+
+def match_expression(query):
+    """
+    Turn free text into an FTS5 query matching every word, or None if it has
+    none. Words are quoted so FTS5 operators in the text are matched literally.
+    """
+    words = WORD.findall(query)
+    return ' '.join(f'"{word}"' for word in words) if words else None
+
+
+def index_post(post):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {POST_TABLE} WHERE rowid = %s', [post.pk])
+        cursor.execute(
+            f'INSERT INTO {POST_TABLE}(rowid, title, content) VALUES (%s, %s, %s)',
+            [post.pk, post.title, post.content],
+        )
+
+
+def unindex_post(pk):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {POST_TABLE} WHERE rowid = %s', [pk])
+
+
+def index_comment(comment):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {COMMENT_TABLE} WHERE rowid = %s', [comment.pk])
+        cursor.execute(
+            f'INSERT INTO {COMMENT_TABLE}(rowid, content) VALUES (%s, %s)',
+            [comment.pk, comment.content],
+        )
+
+
+def unindex_comment(pk):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {COMMENT_TABLE} WHERE rowid = %s', [pk])
+
+
+def rebuild_index():
+    """Reindex every post and comment; returns (posts, comments) indexed."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {POST_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {POST_TABLE}(rowid, title, content) '
+            f'SELECT id, title, content FROM {Post._meta.db_table}'
+        )
+        posts = cursor.rowcount
+        cursor.execute(f'DELETE FROM {COMMENT_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {COMMENT_TABLE}(rowid, content) '
+            f'SELECT id, content FROM {Comment._meta.db_table}'
+        )
+        return posts, cursor.rowcount
+
+
+def matching(model, query):
+    """A ``pk__in`` value selecting the rows of ``model`` that match ``query``."""
+    table = POST_TABLE if model is Post else COMMENT_TABLE
+    return RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [match_expression(query)])
+
+
+def _ranked(kind, table, model, weights):
+    # bm25 is lower for better matches; negate it so scores sort descending
+    age = "julianday('now') - julianday(t.created_at)"
+    return (
+        f"SELECT '{kind}' AS kind, t.id AS id, t.created_at AS created_at, "
+        f'-bm25({table}{weights}) / (1 + ({age}) / %s) AS score '
+        f'FROM {table} JOIN {model._meta.db_table} t ON t.id = {table}.rowid '
+        f'WHERE {table} MATCH %s'
+    )
+
+
+def search(query, kinds=KINDS, offset=0, limit=20):
+    """
+    Return up to ``limit`` (kind, id, score) matches for ``query`` among
+    posts and/or comments, best first, skipping the first ``offset``.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        return []
+    parts, params = [], []
+    if 'post' in kinds:
+        parts.append(_ranked('post', POST_TABLE, Post, f', {TITLE_WEIGHT}, 1.0'))
+        params += [RECENCY_DAYS, expression]
+    if 'comment' in kinds:
+        parts.append(_ranked('comment', COMMENT_TABLE, Comment, ''))
+        params += [RECENCY_DAYS, expression]
+    sql = (
+        ' UNION ALL '.join(parts) +
+        ' ORDER BY score DESC, created_at DESC, kind, id DESC LIMIT %s OFFSET %s'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params + [limit, offset])
+        return [(kind, pk, score) for kind, pk, _, score in cursor.fetchall()]
+
+
+def load_results(matches):
+    """Fetch the posts and comments behind ``matches``, in match order, as result dicts."""
+    ids = {kind: [pk for match_kind, pk, _ in matches if match_kind == kind] for kind in KINDS}
+    posts = Post.objects.select_related('author').in_bulk(ids['post']) if ids['post'] else {}
+    comments = (
+        Comment.objects.select_related('author', 'post').in_bulk(ids['comment'])
+        if ids['comment'] else {}
+    )
+
+    results = []
+    for kind, pk, score in matches:
+        # Anything deleted since the search ran is left out
+        if kind == 'post' and pk in posts:
+            post = posts[pk]
+            results.append({
+                'type': kind, 'id': pk, 'post_id': pk, 'post_title': post.title,
+                'content': post.content, 'author_username': post.author.username,
+                'created_at': post.created_at, 'score': score,
+            })
+        elif kind == 'comment' and pk in comments:
+            comment = comments[pk]
+            results.append({
+                'type': kind, 'id': pk, 'post_id': comment.post_id, 'post_title': comment.post.title,
+                'content': comment.content, 'author_username': comment.author.username,
+                'created_at': comment.created_at, 'score': score,
+            })
+    return results
@@ -18,4 +18,24 @@ class PostSerializer(serializers.ModelSerializer):
         model = Post
         fields = ['id', 'title', 'content', 'author', 'author_username', 
                  'created_at', 'updated_at', 'comments']
-        read_only_fields = ['author'] 
\ No newline at end of file
+        read_only_fields = ['author']
+
+class PostListSerializer(PostSerializer):
+    # Feed entries carry a preview of the newest comments instead of all of them
+    comment_count = serializers.IntegerField(read_only=True)
+    latest_comments = CommentSerializer(many=True, read_only=True)
+
+    class Meta(PostSerializer.Meta):
+        fields = ['id', 'title', 'content', 'author', 'author_username',
+                 'created_at', 'updated_at', 'comment_count', 'latest_comments']
+
+
+class SearchResultSerializer(serializers.Serializer):
+    type = serializers.ChoiceField(choices=['post', 'comment'])
+    id = serializers.IntegerField()
+    post_id = serializers.IntegerField()
+    post_title = serializers.CharField()
+    content = serializers.CharField()
+    author_username = serializers.CharField()
+    created_at = serializers.DateTimeField()
+    score = serializers.FloatField()
@@ -0,0 +1,44 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .cache import bump_feed_version, bump_post_version
+from .models import Post, Comment
+from . import search
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    bump_post_version(instance.pk)
+    bump_feed_version()
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment(sender, instance, **kwargs):
+    # Comments show up in the post detail and in the feed's counts and previews
+    bump_post_version(instance.post_id)
+    bump_feed_version()
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    if search.search_available():
+        search.index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    if search.search_available():
+        search.unindex_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, **kwargs):
+    if search.search_available():
+        search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    if search.search_available():
+        search.unindex_comment(instance.pk)
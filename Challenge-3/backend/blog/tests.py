@@ -1,3 +1,170 @@
+import re
+from unittest import mock, skipUnless
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from .cache import cache_stats, get_cache
+from .credentials import AUTH_RATE_LIMIT
+from . import search
+from .models import Comment, Post
 
-# Create your tests here.
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        cache_stats.reset()
+        self.author = User.objects.create_user('alice')
+        self.post = Post.objects.create(title='Hello', content='First post', author=self.author)
+
+    def test_second_read_is_served_from_the_cache(self):
+        first = self.client.get('/api/posts/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/posts/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_matching_etag_is_answered_with_304(self):
+        etag = self.client.get(f'/api/posts/{self.post.pk}/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/api/posts/{self.post.pk}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(cache_stats.as_dict()['not_modified'], 1)
+
+    def test_write_bumps_the_version(self):
+        feed_etag = self.client.get('/api/posts/')['ETag']
+        detail_etag = self.client.get(f'/api/posts/{self.post.pk}/')['ETag']
+
+        Comment.objects.create(post=self.post, author=self.author, content='Nice')
+
+        feed = self.client.get('/api/posts/', HTTP_IF_NONE_MATCH=feed_etag)
+        detail = self.client.get(f'/api/posts/{self.post.pk}/', HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual((feed.status_code, feed['X-Cache']), (200, 'MISS'))
+        self.assertEqual((detail.status_code, detail['X-Cache']), (200, 'MISS'))
+        self.assertEqual(feed.json()['results'][0]['comment_count'], 1)
+        self.assertEqual(len(detail.json()['comments']), 1)
+
+    def test_other_posts_keep_their_cache(self):
+        other = Post.objects.create(title='Other', content='Second post', author=self.author)
+        self.client.get(f'/api/posts/{other.pk}/')
+
+        self.post.title = 'Hello again'
+        self.post.save()
+
+        self.assertEqual(self.client.get(f'/api/posts/{other.pk}/')['X-Cache'], 'HIT')
+        self.assertEqual(self.client.get(f'/api/posts/{self.post.pk}/')['X-Cache'], 'MISS')
+
+
+class LoginLockoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('bob', password='correct horse')
+        self.window = AUTH_RATE_LIMIT['WINDOW']
+        self.limit = AUTH_RATE_LIMIT['LOGIN_FAILURES_PER_USERNAME']
+
+    def login(self, password):
+        return self.client.post('/api/auth/login/', {'username': 'bob', 'password': password}).status_code
+
+    @mock.patch('blog.credentials.time')
+    def test_lockout_window_slides(self, clock):
+        start = self.window * 1_000_000
+        clock.time.return_value = start
+        for _ in range(self.limit):
+            self.assertEqual(self.login('wrong'), 400)
+        # Locked out, even with the right password
+        self.assertEqual(self.login('correct horse'), 429)
+
+        # A window later every failure still overlaps the sliding window
+        clock.time.return_value = start + self.window
+        self.assertEqual(self.login('correct horse'), 429)
+
+        # Half a window on, only half of them count
+        clock.time.return_value = start + self.window * 1.5
+        self.assertEqual(self.login('correct horse'), 200)
+
+    def test_successful_logins_are_not_counted(self):
+        for _ in range(self.limit + 1):
+            self.assertEqual(self.login('correct horse'), 200)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user('alice')
+        self.post = Post.objects.create(title='Django caching', content='Versioned keys', author=self.author)
+        self.other = Post.objects.create(title='Gardening', content='Tomatoes and caching rainwater', author=self.author)
+        self.comment = Comment.objects.create(post=self.other, author=self.author, content='Caching tips please')
+
+    def test_title_matches_rank_first(self):
+        results = self.client.get('/api/search/', {'q': 'caching', 'type': 'post'}).json()['results']
+        self.assertEqual([result['id'] for result in results], [self.post.pk, self.other.pk])
+
+    def test_posts_and_comments(self):
+        results = self.client.get('/api/search/', {'q': 'caching'}).json()['results']
+        self.assertCountEqual(
+            [(result['type'], result['id']) for result in results],
+            [('post', self.post.pk), ('post', self.other.pk), ('comment', self.comment.pk)],
+        )
+
+    def test_index_follows_edits_and_deletes(self):
+        self.post.title = 'Django signals'
+        self.post.content = 'Receivers'
+        self.post.save()
+        self.comment.delete()
+        results = self.client.get('/api/search/', {'q': 'caching'}).json()['results']
+        self.assertEqual([(result['type'], result['id']) for result in results], [('post', self.other.pk)])
+
+    def test_pages(self):
+        first = self.client.get('/api/search/', {'q': 'caching', 'page_size': 2}).json()
+        second = self.client.get(first['next']).json()
+        self.assertIsNone(second['next'])
+        ids = [(result['type'], result['id']) for result in first['results'] + second['results']]
+        self.assertEqual(len(set(ids)), 3)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get('/api/search/').status_code, 400)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'caching', 'type': 'user'}).status_code, 400)
+
+    @mock.patch.object(search, '_available', False)
+    def test_unavailable_without_fts5(self):
+        self.assertEqual(self.client.get('/api/search/', {'q': 'caching'}).status_code, 503)
+
+    @mock.patch.object(search, '_available', False)
+    def test_admin_falls_back_to_like_lookups(self):
+        self.client.force_login(User.objects.create_superuser('admin'))
+        response = self.client.get('/admin/blog/post/', {'q': 'Gardening'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.other])
+
+
+# Plan lines that mean a query reads a whole table or sorts outside an index
+BAD_PLAN = re.compile(r'\bSCAN (?!.*\bUSING (COVERING )?INDEX\b)|USE TEMP B-TREE')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plan checks only understand SQLite plans')
+class QueryPlanTests(TestCase):
+    """The hot blog queries read through an index, never a full scan or a temporary sort."""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create([User(username=f'user{i}') for i in range(10)])
+        posts = Post.objects.bulk_create([
+            Post(title=f'Post {i}', content=f'content {i}', author=users[i % 10]) for i in range(200)
+        ])
+        Comment.objects.bulk_create([
+            Comment(post=posts[i % 200], author=users[i % 10], content=f'comment {i}') for i in range(2000)
+        ])
+        cls.post = posts[0]
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_hot_queries_use_indexes(self):
+        hot_queries = [
+            ('post feed', Post.objects.order_by('-created_at', '-id')[:20]),
+            ('comments of a post', Comment.objects.filter(post_id=self.post.id).order_by('created_at')),
+        ]
+        for name, queryset in hot_queries:
+            plan = queryset.explain()
+            with self.subTest(name, plan=plan):
+                self.assertIsNone(BAD_PLAN.search(plan))
@@ -6,5 +6,8 @@ app_name = 'blog'
 urlpatterns = [
     path('posts/', views.PostListCreateView.as_view(), name='post-list-create'),
     path('posts/<int:pk>/', views.PostDetailView.as_view(), name='post-detail'),
-    path('posts/<int:pk>/comments/', views.CommentCreateView.as_view(), name='post-comment-create'),
+    path('posts/<int:pk>/comments/', views.CommentListCreateView.as_view(), name='post-comment-list-create'),
+    path('search/', views.SearchView.as_view(), name='search'),
+    path('cache-stats/', views.cache_stats_view, name='cache-stats'),
+    path('profiling/', views.profiling_report_view, name='profiling-report'),
 ] 
\ No newline at end of file
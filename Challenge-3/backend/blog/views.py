@@ -1,13 +1,25 @@
+from django.contrib import admin
 from django.shortcuts import render, get_object_or_404
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.authtoken.models import Token
 from django.contrib.auth.models import User
-from django.contrib.auth import authenticate
 from rest_framework.exceptions import PermissionDenied
+from django.db.models import Count, Prefetch
 from .models import Post, Comment
-from .serializers import PostSerializer, CommentSerializer
+from .serializers import PostSerializer, PostListSerializer, CommentSerializer, SearchResultSerializer
+from .pagination import PostCursorPagination, CommentCursorPagination, SearchPagination
+from . import search
+from .credentials import RateLimited, authenticate_user, registration_conflicts
+from core.log import get_logger
+from .cache import VersionedCacheMixin, FEED_VERSION_KEY, post_version_key, cache_stats
+from .profiling import profile_store
+
+logger = get_logger(__name__)
+
+# Number of newest comments embedded in each feed entry
+COMMENT_PREVIEW_SIZE = 3
 
 # Create your views here.
 
@@ -19,37 +31,98 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
         # Write permissions are only allowed to the author
         return obj.author == request.user
 
-class PostListCreateView(generics.ListCreateAPIView):
-    queryset = Post.objects.all().order_by('-created_at')
-    serializer_class = PostSerializer
+class PostListCreateView(VersionedCacheMixin, generics.ListCreateAPIView):
+    queryset = Post.objects.select_related('author').annotate(
+        comment_count=Count('comments')
+    ).prefetch_related(
+        Prefetch(
+            'comments',
+            queryset=Comment.objects.select_related('author').order_by('-created_at', '-id')[:COMMENT_PREVIEW_SIZE],
+            to_attr='latest_comments'
+        )
+    )
+    pagination_class = PostCursorPagination
     permission_classes = [permissions.AllowAny]  # Allow all operations in development
+    cache_version_keys = (FEED_VERSION_KEY,)
+
+    def get_serializer_class(self):
+        # New posts are returned in the same shape as the detail view
+        if self.request.method == 'POST':
+            return PostSerializer
+        return PostListSerializer
 
     def perform_create(self, serializer):
         # For development: create posts without authentication
         serializer.save(author_id=1)  # Assuming you have at least one user in the database
 
-class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Post.objects.all()
+class PostDetailView(VersionedCacheMixin, generics.RetrieveUpdateDestroyAPIView):
+    queryset = Post.objects.select_related('author').prefetch_related(
+        Prefetch('comments', queryset=Comment.objects.select_related('author'))
+    )
     serializer_class = PostSerializer
     permission_classes = [permissions.AllowAny]  # Allow all operations in development
 
-class CommentCreateView(generics.CreateAPIView):
+    def get_cache_versions(self):
+        return [post_version_key(self.kwargs['pk'])]
+
+class CommentListCreateView(generics.ListCreateAPIView):
     serializer_class = CommentSerializer
+    pagination_class = CommentCursorPagination
     permission_classes = [permissions.AllowAny]  # Allow all operations in development
 
+    def get_queryset(self):
+        return Comment.objects.filter(post_id=self.kwargs['pk']).select_related('author')
+
     def perform_create(self, serializer):
         post = get_object_or_404(Post, pk=self.kwargs.get('pk'))
         # For development: create comments without authentication
         serializer.save(author_id=1, post=post)  # Assuming you have at least one user in the database
 
+class SearchView(generics.GenericAPIView):
+    serializer_class = SearchResultSerializer
+    pagination_class = SearchPagination
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+        kind = request.query_params.get('type')
+        if kind and kind not in search.KINDS:
+            return Response({
+                'error': f'type must be one of: {", ".join(search.KINDS)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if not search.search_available():
+            return Response({'error': 'Search is not available'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        offset, limit = self.paginator.get_window(request)
+        matches = search.search(query, kinds=[kind] if kind else search.KINDS, offset=offset, limit=limit)
+        serializer = self.get_serializer(search.load_results(matches), many=True)
+        return self.paginator.get_paginated_response(serializer.data)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def cache_stats_view(request):
+    return Response(cache_stats.as_dict())
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def profiling_report_view(request):
+    return Response(profile_store.report())
+
+def profiling_admin_view(request):
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Request profiling',
+        'report': profile_store.report(),
+    }
+    return render(request, 'admin/profiling_report.html', context)
+
 @api_view(['POST'])
 def custom_login(request):
-    print("Login attempt received")  # Debug print
     username = request.data.get('username', '').strip()
     password = request.data.get('password', '').strip()
     
-    print(f"Received data - username: {username}")  # Debug print
-    
     if not username:
         return Response({
             'error': 'Username is required'
@@ -61,31 +134,28 @@ def custom_login(request):
         }, status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        print("Attempting authentication")  # Debug print
-        user = authenticate(username=username, password=password)
-        print(f"Authentication result: {user}")  # Debug print
+        user, outcome = authenticate_user(request, username, password)
         
-        if user is not None:
-            if user.is_active:
-                token, _ = Token.objects.get_or_create(user=user)
-                return Response({
-                    'token': token.key,
-                    'user': {
-                        'id': user.id,
-                        'username': user.username,
-                        'email': user.email
-                    }
-                })
-            else:
-                return Response({
-                    'error': 'User account is disabled'
-                }, status=status.HTTP_400_BAD_REQUEST)
+        if outcome == 'success':
+            token, _ = Token.objects.get_or_create(user=user)
+            logger.info('Login succeeded', extra={'outcome': outcome, 'user_id': user.id})
+            return Response({
+                'token': token.key,
+                'user': {
+                    'id': user.id,
+                    'username': user.username,
+                    'email': user.email
+                }
+            })
+        elif outcome == 'disabled':
+            logger.info('Login rejected', extra={'outcome': outcome, 'user_id': user.id})
+            return Response({
+                'error': 'User account is disabled'
+            }, status=status.HTTP_400_BAD_REQUEST)
         else:
-            # Check if user exists
-            user_exists = User.objects.filter(username=username).exists()
-            print(f"User exists check: {user_exists}")  # Debug print
+            logger.info('Login rejected', extra={'outcome': outcome})
             
-            if user_exists:
+            if outcome == 'bad_password':
                 return Response({
                     'error': 'Incorrect password'
                 }, status=status.HTTP_400_BAD_REQUEST)
@@ -93,8 +163,11 @@ def custom_login(request):
                 return Response({
                     'error': 'Username does not exist'
                 }, status=status.HTTP_400_BAD_REQUEST)
+    except RateLimited:
+        logger.info('Login rejected', extra={'outcome': 'rate_limited'})
+        raise
     except Exception as e:
-        print(f"Login error: {str(e)}")  # Debug print
+        logger.exception('Login failed with an unexpected error')
         return Response({
             'error': f'An error occurred during login: {str(e)}'
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -110,12 +183,13 @@ def register_user(request):
             'error': 'Please provide username, email and password'
         }, status=status.HTTP_400_BAD_REQUEST)
 
-    if User.objects.filter(username=username).exists():
+    taken = registration_conflicts(request, username, email)
+    if 'username' in taken:
         return Response({
             'error': 'Username already exists'
         }, status=status.HTTP_400_BAD_REQUEST)
 
-    if User.objects.filter(email=email).exists():
+    if 'email' in taken:
         return Response({
             'error': 'Email already exists'
         }, status=status.HTTP_400_BAD_REQUEST)
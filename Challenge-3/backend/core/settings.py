@@ -52,6 +52,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'blog.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'core.urls'
@@ -85,6 +86,48 @@ DATABASES = {
 }
 
 
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# The 'blog' cache holds rendered post list/detail data and their version
+# counters. locmem is per process; with several workers point it at a shared
+# backend instead, e.g.
+#   'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379'
+#   'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/var/tmp/blog_cache'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'blog': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'blog',
+    },
+}
+
+BLOG_CACHE_ALIAS = 'blog'
+BLOG_CACHE_TIMEOUT = 300  # seconds
+
+# Search ranking: a match this many days old counts half as much as a new one
+BLOG_SEARCH_RECENCY_DAYS = 30
+BLOG_SEARCH_TITLE_WEIGHT = 2.0  # title matches relative to content matches
+
+# Login and registration rate limits, see blog/credentials.py for the defaults.
+# Counted in the default cache, which must be shared between processes in production.
+AUTH_RATE_LIMIT = {
+    'LOGIN_FAILURES_PER_IP': 20,
+    'LOGIN_FAILURES_PER_USERNAME': 5,
+    'REGISTRATIONS_PER_IP': 10,
+}
+
+# Per-view query and latency profiling, see /api/profiling/ and /admin/profiling/
+REQUEST_PROFILING = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 0.1,
+    'BUFFER_SIZE': 2000,  # most recent sampled requests kept for the report
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -140,3 +183,37 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ]
 }
+
+# Logging
+# https://docs.djangoproject.com/en/5.2/topics/logging/
+#
+# Records are written as JSON lines. Login outcomes are logged without
+# usernames and sampled, while warnings and errors are always kept.
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'core.log.JSONFormatter',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'json',
+        },
+    },
+    'loggers': {
+        'blog': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
+# Fraction of records below WARNING kept per logger (see core.log)
+LOG_SAMPLE_RATES = {
+    'blog.views': 0.1,
+}
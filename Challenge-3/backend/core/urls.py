@@ -19,10 +19,11 @@ from django.urls import path, include
 from rest_framework.authtoken import views as auth_views
 from django.contrib.auth import views as django_auth_views
 from rest_framework.authtoken.views import obtain_auth_token
-from blog.views import register_user, custom_login
+from blog.views import register_user, custom_login, profiling_admin_view
 from django.views.decorators.csrf import csrf_exempt
 
 urlpatterns = [
+    path('admin/profiling/', admin.site.admin_view(profiling_admin_view), name='profiling_admin'),
     path('admin/', admin.site.urls),
     path('api/', include('blog.urls')),
     path('api/auth/login/', csrf_exempt(custom_login), name='api_token_auth'),  # Custom login endpoint
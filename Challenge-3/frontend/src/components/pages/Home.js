@@ -20,7 +20,7 @@ const Home = () => {
   const fetchPosts = async () => {
     try {
       const response = await api.get('/posts/');
-      setPosts(response.data);
+      setPosts(response.data.results);
       setError(null);
     } catch (err) {
       setError('Failed to fetch posts');
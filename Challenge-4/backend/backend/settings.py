@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 from datetime import timedelta
 
@@ -48,14 +49,101 @@ INSTALLED_APPS = [
 # Channels Configuration
 ASGI_APPLICATION = 'backend.asgi.application'
 
-# Channel Layers Configuration with Redis
+# Channel Layers Configuration: Redis for multi-process deployments, or the
+# in-process layer from chat.layers for a single server process and tests
+CHAT_CHANNEL_LAYER = os.environ.get('CHAT_CHANNEL_LAYER', 'redis')
+
 CHANNEL_LAYERS = {
     'default': {
-        'BACKEND': 'channels_redis.core.RedisChannelLayer',
-        'CONFIG': {
-            "hosts": [('redis', 6379)],
+        'redis': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                "hosts": [('redis', 6379)],
+            },
         },
-    },
+        'memory': {
+            'BACKEND': 'chat.layers.ShardedInMemoryChannelLayer',
+            'CONFIG': {
+                'capacity': 100,  # messages queued per channel
+                'expiry': 60,  # seconds
+                'shards': 16,
+            },
+        },
+    }[CHAT_CHANNEL_LAYER],
+}
+
+# Chat history: messages sent on connect and maximum page size for load_history
+CHAT_HISTORY_LIMIT = 50
+CHAT_HISTORY_PAGE_MAX = 200
+
+# Opt-in write-behind persistence for chat messages: messages are saved in
+# batches and broadcast once their batch is written. Needs a database that
+# returns bulk-inserted ids (PostgreSQL, SQLite 3.35+, MariaDB 10.5+).
+CHAT_WRITE_BEHIND = {
+    'ENABLED': False,
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 0.05,  # seconds
+    'MAX_QUEUE': 5000,
+    'RETRIES': 3,  # before a failed batch is written message by message
+}
+
+# WebSocket handshake auth: cache of verified access token -> user
+CHAT_AUTH_CACHE = {
+    'TTL': 300,  # seconds, capped by the token's own expiry
+    'MAX_SIZE': 10000,
+}
+
+# Opt-in: coalesce chat messages in busy rooms into chat_batch events; clients that
+# connect with ?batch=1 get each batch as one frame
+CHAT_BATCHING = {
+    'ENABLED': False,
+    'WINDOW': 0.01,  # seconds a batch stays open
+    'MAX_BATCH': 50,
+    'MIN_RATE': 20,  # messages per second in a room before batching starts
+}
+
+# Online users per room; the backend follows the channel layer so every
+# process of a Redis deployment sees the same state
+CHAT_PRESENCE = {
+    'BACKEND': CHAT_CHANNEL_LAYER,
+    'TTL': 60,  # seconds a socket stays online without a heartbeat
+    'HEARTBEAT': 20,  # seconds between refreshes
+    'REDIS_URL': 'redis://redis:6379/1',
+}
+
+# Prometheus metrics for the WebSocket path, served at /chat/metrics/
+CHAT_METRICS = {
+    'TOKEN': None,  # bearer token for scrapers; without one only staff sessions can read it
+    'MAX_ROOM_LABELS': 500,
+}
+
+# Message search at /chat/search/: 'fts5' (SQLite FTS5), 'python' (MessageTerm
+# index, any database) or 'auto' to use FTS5 where migrations could create it
+CHAT_SEARCH = {
+    'BACKEND': 'auto',
+    'PAGE_SIZE': 20,
+    'PAGE_MAX': 50,
+}
+
+# Login and registration rate limits, see chat/credentials.py for the defaults.
+# Counted in the default cache, which must be shared between processes in production.
+AUTH_RATE_LIMIT = {
+    'LOGIN_FAILURES_PER_IP': 20,
+    'LOGIN_FAILURES_PER_USERNAME': 5,
+    'REGISTRATIONS_PER_IP': 10,
+}
+
+# Current token versions are cached this long; revoking a user's tokens takes up to
+# VERSION_TTL to reach processes that don't share the cache
+TOKEN_CLAIMS = {
+    'VERSION_TTL': 60,  # seconds
+}
+
+# Per-view query and latency profiling, see /chat/profiling/ and /admin/profiling/
+REQUEST_PROFILING = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 0.1,
+    'BUFFER_SIZE': 2000,  # most recent sampled requests kept for the report
 }
 
 MIDDLEWARE = [
@@ -67,6 +155,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'chat.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -149,6 +238,9 @@ CORS_ALLOW_CREDENTIALS = True
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
+        # Loads the user row on every request. Opt in to
+        # 'chat.authentication.ClaimsJWTAuthentication' to build request.user
+        # from token claims instead, see the README
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
 }
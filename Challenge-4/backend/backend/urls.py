@@ -17,7 +17,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 
+from chat.views import profiling_admin
+
 urlpatterns = [
+    path('admin/profiling/', admin.site.admin_view(profiling_admin), name='profiling_admin'),
     path('admin/', admin.site.urls),
     path('chat/', include('chat.urls')),
 ]
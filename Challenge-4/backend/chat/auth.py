@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+from .authentication import atoken_version
+
+AUTH_CACHE = {
+    'TTL': 300,
+    'MAX_SIZE': 10000,
+    **getattr(settings, 'CHAT_AUTH_CACHE', {}),
+}
+
+
+class TokenUserCache:
+    """
+    Size-bounded LRU of verified access token -> (user snapshot, token version).
+
+    Entries expire after ``ttl`` seconds or when the token itself expires,
+    whichever comes first, and can be dropped per user when the account
+    changes. The cache is per process; other processes rely on the TTL.
+    """
+
+    def __init__(self, ttl=300, max_size=10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._tokens_by_user = {}
+        # User saves fire from worker threads while lookups run on the event loop
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        """Return ``(user, version)`` for a cached token, or None."""
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            expires_at, user, version = entry
+            if expires_at <= time.monotonic():
+                self._remove(token)
+                return None
+            self._entries.move_to_end(token)
+            return user, version
+
+    def set(self, token, user, token_exp=None, version=None):
+        ttl = self.ttl
+        if token_exp is not None:
+            ttl = min(ttl, token_exp - time.time())
+        if ttl <= 0:
+            return
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = (time.monotonic() + ttl, user, version)
+            self._tokens_by_user.setdefault(user.pk, set()).add(token)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def discard(self, token):
+        with self._lock:
+            if token in self._entries:
+                self._remove(token)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for token in self._tokens_by_user.pop(user_id, ()):
+                self._entries.pop(token, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+
+    def _remove(self, token):
+        _, user, _ = self._entries.pop(token)
+        tokens = self._tokens_by_user.get(user.pk)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user.pk]
+
+
+token_user_cache = TokenUserCache(ttl=AUTH_CACHE['TTL'], max_size=AUTH_CACHE['MAX_SIZE'])
+
+
+@database_sync_to_async
+def get_active_user(user_id):
+    try:
+        return User.objects.get(id=user_id, is_active=True)
+    except User.DoesNotExist:
+        return None
+
+
+async def get_user_for_token(token):
+    """
+    Return the user for a JWT access token, or AnonymousUser if it is not
+    valid or has been revoked. Like ClaimsJWTAuthentication, the token's
+    ``ver`` claim is compared with the user's current token version on every
+    connect, cached or not. Tokens issued without the claim are not checked.
+    """
+    cached = token_user_cache.get(token)
+    if cached is not None:
+        user, version = cached
+    else:
+        try:
+            access_token = AccessToken(token)
+        except TokenError:
+            return AnonymousUser()
+
+        user = await get_active_user(access_token.payload.get('user_id'))
+        if user is None:
+            return AnonymousUser()
+        version = access_token.payload.get('ver')
+
+    if version is not None and version != await atoken_version(user.pk):
+        token_user_cache.discard(token)
+        return AnonymousUser()
+
+    if cached is None:
+        token_user_cache.set(token, user, token_exp=access_token.payload.get('exp'), version=version)
+    return user
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Populate ``scope['user']`` from a ``?token=<access token>`` query parameter.
+    """
+
+    async def __call__(self, scope, receive, send):
+        query = parse_qs(scope.get('query_string', b'').decode())
+        token = query.get('token', [None])[0]
+        # Copy scope to stop changes going upstream
+        scope = dict(scope)
+        scope['user'] = await get_user_for_token(token) if token else AnonymousUser()
+        return await super().__call__(scope, receive, send)
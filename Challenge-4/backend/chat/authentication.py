@@ -0,0 +1,131 @@
+"""
+Stateless access-token authentication.
+
+simplejwt's JWTAuthentication loads the user row on every authenticated
+request. ClaimsJWTAuthentication instead builds request.user from claims
+signed into the token by ``add_user_claims``: the user id, username, active
+flag and token version. The result is a ClaimsUser, a real User instance
+whose other fields are deferred, so a view that touches them costs one query
+and one that doesn't costs none.
+
+Tokens are revoked per user by bumping the user's TokenVersion. Each request
+compares the version in its token with the current one. The current version
+is held in the cache for TOKEN_CLAIMS['VERSION_TTL'] seconds, so with a cache
+that isn't shared between processes a revocation can take that long to reach
+every process. Credential changes (password, username, active flag) revoke
+automatically, see the signals module.
+
+Tokens issued before these claims existed are still accepted, through the
+regular database lookup. ``aauthenticate`` is the same check for async
+views. DRF only runs authentication classes synchronously.
+
+``revoke_tokens`` also drops the user's entries from the WebSocket auth
+cache in chat.auth, which applies the same version check on connect.
+
+Challenge-2's accounts.authentication is the same scheme without the async
+half and the WebSocket cache, which that service doesn't have. The projects
+are deployed separately and share no package, so each keeps its own copy.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router, transaction
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from .models import ClaimsUser, TokenVersion
+
+TOKEN_CLAIMS = {
+    'VERSION_CACHE': 'default',
+    'VERSION_TTL': 60,  # seconds
+    **getattr(settings, 'TOKEN_CLAIMS', {}),
+}
+
+
+def _version_key(user_id):
+    return f'token_version:{user_id}'
+
+
+def token_version(user_id):
+    """The user's current token version, from the cache when possible."""
+    cache = caches[TOKEN_CLAIMS['VERSION_CACHE']]
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        version = TokenVersion.objects.filter(user_id=user_id).values_list('version', flat=True).first() or 0
+        cache.set(_version_key(user_id), version, TOKEN_CLAIMS['VERSION_TTL'])
+    return version
+
+
+async def atoken_version(user_id):
+    cache = caches[TOKEN_CLAIMS['VERSION_CACHE']]
+    version = await cache.aget(_version_key(user_id))
+    if version is None:
+        version = await TokenVersion.objects.filter(user_id=user_id).values_list('version', flat=True).afirst() or 0
+        await cache.aset(_version_key(user_id), version, TOKEN_CLAIMS['VERSION_TTL'])
+    return version
+
+
+def revoke_tokens(user_id):
+    """Invalidate every token issued to the user so far."""
+    TokenVersion.objects.get_or_create(user_id=user_id)
+    TokenVersion.objects.filter(user_id=user_id).update(version=F('version') + 1)
+    cache = caches[TOKEN_CLAIMS['VERSION_CACHE']]
+    transaction.on_commit(lambda: cache.delete(_version_key(user_id)))
+    # The WebSocket auth cache of this process; others catch up through the version check
+    from .auth import token_user_cache
+    transaction.on_commit(lambda: token_user_cache.invalidate_user(user_id))
+
+
+def add_user_claims(token, user):
+    """Sign the claims ClaimsJWTAuthentication needs into a refresh token and the access tokens it issues."""
+    token['username'] = user.get_username()
+    token['active'] = user.is_active
+    token['ver'] = token_version(user.pk)
+    return token
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication returning a ClaimsUser built from the token instead of loading the row."""
+
+    def get_user(self, validated_token):
+        claims = self._claims(validated_token)
+        if claims is None:
+            # Issued before these claims were added
+            return super().get_user(validated_token)
+        return self._claims_user(*claims, token_version(claims[0]))
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views: returns (user, token) or None, and raises the same errors."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+
+        claims = self._claims(validated_token)
+        if claims is None:
+            return await sync_to_async(super().get_user)(validated_token), validated_token
+        return self._claims_user(*claims, await atoken_version(claims[0])), validated_token
+
+    def _claims(self, validated_token):
+        try:
+            return (
+                validated_token[api_settings.USER_ID_CLAIM], validated_token['username'],
+                validated_token['active'], validated_token['ver'],
+            )
+        except KeyError:
+            return None
+
+    def _claims_user(self, user_id, username, active, version, current_version):
+        if not active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if version != current_version:
+            raise AuthenticationFailed(_('Token has been revoked'), code='token_revoked')
+
+        values = {api_settings.USER_ID_FIELD: user_id, ClaimsUser.USERNAME_FIELD: username, 'is_active': active}
+        fields = [field.attname for field in ClaimsUser._meta.concrete_fields if field.attname in values]
+        return ClaimsUser.from_db(router.db_for_read(ClaimsUser), fields, [values[name] for name in fields])
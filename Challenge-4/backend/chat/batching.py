@@ -0,0 +1,131 @@
+"""
+Per-room coalescing of outbound chat messages, off unless
+CHAT_BATCHING['ENABLED'] is set.
+
+While a room is busy, messages sent through this process are buffered for
+WINDOW seconds (or until MAX_BATCH accumulate) and published as a single
+``chat_batch`` group event instead of one ``chat_message`` event each.
+Consumers that connected with ``?batch=1`` receive the batch as one frame;
+the others get the individual frames as before. Below MIN_RATE messages per
+second every message is published immediately.
+
+Each message is JSON-encoded once, by the sender. A batch event carries those
+encoded frames alone, and batching consumers join them into the chat_batch
+frame as they send it.
+"""
+import asyncio
+import logging
+import time
+import weakref
+from django.conf import settings
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+BATCHING = {
+    'ENABLED': False,
+    'WINDOW': 0.01,  # seconds
+    'MAX_BATCH': 50,
+    'MIN_RATE': 20,  # messages per second before coalescing starts
+    **getattr(settings, 'CHAT_BATCHING', {}),
+}
+
+
+def batch_frame(frames):
+    """Join already-encoded chat_message frames into one chat_batch frame without re-encoding."""
+    return '{"type":"chat_batch","messages":[' + ','.join(frames) + ']}'
+
+
+class RoomBatcher:
+    def __init__(self, channel_layer, group, room_label, window=0.01, max_batch=50, min_rate=20):
+        self.channel_layer = channel_layer
+        self.group = group
+        self.room_label = room_label
+        self.window = window
+        self.max_batch = max_batch
+        self.min_rate = min_rate
+        # Encoded frames and their receive times, waiting for the window to close
+        self._frames = []
+        self._received = []
+        self._timer = None
+        self._period_start = time.monotonic()
+        self._period_count = 0
+        self._rate = 0.0
+
+    async def send(self, frame, received):
+        """Publish an encoded chat_message frame to the room, now or with the next batch."""
+        if not self._frames and self._record() < self.min_rate:
+            await self._group_send({'type': 'chat_message', 'frame': frame})
+            metrics.FANOUT_SECONDS.observe(time.perf_counter() - received, room=self.room_label)
+            return
+
+        # Anything arriving while a batch is open joins it, so messages keep their order
+        if self._frames:
+            self._record()
+        self._frames.append(frame)
+        self._received.append(received)
+        if len(self._frames) >= self.max_batch:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().create_task(self._flush_later())
+
+    def _record(self):
+        """Count a message and return the room's current rate in messages per second."""
+        now = time.monotonic()
+        elapsed = now - self._period_start
+        if elapsed >= 1.0:
+            self._rate = self._period_count / elapsed
+            self._period_start = now
+            self._period_count = 0
+        self._period_count += 1
+        # The count so far in this period catches a burst before the period ends
+        return max(self._rate, self._period_count)
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self._timer = None
+        try:
+            await self.flush()
+        except Exception:
+            # Nobody is awaiting a timed flush, so the failure stops here
+            logger.exception('Failed to publish a chat batch to %s', self.group)
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        frames, received = self._frames, self._received
+        self._frames, self._received = [], []
+        if not frames:
+            return
+
+        await self._group_send({'type': 'chat_batch', 'frames': frames})
+        now = time.perf_counter()
+        for started in received:
+            metrics.FANOUT_SECONDS.observe(now - started, room=self.room_label)
+
+    async def _group_send(self, event):
+        try:
+            await self.channel_layer.group_send(self.group, event)
+        except Exception:
+            metrics.LAYER_FAILURES.inc(operation='group_send')
+            raise
+
+
+# One batcher per room and process, kept alive by the consumers using it
+_batchers = weakref.WeakValueDictionary()
+
+
+def get_room_batcher(channel_layer, group, room_label):
+    """Return the shared batcher for a room group, or None when batching is disabled."""
+    if not BATCHING['ENABLED']:
+        return None
+    batcher = _batchers.get(group)
+    if batcher is None or batcher.channel_layer is not channel_layer:
+        batcher = _batchers[group] = RoomBatcher(
+            channel_layer, group, room_label,
+            window=BATCHING['WINDOW'],
+            max_batch=BATCHING['MAX_BATCH'],
+            min_rate=BATCHING['MIN_RATE'],
+        )
+    return batcher
@@ -1,118 +1,220 @@
-import json
+import time
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from rest_framework_simplejwt.tokens import AccessToken
-from django.contrib.auth.models import User
+from django.conf import settings
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
 from .models import Room, Message
+from .loaders import load_chat_history
+from .persistence import get_message_writer
+from .encoding import dumps, loads
+from .batching import batch_frame, get_room_batcher
+from .presence import get_presence, publish as publish_presence
+from . import metrics
+
+# Number of messages sent on connect and the largest page a client may request
+HISTORY_LIMIT = getattr(settings, 'CHAT_HISTORY_LIMIT', 50)
+HISTORY_PAGE_MAX = getattr(settings, 'CHAT_HISTORY_PAGE_MAX', 200)
+
+# Close codes of sockets opened to a room that doesn't exist or that the user may not join
+ROOM_NOT_FOUND = 4404
+ROOM_FORBIDDEN = 4403
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.room_name = self.scope['url_route']['kwargs']['room_name']
         self.room_group_name = f"chat_{self.room_name}"
 
-        # Get token from query string
-        query_string = self.scope.get('query_string', b'').decode()
-        token = dict(pair.split('=') for pair in query_string.split('&') if pair).get('token')
-
-        if not token:
+        # The user is resolved from the ?token= query parameter by JWTAuthMiddleware
+        self.user = self.scope['user']
+        self.accepted = self.present = False
+        if not self.user.is_authenticated:
+            metrics.CONNECTIONS.inc(result='rejected')
             await self.close()
             return
 
-        # Verify token and get user
-        try:
-            access_token = AccessToken(token)
-            user_id = access_token.payload.get('user_id')
-            self.user = await self.get_user(user_id)
-            if not self.user:
-                await self.close()
-                return
-        except Exception:
-            await self.close()
+        # Resolve the room once; every message on this socket reuses it. Rooms are
+        # only created over HTTP, so a socket can't bring one into existence.
+        self.room, refusal = await self.get_room()
+        if refusal is not None:
+            metrics.CONNECTIONS.inc(result='rejected')
+            # Accept first so the client sees the close code instead of a failed handshake
+            await self.accept()
+            await self.close(code=refusal)
             return
+        self.room_label = metrics.room_label(self.room)
+        self.batcher = get_room_batcher(self.channel_layer, self.room_group_name, self.room_label)
+
+        # Clients connecting with ?batch=1 take busy-room traffic as chat_batch frames
+        params = parse_qs(self.scope.get('query_string', b'').decode())
+        self.wants_batches = params.get('batch', [''])[0] in ('1', 'true')
+
+        # Mark the user online and tell the room if this is their first socket in it.
+        # Done before joining the group so the user doesn't get their own diff.
+        presence = get_presence()
+        came_online, online = await presence.join(self.room_name, self.user, self.channel_name)
+        self.present = True
+        if came_online:
+            await publish_presence(self.room_name, joined=[self.user.username], online=online)
 
         # Join room group
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
+        await self.layer_call('group_add', self.room_group_name, self.channel_name)
         await self.accept()
+        self.accepted = True
+        metrics.CONNECTIONS.inc(result='accepted')
+        metrics.CONNECTED_SOCKETS.inc(room=self.room_label)
+
+        # Everyone now online, including this user
+        await self.send(text_data=dumps({
+            'type': 'presence_state',
+            'users': await presence.online(self.room_name)
+        }))
 
-        # Send chat history to the newly connected user
-        history = await self.get_chat_history()
+        # Send the most recent slice of chat history to the newly connected user
+        history, has_more = await self.get_chat_history()
         if history:
-            await self.send(text_data=json.dumps({
+            await self.send(text_data=dumps({
                 'type': 'chat_history',
-                'messages': history
+                'messages': history,
+                'has_more': has_more
             }))
 
     @database_sync_to_async
-    def get_user(self, user_id):
+    @metrics.DB_SECONDS.time(handler='get_room')
+    def get_room(self):
+        """Return (room, None) if the user may join the room, else (None, close code)."""
         try:
-            return User.objects.get(id=user_id)
-        except User.DoesNotExist:
-            return None
+            room = Room.objects.get(name=self.room_name)
+        except Room.DoesNotExist:
+            return None, ROOM_NOT_FOUND
+        if room.privacy == 'private' and not room.participants.filter(pk=self.user.pk).exists():
+            return None, ROOM_FORBIDDEN
+        return room, None
 
     async def disconnect(self, close_code):
-        # Leave room group
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        if getattr(self, 'accepted', False):
+            metrics.CONNECTED_SOCKETS.dec(room=self.room_label)
+        if getattr(self, 'present', False):
+            went_offline, online = await get_presence().leave(self.room_name, self.user, self.channel_name)
+            if went_offline:
+                await publish_presence(self.room_name, left=[self.user.username], online=online)
+
+        # Leave room group. Messages still queued for the write-behind writer are
+        # written by its task, or at exit, whether or not this socket is open.
+        await self.layer_call('group_discard', self.room_group_name, self.channel_name)
 
     async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
+        text_data_json = loads(text_data)
+
+        if text_data_json.get('type') == 'load_history':
+            await self.load_history(text_data_json)
+            return
+
         message = text_data_json['message']
+        received = time.perf_counter()
+        metrics.MESSAGES_RECEIVED.inc()
 
         # Save message to database
-        await self.save_message(message)
+        writer = get_message_writer()
+        if writer is not None:
+            with metrics.WRITE_BEHIND_ENQUEUE_SECONDS.time():
+                written = await writer.enqueue(self.room, self.user, message)
+            # Broadcast only once the database has given the message its id
+            try:
+                message_id, timestamp = await written
+            except Exception:
+                await self.send(text_data=dumps({
+                    'type': 'error',
+                    'message': 'Message could not be saved'
+                }))
+                return
+        else:
+            message_id, timestamp = await self.save_message(message)
 
-        # Send message to room group
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'chat_message',
-                'message': message,
-                'username': self.user.username,
-                'timestamp': await self.get_last_message_timestamp()
-            }
-        )
+        # Encode the outbound frame once here instead of once per recipient
+        frame = dumps({
+            'type': 'chat_message',
+            'id': message_id,
+            'message': message,
+            'username': self.user.username,
+            'timestamp': timestamp
+        })
 
-    async def chat_message(self, event):
-        # Send message to WebSocket
-        await self.send(text_data=json.dumps({
+        # Busy rooms coalesce messages into batches; quiet ones publish right away
+        if self.batcher is not None:
+            await self.batcher.send(frame, received)
+            return
+
+        # Send message to room group
+        await self.layer_call('group_send', self.room_group_name, {
             'type': 'chat_message',
-            'message': event['message'],
-            'username': event['username'],
-            'timestamp': event['timestamp']
-        }))
+            'frame': frame
+        })
+        metrics.FANOUT_SECONDS.observe(time.perf_counter() - received, room=self.room_label)
 
-    @database_sync_to_async
-    def get_chat_history(self):
+    async def layer_call(self, operation, *args):
+        """Call a channel layer method, counting failures before they propagate."""
         try:
-            room = Room.objects.get(name=self.room_name)
-            messages = Message.objects.filter(room=room).order_by('timestamp')
-            return [{
-                'message': msg.content,
-                'username': msg.user.username,
-                'timestamp': msg.timestamp.isoformat()
-            } for msg in messages]
-        except Room.DoesNotExist:
-            return []
+            return await getattr(self.channel_layer, operation)(*args)
+        except Exception:
+            metrics.LAYER_FAILURES.inc(operation=operation)
+            raise
+
+    async def load_history(self, data):
+        # Page backwards from the (timestamp, id) cursor of the oldest message the client has
+        before = data.get('before') or {}
+        timestamp = parse_datetime(str(before.get('timestamp', '')))
+        try:
+            message_id = int(before['id'])
+            limit = int(data.get('limit', HISTORY_LIMIT))
+        except (KeyError, TypeError, ValueError):
+            message_id = limit = None
+
+        if timestamp is None or message_id is None or limit < 1:
+            await self.send(text_data=dumps({
+                'type': 'error',
+                'message': 'load_history requires a before cursor with timestamp and id'
+            }))
+            return
+
+        history, has_more = await self.get_chat_history(before=(timestamp, message_id), limit=limit)
+        await self.send(text_data=dumps({
+            'type': 'history_page',
+            'messages': history,
+            'has_more': has_more
+        }))
+
+    async def chat_message(self, event):
+        # Forward the frame encoded by the sender as-is
+        await self.send(text_data=event['frame'])
+        metrics.MESSAGES_DELIVERED.inc()
+
+    async def presence_update(self, event):
+        await self.send(text_data=event['frame'])
+
+    async def chat_batch(self, event):
+        if self.wants_batches:
+            await self.send(text_data=batch_frame(event['frames']))
+        else:
+            for frame in event['frames']:
+                await self.send(text_data=frame)
+        metrics.MESSAGES_DELIVERED.inc(len(event['frames']))
 
     @database_sync_to_async
-    def save_message(self, content):
-        room, _ = Room.objects.get_or_create(name=self.room_name)
-        Message.objects.create(
-            room=room,
-            user=self.user,
-            content=content
-        )
+    @metrics.DB_SECONDS.time(handler='get_chat_history')
+    def get_chat_history(self, before=None, limit=HISTORY_LIMIT):
+        return load_chat_history(self.room.id, before=before, limit=min(limit, HISTORY_PAGE_MAX))
 
     @database_sync_to_async
-    def get_last_message_timestamp(self):
-        try:
-            room = Room.objects.get(name=self.room_name)
-            message = Message.objects.filter(room=room).latest('timestamp')
-            return message.timestamp.isoformat()
-        except (Room.DoesNotExist, Message.DoesNotExist):
-            return None
\ No newline at end of file
+    @metrics.DB_SECONDS.time(handler='save_message')
+    def save_message(self, content):
+        """Persist a message and return its id and timestamp."""
+        # post_save signals update the room counters and search index; commit them together
+        with transaction.atomic():
+            message = Message.objects.create(
+                room=self.room,
+                user=self.user,
+                content=content
+            )
+        return message.id, message.timestamp.isoformat()
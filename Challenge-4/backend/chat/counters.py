@@ -0,0 +1,71 @@
+"""
+Maintenance of the denormalized Room counters: participant_count,
+message_count, last_message_at and last_message_preview.
+
+Increments are single UPDATEs with F-expressions, so concurrent writers never
+lose counts. ``recompute_room_counters`` rebuilds them from the source tables
+for the repair command.
+"""
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce, Substr
+from .models import Message, Room
+
+PREVIEW_LENGTH = Room._meta.get_field('last_message_preview').max_length
+
+
+def record_messages(room_id, count, last_message_at, last_content):
+    """
+    Count ``count`` new messages in a room whose newest one was sent at
+    ``last_message_at``. The last-message fields only move forward, so a
+    late-arriving older message doesn't replace a newer preview.
+    """
+    newer = Q(last_message_at__isnull=True) | Q(last_message_at__lte=last_message_at)
+    Room.objects.filter(pk=room_id).update(
+        message_count=F('message_count') + count,
+        last_message_at=Case(When(newer, then=Value(last_message_at)), default=F('last_message_at')),
+        last_message_preview=Case(
+            When(newer, then=Value(last_content[:PREVIEW_LENGTH])),
+            default=F('last_message_preview'),
+        ),
+    )
+
+
+def record_message_batch(messages):
+    """record_messages for a batch of messages that may span several rooms."""
+    newest = {}
+    counts = {}
+    for message in messages:
+        counts[message.room_id] = counts.get(message.room_id, 0) + 1
+        current = newest.get(message.room_id)
+        if current is None or (message.timestamp, message.id or 0) >= (current.timestamp, current.id or 0):
+            newest[message.room_id] = message
+    for room_id, message in newest.items():
+        record_messages(room_id, counts[room_id], message.timestamp, message.content)
+
+
+def add_participants(room_ids, delta):
+    Room.objects.filter(pk__in=room_ids).update(participant_count=F('participant_count') + delta)
+
+
+def recompute_room_counters(rooms):
+    """
+    Recompute the counters of every room in the ``rooms`` queryset with one
+    UPDATE of correlated subqueries.
+    """
+    Membership = Room.participants.through
+
+    def count(model, **filters):
+        return Coalesce(Subquery(
+            model.objects.filter(**filters).order_by()
+            .values('room_id').annotate(n=Count('*')).values('n')
+        ), 0)
+
+    newest = Message.objects.filter(room_id=OuterRef('pk')).order_by('-timestamp', '-id')
+    return rooms.update(
+        participant_count=count(Membership, room_id=OuterRef('pk')),
+        message_count=count(Message, room_id=OuterRef('pk')),
+        last_message_at=Subquery(newest.values('timestamp')[:1]),
+        last_message_preview=Coalesce(
+            Substr(Subquery(newest.values('content')[:1]), 1, PREVIEW_LENGTH), Value('')
+        ),
+    )
@@ -0,0 +1,153 @@
+"""
+Credential checks for the login and registration endpoints.
+
+``authenticate_user`` costs at most one lookup query and one password hash.
+It loads the user once, and every failure reason comes from that row, so no
+follow-up existence query is needed. Unknown usernames still pay for a hash,
+as in Django's ModelBackend, so they take as long as wrong passwords.
+Registration costs no query here: duplicate usernames are left to the unique
+constraint on insert.
+
+Both run behind a sliding-window rate limiter kept in the cache. Failed logins
+are counted per client IP and per username, and registrations per client IP.
+An attempt over any limit is rejected with 429 before the database or the
+password hasher is touched. The counters need a cache shared by every server
+process, such as Redis or Memcached, to hold across processes. With the
+local-memory cache each process counts on its own.
+
+The accounts and blog projects have their own copies of this module, each cut
+down to what its endpoints use. This one doesn't tell inactive users apart,
+since chat login issues them tokens that the API then rejects, and has no
+registration lookup.
+"""
+import hashlib
+import math
+import time
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from rest_framework.exceptions import Throttled
+
+AUTH_RATE_LIMIT = {
+    'ENABLED': True,
+    'CACHE': 'default',
+    'WINDOW': 300,  # seconds
+    'LOGIN_FAILURES_PER_IP': 20,
+    'LOGIN_FAILURES_PER_USERNAME': 5,
+    'REGISTRATIONS_PER_IP': 10,
+    # request.META key holding the client address, e.g. HTTP_X_REAL_IP behind a proxy that sets it
+    'IP_HEADER': 'REMOTE_ADDR',
+    **getattr(settings, 'AUTH_RATE_LIMIT', {}),
+}
+
+
+class RateLimited(Throttled):
+    default_detail = 'Too many attempts. Try again later.'
+
+
+class SlidingWindowLimiter:
+    """
+    Counts events per key over the last ``window`` seconds. The sliding
+    window is approximated with two fixed ones: the current window's count
+    plus the previous window's, weighted by how much of it still overlaps.
+    That costs one cache read per check and one increment per event.
+    """
+
+    def __init__(self, name, limits, window, cache_alias='default'):
+        self.name = name
+        # scope -> events allowed per window
+        self.limits = limits
+        self.window = window
+        self.cache_alias = cache_alias
+
+    def _key(self, scope, value, index):
+        # Hashed so any username is a valid cache key
+        digest = hashlib.sha256(str(value).lower().encode()).hexdigest()[:32]
+        return f'ratelimit:{self.name}:{scope}:{digest}:{index}'
+
+    def check(self, **values):
+        """Raise RateLimited if any of the ``scope=value`` keys has reached its limit."""
+        if not AUTH_RATE_LIMIT['ENABLED']:
+            return
+        index, elapsed = divmod(time.time(), self.window)
+        keys = {
+            scope: (self._key(scope, value, int(index)), self._key(scope, value, int(index) - 1))
+            for scope, value in values.items() if value
+        }
+        counts = caches[self.cache_alias].get_many([key for pair in keys.values() for key in pair])
+        overlap = 1 - elapsed / self.window
+        for scope, (current, previous) in keys.items():
+            if counts.get(current, 0) + counts.get(previous, 0) * overlap >= self.limits[scope]:
+                raise RateLimited(wait=math.ceil(self.window - elapsed))
+
+    def hit(self, **values):
+        """Count one event against each of the ``scope=value`` keys."""
+        if not AUTH_RATE_LIMIT['ENABLED']:
+            return
+        cache = caches[self.cache_alias]
+        index = int(time.time() // self.window)
+        for scope, value in values.items():
+            if not value:
+                continue
+            key = self._key(scope, value, index)
+            # Kept for two windows: the current one and as the next one's previous
+            cache.add(key, 0, timeout=self.window * 2)
+            try:
+                cache.incr(key)
+            except ValueError:
+                # Evicted between add() and incr()
+                cache.set(key, 1, timeout=self.window * 2)
+
+
+login_limiter = SlidingWindowLimiter('login', {
+    'ip': AUTH_RATE_LIMIT['LOGIN_FAILURES_PER_IP'],
+    'username': AUTH_RATE_LIMIT['LOGIN_FAILURES_PER_USERNAME'],
+}, AUTH_RATE_LIMIT['WINDOW'], AUTH_RATE_LIMIT['CACHE'])
+
+registration_limiter = SlidingWindowLimiter('register', {
+    'ip': AUTH_RATE_LIMIT['REGISTRATIONS_PER_IP'],
+}, AUTH_RATE_LIMIT['WINDOW'], AUTH_RATE_LIMIT['CACHE'])
+
+
+def client_ip(request):
+    return request.META.get(AUTH_RATE_LIMIT['IP_HEADER']) or request.META.get('REMOTE_ADDR')
+
+
+def authenticate_user(request, username, password):
+    """
+    Check a username and password with one query and one hash.
+
+    Returns ``(user, outcome)``. ``outcome`` is 'success', 'unknown_user' or
+    'bad_password'. ``user`` is None unless the password matched; inactive
+    users are not told apart. Raises RateLimited, without checking anything,
+    once the client or the username has failed too often.
+    """
+    ip = client_ip(request)
+    login_limiter.check(ip=ip, username=username)
+
+    UserModel = get_user_model()
+    try:
+        user = UserModel._default_manager.get_by_natural_key(username)
+    except UserModel.DoesNotExist:
+        # Hash anyway so unknown usernames take as long as wrong passwords
+        UserModel().set_password(password)
+        user, outcome = None, 'unknown_user'
+    else:
+        if user.check_password(password):
+            outcome = 'success'
+        else:
+            user, outcome = None, 'bad_password'
+
+    if user is None:
+        login_limiter.hit(ip=ip, username=username)
+    return user, outcome
+
+
+def check_registration_limit(request):
+    """
+    Count a registration attempt against the client's limit, and raise
+    RateLimited once it is reached.
+    """
+    ip = client_ip(request)
+    registration_limiter.check(ip=ip)
+    registration_limiter.hit(ip=ip)
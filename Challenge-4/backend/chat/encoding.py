@@ -0,0 +1,25 @@
+"""
+JSON encoding for WebSocket frames. Uses orjson when it is installed and the
+standard library otherwise; both produce compact JSON text.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+def dumps(obj):
+    """Encode ``obj`` as a JSON string suitable for a text frame."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(',', ':'))
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,183 @@
+"""
+In-process channel layer for single-node deployments and tests.
+
+Compared with channels' InMemoryChannelLayer:
+
+* group_send copies the message once and queues the same object for every
+  member, without a task per recipient. Group event handlers must treat the
+  event as read-only.
+* Groups and channels are spread over shards by name. Expired messages and
+  group memberships are swept one shard at a time instead of scanning every
+  channel and group on each send and receive.
+* Every channel queue is bounded. A full channel raises ChannelFull on
+  send() and is skipped by group_send(), like the Redis layer does.
+
+Like any in-memory layer, it only connects consumers in the same process.
+"""
+import asyncio
+import random
+import string
+import time
+from copy import deepcopy
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+
+class _Shard:
+    __slots__ = ('channels', 'groups', 'memberships')
+
+    def __init__(self):
+        # channel name -> asyncio.Queue of (expires_at, message)
+        self.channels = {}
+        # group name -> {channel name: joined_at}
+        self.groups = {}
+        # channel name -> set of group names, for channels living in this shard
+        self.memberships = {}
+
+
+class ShardedInMemoryChannelLayer(BaseChannelLayer):
+    extensions = ['groups', 'flush']
+
+    def __init__(self, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None, shards=16, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, **kwargs)
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.group_expiry = group_expiry
+        self._shards = [_Shard() for _ in range(shards)]
+        # Sweep one shard every expiry / shards seconds, so each is visited once per expiry
+        self._sweep_interval = expiry / shards
+        self._next_sweep = time.monotonic() + self._sweep_interval
+        self._sweep_index = 0
+        self.dropped = 0
+
+    def _shard(self, name):
+        return self._shards[hash(name) % len(self._shards)]
+
+    def _queue(self, channel):
+        shard = self._shard(channel)
+        queue = shard.channels.get(channel)
+        if queue is None:
+            queue = shard.channels[channel] = asyncio.Queue(maxsize=self.get_capacity(channel))
+        return queue
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        self.require_valid_channel_name(channel)
+        assert '__asgi_channel__' not in message
+        self._maybe_sweep()
+        try:
+            self._queue(channel).put_nowait((time.time() + self.expiry, deepcopy(message)))
+        except asyncio.QueueFull:
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        self._maybe_sweep()
+        shard = self._shard(channel)
+        queue = self._queue(channel)
+        try:
+            while True:
+                expires_at, message = await queue.get()
+                if expires_at >= time.time():
+                    return message
+                self.dropped += 1
+        finally:
+            if queue.empty():
+                shard.channels.pop(channel, None)
+
+    async def new_channel(self, prefix='specific.'):
+        return '%s.inmemory!%s' % (prefix, ''.join(random.choice(string.ascii_letters) for _ in range(12)))
+
+    # Groups extension
+
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        self._shard(group).groups.setdefault(group, {})[channel] = time.time()
+        self._shard(channel).memberships.setdefault(channel, set()).add(group)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_channel_name(channel)
+        self.require_valid_group_name(group)
+        self._discard(group, channel)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'Message is not a dict'
+        self.require_valid_group_name(group)
+        self._maybe_sweep()
+        members = self._shard(group).groups.get(group)
+        if not members:
+            return
+        item = (time.time() + self.expiry, deepcopy(message))
+        for channel in members:
+            try:
+                self._queue(channel).put_nowait(item)
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    def _discard(self, group, channel):
+        groups = self._shard(group).groups
+        members = groups.get(group)
+        if members is not None:
+            members.pop(channel, None)
+            if not members:
+                del groups[group]
+        memberships = self._shard(channel).memberships
+        channel_groups = memberships.get(channel)
+        if channel_groups is not None:
+            channel_groups.discard(group)
+            if not channel_groups:
+                del memberships[channel]
+
+    # Expiry
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now < self._next_sweep:
+            return
+        self._next_sweep = now + self._sweep_interval
+        self._sweep(self._shards[self._sweep_index])
+        self._sweep_index = (self._sweep_index + 1) % len(self._shards)
+
+    def _sweep(self, shard):
+        now = time.time()
+        for channel, queue in list(shard.channels.items()):
+            expired = False
+            # Queues are FIFO with a fixed expiry, so expired messages are at the head
+            while not queue.empty() and queue._queue[0][0] < now:
+                queue.get_nowait()
+                self.dropped += 1
+                expired = True
+            if expired:
+                # Nobody is reading this channel any more; stop sending it group messages
+                for group in list(shard.memberships.get(channel, ())):
+                    self._discard(group, channel)
+            if queue.empty() and not queue._getters:
+                del shard.channels[channel]
+
+        joined_before = now - self.group_expiry
+        for group, members in list(shard.groups.items()):
+            for channel, joined_at in list(members.items()):
+                if joined_at < joined_before:
+                    self._discard(group, channel)
+
+    # Flush extension
+
+    async def flush(self):
+        self._shards = [_Shard() for _ in self._shards]
+        self.dropped = 0
+
+    async def close(self):
+        pass
+
+    def stats(self):
+        """Capacity and backlog, read by chat.metrics at scrape time."""
+        depths = [queue.qsize() for shard in self._shards for queue in shard.channels.values()]
+        return {
+            'capacity': self.capacity,
+            'channels': len(depths),
+            'backlog': sum(depths),
+            'max_backlog': max(depths, default=0),
+            'dropped': self.dropped,
+        }
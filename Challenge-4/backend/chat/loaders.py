@@ -0,0 +1,202 @@
+import binascii
+import sys
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from operator import itemgetter
+from django.db.models import F, Q, Value
+from django.db.models.functions import Concat, Lower
+from django.utils.dateparse import parse_datetime
+from .encoding import dumps, loads
+from .models import Room, Message
+
+
+def load_chat_history(room_id, before=None, limit=50):
+    """
+    Return up to ``limit`` messages of a room older than the ``before``
+    (timestamp, id) cursor, or the newest ones when no cursor is given, in
+    chronological order, plus a flag telling whether older messages remain.
+
+    Runs a single query regardless of how many messages are returned.
+    """
+    messages = Message.objects.filter(room_id=room_id)
+    if before is not None:
+        timestamp, message_id = before
+        messages = messages.filter(
+            Q(timestamp__lt=timestamp) |
+            Q(timestamp=timestamp, id__lt=message_id)
+        )
+
+    # Walk the (room, timestamp, id) index backwards and fetch one extra row
+    # to find out whether there is another page
+    page = list(
+        messages.order_by('-timestamp', '-id')
+        .values('id', 'content', 'timestamp', 'user__username')[:limit + 1]
+    )
+    has_more = len(page) > limit
+    page = page[:limit]
+    page.reverse()
+
+    return [{
+        'id': msg['id'],
+        'message': msg['content'],
+        'username': msg['user__username'],
+        'timestamp': msg['timestamp'].isoformat()
+    } for msg in page], has_more
+
+
+# Orderings accepted by load_room_page; activity puts rooms without messages last.
+# Names sort case-insensitively by name_key, LOWER(name), with ties broken by name.
+ROOM_ORDERINGS = {
+    'name': ('name_key', 'name'),
+    'activity': (F('last_message_at').desc(nulls_last=True), 'name_key', 'name'),
+}
+
+# Rooms per directory page by default, and the largest page a client may request
+ROOM_PAGE_SIZE = 50
+ROOM_PAGE_MAX = 100
+
+ROOM_FIELDS = (
+    'id', 'name', 'privacy', 'creator__username', 'created_at', 'participant_count',
+    'message_count', 'last_message_at', 'last_message_preview',
+)
+
+
+def encode_room_cursor(sort, room):
+    """Return the opaque cursor of the directory page that starts after ``room``."""
+    at = room['last_message_at'].isoformat() if sort == 'activity' and room['last_message_at'] else None
+    return urlsafe_b64encode(dumps({'s': sort, 'n': room['name'], 't': at}).encode()).decode()
+
+
+def decode_room_cursor(sort, cursor):
+    """Turn a cursor from encode_room_cursor back into (name, last_message_at); raises ValueError."""
+    try:
+        data = loads(urlsafe_b64decode(cursor.encode()))
+        name, at = data['n'], data['t']
+        valid = data['s'] == sort and isinstance(name, str)
+    except (TypeError, KeyError, binascii.Error, UnicodeError, ValueError):
+        valid = False
+    if not valid:
+        raise ValueError('Invalid room cursor')
+    if at is not None:
+        at = parse_datetime(str(at))
+        if at is None:
+            raise ValueError('Invalid room cursor')
+    return name, at
+
+
+def _name_prefix(prefix):
+    """
+    Filter on names starting with ``prefix`` in any case, as a range on the
+    name key so it is served by the room indexes. The prefix is lowered by the
+    database, like the key, so both fold case the same way.
+    """
+    key = Lower(Value(prefix))
+    return Q(name_key__gte=key, name_key__lt=Concat(key, Value(chr(sys.maxunicode))))
+
+
+def _after_name(name):
+    """
+    Filter on names after ``name`` in (name_key, name) order. The redundant
+    __gte bounds the index range; the rest breaks ties by name.
+    """
+    key = Lower(Value(name))
+    return Q(name_key__gte=key) & (Q(name_key__gt=key) | Q(name_key=key, name__gt=name))
+
+
+def _room_page_parts(rooms, sort, after):
+    """
+    Return the querysets that, read in order, list the rows of ``rooms``
+    after the ``after`` (name, last_message_at) cursor in ``sort`` order.
+    """
+    rooms = rooms.values(*ROOM_FIELDS, 'name_key').order_by(*ROOM_ORDERINGS[sort])
+    if sort == 'name':
+        return [rooms.filter(_after_name(after[0])) if after is not None else rooms]
+
+    # Rooms with messages come first, then the idle ones by name. Each part
+    # is read on its own so its cursor condition stays a range on the index.
+    name, at = after or (None, None)
+    parts = []
+    if after is None or at is not None:
+        active = rooms.filter(last_message_at__isnull=False)
+        if after is not None:
+            # The redundant __lte bounds the index range; the Q breaks ties by name
+            active = active.filter(
+                Q(last_message_at__lt=at) | Q(_after_name(name), last_message_at=at),
+                last_message_at__lte=at,
+            )
+        parts.append(active)
+    idle = rooms.filter(last_message_at__isnull=True)
+    if after is not None and at is None:
+        idle = idle.filter(_after_name(name))
+    parts.append(idle)
+    return parts
+
+
+def _room_page(rooms, sort, after, limit):
+    """Return up to ``limit`` rows of ``rooms`` after the ``after`` cursor in ``sort`` order."""
+    page = []
+    for part in _room_page_parts(rooms, sort, after):
+        page += part[:limit - len(page)]
+        if len(page) == limit:
+            break
+    return page
+
+
+async def _aroom_page(rooms, sort, after, limit):
+    page = []
+    for part in _room_page_parts(rooms, sort, after):
+        page += [room async for room in part[:limit - len(page)]]
+        if len(page) == limit:
+            break
+    return page
+
+
+def _visible_rooms(user, prefix):
+    rooms = Room.objects.annotate(name_key=Lower('name'))
+    public = rooms.filter(privacy='public')
+    private = rooms.filter(privacy='private', participants=user)
+    if prefix:
+        public = public.filter(_name_prefix(prefix))
+        private = private.filter(_name_prefix(prefix))
+    return public, private
+
+
+def _merge_room_pages(rooms, sort, limit):
+    # Sorts are stable, so rooms tied on activity stay in name order
+    rooms.sort(key=itemgetter('name_key', 'name'))
+    if sort == 'activity':
+        rooms.sort(key=lambda room: (room['last_message_at'] is not None, room['last_message_at']), reverse=True)
+    next_cursor = encode_room_cursor(sort, rooms[limit - 1]) if len(rooms) > limit else None
+
+    return [{
+        'id': room['id'],
+        'name': room['name'],
+        'privacy': room['privacy'],
+        'creator': room['creator__username'],
+        'created_at': room['created_at'].isoformat(),
+        'participant_count': room['participant_count'],
+        'message_count': room['message_count'],
+        'last_message_at': room['last_message_at'].isoformat() if room['last_message_at'] else None,
+        'last_message_preview': room['last_message_preview']
+    } for room in rooms[:limit]], next_cursor
+
+
+def load_room_page(user, sort='name', prefix='', after=None, limit=ROOM_PAGE_SIZE):
+    """
+    Return one page of the rooms ``user`` can see, ordered by ``sort`` (a key
+    of ROOM_ORDERINGS) and optionally limited to names starting with
+    ``prefix`` in any case, plus the cursor of the next page or None on the last one.
+
+    Public rooms are read from the room indexes and private rooms through the
+    user's memberships, each up to one page, and the two are merged here.
+    Neither query needs a DISTINCT or a scan of rooms the user can't see.
+    """
+    public, private = _visible_rooms(user, prefix)
+    rooms = _room_page(public, sort, after, limit + 1) + _room_page(private, sort, after, limit + 1)
+    return _merge_room_pages(rooms, sort, limit)
+
+
+async def aload_room_page(user, sort='name', prefix='', after=None, limit=ROOM_PAGE_SIZE):
+    """load_room_page for async views, through the async ORM."""
+    public, private = _visible_rooms(user, prefix)
+    rooms = await _aroom_page(public, sort, after, limit + 1) + await _aroom_page(private, sort, after, limit + 1)
+    return _merge_room_pages(rooms, sort, limit)
@@ -0,0 +1,95 @@
+import asyncio
+import time
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+from chat.layers import ShardedInMemoryChannelLayer
+
+
+class Command(BaseCommand):
+    help = (
+        'Fan the same group_send workload out through the sharded in-memory '
+        'layer, the stock channels in-memory layer and, with --redis, the '
+        'Redis layer, and report delivery throughput and latency.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--groups', type=int, default=20,
+                            help='Rooms to broadcast to (default: 20)')
+        parser.add_argument('--members', type=int, default=100,
+                            help='Sockets per room (default: 100)')
+        parser.add_argument('--messages', type=int, default=50,
+                            help='Broadcasts per room (default: 50)')
+        parser.add_argument('--redis', metavar='HOST:PORT',
+                            help='Also run against a Redis server, e.g. localhost:6379')
+
+    def handle(self, *args, **options):
+        capacity = options['messages'] + 10
+        # (name, layer factory, exceptions meaning the backend is unreachable)
+        layers = [
+            ('sharded in-memory', lambda: ShardedInMemoryChannelLayer(capacity=capacity), ()),
+            ('stock in-memory', lambda: InMemoryChannelLayer(capacity=capacity), ()),
+        ]
+        if options['redis']:
+            from channels_redis.core import RedisChannelLayer
+            from redis.exceptions import ConnectionError as RedisConnectionError
+            host, _, port = options['redis'].partition(':')
+            layers.append(('redis', lambda: RedisChannelLayer(
+                hosts=[(host, int(port or 6379))], capacity=capacity), (OSError, RedisConnectionError)))
+
+        for name, make_layer, unavailable in layers:
+            try:
+                result = asyncio.run(self.run_layer(make_layer(), options))
+            except unavailable as exc:
+                self.stdout.write(f'{name:18} skipped: {exc}')
+                continue
+            delivered, expected, seconds, latencies = result
+            self.stdout.write(
+                f'{name:18} {delivered / seconds:10.0f} deliveries/s   '
+                f'p50 {self.percentile(latencies, 50):7.2f} ms   '
+                f'p99 {self.percentile(latencies, 99):7.2f} ms   '
+                f'({delivered} of {expected} delivered)'
+            )
+
+    async def run_layer(self, layer, options):
+        groups, members, messages = options['groups'], options['members'], options['messages']
+        latencies = []
+
+        channels = {}
+        for g in range(groups):
+            group = f'bench_{g}'
+            channels[group] = [await layer.new_channel() for _ in range(members)]
+            for channel in channels[group]:
+                await layer.group_add(group, channel)
+
+        async def receiver(channel):
+            for _ in range(messages):
+                event = await layer.receive(channel)
+                latencies.append(time.perf_counter() - event['sent'])
+
+        receivers = [asyncio.create_task(receiver(channel)) for group in channels.values() for channel in group]
+        start = time.perf_counter()
+        for i in range(messages):
+            for group in channels:
+                await layer.group_send(group, {
+                    'type': 'chat_message',
+                    'message': f'message {i}',
+                    'username': 'bench',
+                    'sent': time.perf_counter(),
+                })
+            # Let receivers drain between rounds, as a live server would
+            await asyncio.sleep(0)
+        try:
+            await asyncio.wait_for(asyncio.gather(*receivers), timeout=60)
+        except asyncio.TimeoutError:
+            for task in receivers:
+                task.cancel()
+        seconds = time.perf_counter() - start
+
+        await layer.flush()
+        return len(latencies), groups * members * messages, seconds, sorted(latencies)
+
+    def percentile(self, sorted_values, pct):
+        if not sorted_values:
+            return 0.0
+        index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+        return sorted_values[index] * 1000
@@ -0,0 +1,80 @@
+import asyncio
+import json
+import time
+from django.core.management.base import BaseCommand
+from chat.encoding import orjson
+from chat.layers import ShardedInMemoryChannelLayer
+
+MESSAGE = {
+    'id': 123456,
+    'message': 'Has anyone looked at the deploy logs from this morning? Something is off with the queue.',
+    'username': 'someone',
+    'timestamp': '2025-01-01T12:00:00.000000+00:00',
+}
+
+
+def stdlib_dumps(obj):
+    return json.dumps(obj, separators=(',', ':'))
+
+
+def orjson_dumps(obj):
+    return orjson.dumps(obj).decode()
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure CPU time per chat broadcast against room size, encoding the '
+        'frame once per recipient versus once per message.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000, 5000],
+                            help='Room sizes to test (default: 10 100 1000 5000)')
+        parser.add_argument('--broadcasts', type=int, default=20,
+                            help='Messages broadcast per room size (default: 20)')
+
+    def handle(self, *args, **options):
+        modes = [('per recipient, json', False, stdlib_dumps), ('once, json', True, stdlib_dumps)]
+        if orjson is not None:
+            modes.append(('once, orjson', True, orjson_dumps))
+        else:
+            self.stdout.write('orjson is not installed; skipping it')
+
+        for size in options['sizes']:
+            for name, encode_once, dumps in modes:
+                cpu = asyncio.run(self.run_room(size, options['broadcasts'], encode_once, dumps))
+                self.stdout.write(
+                    f'{size:6} members   {name:20} {cpu / options["broadcasts"] * 1000:9.3f} ms CPU/broadcast'
+                )
+
+    async def run_room(self, size, broadcasts, encode_once, dumps):
+        layer = ShardedInMemoryChannelLayer(capacity=broadcasts + 10)
+        channels = [await layer.new_channel() for _ in range(size)]
+        for channel in channels:
+            await layer.group_add('bench', channel)
+        sent = []
+
+        # Mirrors ChatConsumer.chat_message before and after frames were encoded by the sender
+        async def recipient(channel):
+            for _ in range(broadcasts):
+                event = await layer.receive(channel)
+                if encode_once:
+                    sent.append(event['frame'])
+                else:
+                    sent.append(dumps({'type': 'chat_message', **{k: event[k] for k in MESSAGE}}))
+
+        tasks = [asyncio.create_task(recipient(channel)) for channel in channels]
+        await asyncio.sleep(0)
+
+        start = time.process_time()
+        for _ in range(broadcasts):
+            if encode_once:
+                event = {'type': 'chat_message', 'frame': dumps({'type': 'chat_message', **MESSAGE})}
+            else:
+                event = {'type': 'chat_message', **MESSAGE}
+            await layer.group_send('bench', event)
+        await asyncio.gather(*tasks)
+        cpu = time.process_time() - start
+
+        assert len(sent) == size * broadcasts
+        return cpu
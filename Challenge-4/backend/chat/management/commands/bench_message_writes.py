@@ -0,0 +1,73 @@
+import asyncio
+import time
+from channels.db import database_sync_to_async
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from chat.models import Room, Message
+from chat.persistence import MessageWriter
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare chat message throughput of the per-message INSERT path with '
+        'the write-behind batched path on a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=5000,
+                            help='Messages to write per run (default: 5000)')
+        parser.add_argument('--senders', type=int, default=50,
+                            help='Concurrent senders (default: 50)')
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--flush-interval', type=float, default=0.05)
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            user = User.objects.create(username='bench')
+            room = Room.objects.create(name='bench', creator=user)
+
+            per_message = asyncio.run(self.run_per_message(room, user, options))
+            Message.objects.all().delete()
+            write_behind = asyncio.run(self.run_write_behind(room, user, options))
+            stored = Message.objects.count()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(f'per-message:  {per_message:10.0f} msg/s')
+        self.stdout.write(f'write-behind: {write_behind:10.0f} msg/s '
+                          f'({stored} of {options["messages"]} messages stored)')
+
+    async def run_senders(self, options, send):
+        per_sender = options['messages'] // options['senders']
+
+        async def sender(n):
+            for i in range(per_sender):
+                await send(f'sender {n} message {i}')
+
+        start = time.perf_counter()
+        await asyncio.gather(*(sender(n) for n in range(options['senders'])))
+        return start, per_sender * options['senders']
+
+    async def run_per_message(self, room, user, options):
+        create = database_sync_to_async(Message.objects.create)
+
+        async def send(content):
+            await create(room=room, user=user, content=content)
+
+        start, sent = await self.run_senders(options, send)
+        return sent / (time.perf_counter() - start)
+
+    async def run_write_behind(self, room, user, options):
+        writer = MessageWriter(
+            batch_size=options['batch_size'],
+            flush_interval=options['flush_interval'],
+        )
+
+        async def send(content):
+            await (await writer.enqueue(room, user, content))
+
+        start, sent = await self.run_senders(options, send)
+        await writer.drain()
+        return sent / (time.perf_counter() - start)
@@ -0,0 +1,98 @@
+import statistics
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from chat.loaders import ROOM_FIELDS, decode_room_cursor, load_room_page
+from chat.models import Room
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway test database with many rooms and time the room directory: '
+        'the old full listing against cursor pages, prefix search and activity sort.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=100000)
+        parser.add_argument('--memberships', type=int, default=200,
+                            help='Rooms the benchmark user belongs to (default: 200)')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            user = self.seed(options['rooms'], options['memberships'])
+            for name, run in self.scenarios(user):
+                self.measure(name, run, options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def seed(self, room_count, memberships):
+        owner, user = User.objects.bulk_create([User(username='owner'), User(username='reader')])
+        now = timezone.now()
+        rooms = Room.objects.bulk_create([
+            Room(
+                name=f'room{i:06}', creator=owner, privacy='private' if i % 4 == 0 else 'public',
+                # A third of the rooms never had a message
+                last_message_at=now - timezone.timedelta(seconds=i * 7 % room_count) if i % 3 else None,
+            )
+            for i in range(room_count)
+        ], batch_size=5000)
+        Membership = Room.participants.through
+        step = max(room_count // max(memberships, 1), 1)
+        Membership.objects.bulk_create(
+            [Membership(room_id=room.id, user_id=user.id) for room in rooms[::step][:memberships]],
+            batch_size=5000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return user
+
+    def scenarios(self, user):
+        def full_listing_distinct():
+            # The listing before pagination: everything visible, through the membership join
+            return list(
+                Room.objects.filter(Q(privacy='public') | Q(participants=user)).distinct()
+                .values(*ROOM_FIELDS).order_by('name')
+            )
+
+        def full_listing_subquery():
+            return list(
+                Room.objects.filter(Q(privacy='public') | Q(privacy='private', id__in=user.joined_rooms.values('id')))
+                .values(*ROOM_FIELDS).order_by('name')
+            )
+
+        def deep_page(sort):
+            # Walk 20 pages in and time the next one
+            _, cursor = load_room_page(user, sort)
+            for _ in range(20):
+                _, cursor = load_room_page(user, sort, after=decode_room_cursor(sort, cursor))
+            after = decode_room_cursor(sort, cursor)
+            return lambda: load_room_page(user, sort, after=after)
+
+        return [
+            ('full listing, DISTINCT over join', full_listing_distinct),
+            ('full listing, membership subquery', full_listing_subquery),
+            ('first page by name', lambda: load_room_page(user)),
+            ('page 21 by name', deep_page('name')),
+            ('first page by activity', lambda: load_room_page(user, 'activity')),
+            ('page 21 by activity', deep_page('activity')),
+            ('name prefix "room05"', lambda: load_room_page(user, prefix='room05')),
+            ('name prefix "room05" by activity', lambda: load_room_page(user, 'activity', prefix='room05')),
+        ]
+
+    def measure(self, name, run, repeat):
+        timings = []
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(
+            f'{name:38} {statistics.median(timings):9.2f} ms median '
+            f'{max(timings):9.2f} ms max   {len(ctx)} queries'
+        )
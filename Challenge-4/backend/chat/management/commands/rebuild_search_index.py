@@ -0,0 +1,21 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from chat.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the chat message search index from the messages table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Messages indexed per statement (default: 2000)')
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        start = time.perf_counter()
+        with transaction.atomic():
+            backend.rebuild(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt the {backend.name} search index in {time.perf_counter() - start:.2f}s'
+        ))
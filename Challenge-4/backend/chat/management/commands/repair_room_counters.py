@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from chat.counters import recompute_room_counters
+from chat.models import Room
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the denormalized Room counters (participants, messages, '
+        'last message) from the source tables, one id range at a time.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rooms updated per statement (default: 1000)')
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        repaired = 0
+        last_id = 0
+        while True:
+            ids = list(
+                Room.objects.filter(pk__gt=last_id).order_by('pk')
+                .values_list('pk', flat=True)[:options['batch_size']]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                repaired += recompute_room_counters(Room.objects.filter(pk__gt=last_id, pk__lte=ids[-1]))
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed counters for {repaired} rooms in {time.perf_counter() - start:.2f}s'
+        ))
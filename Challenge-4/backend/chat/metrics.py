@@ -0,0 +1,281 @@
+"""
+In-process metrics for the chat WebSocket path, exported in the Prometheus
+text exposition format by ``chat.views.metrics``.
+
+Each server process keeps its own counters, so scrape every process (or every
+ASGI worker) separately and aggregate in Prometheus.
+"""
+import threading
+import time
+from contextlib import ContextDecorator
+from django.conf import settings
+
+CHAT_METRICS = {
+    # Bearer token accepted by the metrics view; without one only staff can read it
+    'TOKEN': None,
+    # Rooms beyond this many get reported under the 'other' label
+    'MAX_ROOM_LABELS': 500,
+    **getattr(settings, 'CHAT_METRICS', {}),
+}
+
+# Seconds; covers in-memory fan-out (sub-millisecond) up to a struggling Redis
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels[name] for name in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, (), value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for name, key, extra, value in self.samples():
+            lines.append(f'{name}{_format_labels(self.labelnames, key, extra)} {_format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), drop_zero=False):
+        super().__init__(name, documentation, labelnames)
+        # Forget label sets that fall back to zero, e.g. rooms nobody is in
+        self.drop_zero = drop_zero
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            value = self._values.get(key, 0) + amount
+            if value == 0 and self.drop_zero:
+                self._values.pop(key, None)
+            else:
+                self._values[key] = value
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts = state[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """Context manager / decorator observing the elapsed wall time."""
+        return _Timer(self, labels)
+
+    def samples(self):
+        with self._lock:
+            snapshot = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        samples = []
+        for key, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                samples.append((f'{self.name}_bucket', key, (('le', _format_value(float(bound))),), cumulative))
+            samples.append((f'{self.name}_sum', key, (), total))
+            samples.append((f'{self.name}_count', key, (), count))
+        return samples
+
+
+class _Timer(ContextDecorator):
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def _recreate_cm(self):
+        # Decorated functions may run concurrently; give each call its own start time
+        return _Timer(self.histogram, self.labels)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self._start, **self.labels)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """
+        Register a callable run at scrape time that returns extra metrics,
+        for values that are cheaper to read on demand than to keep updated.
+        """
+        self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for metric in collector():
+                lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+CONNECTIONS = registry.register(Counter(
+    'chat_websocket_connections_total', 'WebSocket connection attempts by outcome.', ['result']))
+CONNECTED_SOCKETS = registry.register(Gauge(
+    'chat_connected_sockets', 'Open WebSocket connections per room.', ['room'], drop_zero=True))
+MESSAGES_RECEIVED = registry.register(Counter(
+    'chat_messages_received_total', 'Chat messages received from clients.'))
+MESSAGES_DELIVERED = registry.register(Counter(
+    'chat_messages_delivered_total', 'Chat messages written to client sockets.'))
+FANOUT_SECONDS = registry.register(Histogram(
+    'chat_fanout_seconds', 'Time from receiving a message to group_send returning.', ['room']))
+DB_SECONDS = registry.register(Histogram(
+    'chat_db_seconds', 'Database time per consumer handler.', ['handler']))
+WRITE_BEHIND_ENQUEUE_SECONDS = registry.register(Histogram(
+    'chat_write_behind_enqueue_seconds', 'Time spent waiting for room in the write-behind queue.'))
+LAYER_FAILURES = registry.register(Counter(
+    'chat_channel_layer_failures_total', 'Channel layer operations that raised.', ['operation']))
+
+_room_labels = set()
+_room_labels_lock = threading.Lock()
+
+
+def room_label(room):
+    """
+    Bound label cardinality: only the first MAX_ROOM_LABELS public rooms get
+    their own series. Private rooms share the 'private' label so their names
+    don't leave the process.
+    """
+    if room.privacy == 'private':
+        return 'private'
+    room_name = room.name
+    if room_name in _room_labels:
+        return room_name
+    with _room_labels_lock:
+        if len(_room_labels) < CHAT_METRICS['MAX_ROOM_LABELS']:
+            _room_labels.add(room_name)
+            return room_name
+    return 'other'
+
+
+def channel_layer_stats(layer):
+    """
+    Capacity and backlog of a channel layer. Layers can provide their own
+    numbers through a ``stats()`` method returning the same keys; the stock
+    in-memory layer is inspected directly. Returns None when the layer
+    exposes nothing (e.g. Redis, whose queues live on the server).
+    """
+    if hasattr(layer, 'stats'):
+        return layer.stats()
+    channels = getattr(layer, 'channels', None)
+    if not isinstance(channels, dict):
+        return None
+    depths = [queue.qsize() for queue in channels.values()]
+    return {
+        'capacity': layer.capacity,
+        'channels': len(depths),
+        'backlog': sum(depths),
+        'max_backlog': max(depths, default=0),
+    }
+
+
+@registry.add_collector
+def collect_channel_layer():
+    from channels.layers import get_channel_layer
+    stats = channel_layer_stats(get_channel_layer())
+    if stats is None:
+        return []
+    descriptions = {
+        'capacity': 'Per-channel message capacity of the channel layer.',
+        'channels': 'Channels with a queue in the channel layer.',
+        'backlog': 'Messages queued in the channel layer across all channels.',
+        'max_backlog': 'Deepest single channel queue in the channel layer.',
+    }
+    metrics = []
+    for key, description in descriptions.items():
+        gauge = Gauge(f'chat_channel_layer_{key}', description)
+        gauge.set(stats[key])
+        metrics.append(gauge)
+    if 'dropped' in stats:
+        dropped = Counter('chat_channel_layer_dropped_total', 'Messages dropped by the channel layer (full or expired).')
+        dropped.inc(stats['dropped'])
+        metrics.append(dropped)
+    return metrics
+
+
+@registry.add_collector
+def collect_write_behind():
+    from .persistence import get_message_writer
+    writer = get_message_writer()
+    if writer is None:
+        return []
+    gauge = Gauge('chat_write_behind_backlog', 'Chat messages queued for write-behind persistence.')
+    gauge.set(writer.backlog())
+    return [gauge]
@@ -0,0 +1,20 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:03
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_alter_message_timestamp'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(models.F('privacy'), django.db.models.functions.text.Lower('name'), models.F('name'), name='chat_room_privacy_name_idx'),
+        ),
+    ]
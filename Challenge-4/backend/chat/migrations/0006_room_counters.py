@@ -0,0 +1,65 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:31
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Substr
+
+
+def backfill_counters(apps, schema_editor):
+    # The counters as chat.counters.recompute_room_counters computed them at
+    # this point, on the historical models
+    Room = apps.get_model('chat', 'Room')
+    Message = apps.get_model('chat', 'Message')
+    Membership = Room.participants.through
+
+    def count(model):
+        return Coalesce(Subquery(
+            model.objects.filter(room_id=OuterRef('pk')).order_by()
+            .values('room_id').annotate(n=Count('*')).values('n')
+        ), 0)
+
+    newest = Message.objects.filter(room_id=OuterRef('pk')).order_by('-timestamp', '-id')
+    Room.objects.update(
+        participant_count=count(Membership),
+        message_count=count(Message),
+        last_message_at=Subquery(newest.values('timestamp')[:1]),
+        last_message_preview=Coalesce(Substr(Subquery(newest.values('content')[:1]), 1, 100), Value('')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_room_privacy_name_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='last_message_preview',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='participant_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(models.F('privacy'), models.OrderBy(models.F('last_message_at'), descending=True), django.db.models.functions.text.Lower('name'), models.F('name'), name='chat_room_privacy_activity_idx'),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.0.2 on 2026-10-18 10:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_fts_index(apps, schema_editor):
+    # Only SQLite builds with FTS5 get the index; chat.search falls back to MessageTerm otherwise
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        if 'ENABLE_FTS5' not in {row[0] for row in cursor.fetchall()}:
+            return
+    # The index keeps its own copy of the text. An external-content table would
+    # avoid that, but it is corrupted by deleting a row it never indexed, which
+    # bulk-inserted messages are until the next rebuild.
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE chat_message_fts USING fts5("
+        "content, tokenize='unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute('INSERT INTO chat_message_fts(rowid, content) SELECT id, content FROM chat_message')
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS chat_message_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_room_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='chat.message')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='chat.room')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'room'], name='chat_msgterm_term_room_idx')],
+            },
+        ),
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Lower
+from django.utils import timezone
 from django.contrib.auth.models import User
 
 class Room(models.Model):
@@ -13,20 +16,80 @@ class Room(models.Model):
     creator = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_rooms')
     participants = models.ManyToManyField(User, related_name='joined_rooms')
 
+    # Denormalized for the room list, maintained by chat.counters
+    participant_count = models.PositiveIntegerField(default=0)
+    message_count = models.PositiveIntegerField(default=0)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    last_message_preview = models.CharField(max_length=100, blank=True, default='')
+
     def __str__(self):
         return self.name
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            # Room directory: public rooms listed by name, case-insensitively
+            models.Index(F('privacy'), Lower('name'), F('name'), name='chat_room_privacy_name_idx'),
+            # Room directory: public rooms sorted by recent activity
+            models.Index(
+                F('privacy'), F('last_message_at').desc(), Lower('name'), F('name'),
+                name='chat_room_privacy_activity_idx',
+            ),
+        ]
 
 class Message(models.Model):
     room = models.ForeignKey(Room, related_name='messages', on_delete=models.CASCADE)
     user = models.ForeignKey(User, related_name='messages', on_delete=models.CASCADE)
     content = models.TextField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # A default rather than auto_now_add so batched writes keep the broadcast timestamp
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Backs the "last N messages" snapshot and keyset history paging
+            models.Index(fields=['room', 'timestamp', 'id'], name='chat_msg_room_ts_id_idx'),
+        ]
 
     def __str__(self):
         return f'{self.user.username}: {self.content[:50]}'
+
+class MessageTerm(models.Model):
+    """Inverted index entry of the pure-Python message search backend (see chat.search)."""
+    term = models.CharField(max_length=64)
+    message = models.ForeignKey(Message, related_name='terms', on_delete=models.CASCADE)
+    # Copied from the message so searches can be scoped to rooms without a join
+    room = models.ForeignKey(Room, related_name='+', on_delete=models.CASCADE)
+    count = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'room'], name='chat_msgterm_term_room_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.term} in message {self.message_id}'
+
+class TokenVersion(models.Model):
+    """Per-user counter signed into access tokens; bumping it revokes every token issued before."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='token_version')
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.user_id}: {self.version}'
+
+class ClaimsUser(User):
+    """
+    A User built from access-token claims by ClaimsJWTAuthentication. Only
+    id, username and is_active are set; the first access to any other field
+    loads all of them in one query.
+    """
+
+    class Meta:
+        proxy = True
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        deferred = self.get_deferred_fields()
+        if fields is not None and set(fields) <= deferred:
+            fields = deferred
+        super().refresh_from_db(using, fields, **kwargs)
@@ -0,0 +1,207 @@
+import asyncio
+import atexit
+import logging
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from .metrics import DB_SECONDS
+from .models import Message
+from .counters import record_message_batch
+from .search import get_search_backend
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND = {
+    'ENABLED': False,
+    'BATCH_SIZE': 200,
+    'FLUSH_INTERVAL': 0.05,
+    'MAX_QUEUE': 5000,
+    'RETRIES': 3,  # further attempts at a failed batch before writing it message by message
+    **getattr(settings, 'CHAT_WRITE_BEHIND', {}),
+}
+
+
+def save_messages(messages, batch_size=None):
+    """
+    Insert messages, bump their rooms' counters and add them to the search
+    index, which bulk_create's missing signals would skip.
+    """
+    with transaction.atomic():
+        Message.objects.bulk_create(messages, batch_size=batch_size)
+        record_message_batch(messages)
+        get_search_backend().index(messages)
+
+
+class MessageWriter:
+    """
+    Write-behind buffer for chat messages.
+
+    ``enqueue`` queues a message and returns a future. Queued messages are
+    persisted in the background with ``bulk_create`` once ``batch_size`` are
+    waiting or ``flush_interval`` seconds have passed. Each future then resolves
+    to the message's database-assigned id and its timestamp, and callers
+    broadcast the message only after that. The queue is bounded: ``enqueue``
+    waits while it is full, which stops the sending socket from being read.
+
+    A batch that fails is retried ``retries`` times, backing off, and then
+    written one message at a time. Messages that fail on their own, e.g. because
+    their room was deleted, get the error on their future instead of an id.
+
+    Ids come from the database, so any number of processes, the admin and the
+    ORM can write messages alongside the writer. That needs a backend that
+    returns the ids of bulk-inserted rows (PostgreSQL, SQLite 3.35+, MariaDB
+    10.5+).
+    """
+
+    def __init__(self, batch_size=200, flush_interval=0.05, max_queue=5000, retries=3):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.retries = retries
+        self._loop = None
+        self._queue = None
+        self._task = None
+        # Taken off the queue by _run but not written yet
+        self._in_flight = []
+
+    async def enqueue(self, room, user, content):
+        """
+        Queue a message for persistence. Returns a future of its (id, timestamp),
+        set once the message has been written.
+        """
+        await self._ensure_started()
+        message = Message(room=room, user=user, content=content)
+        written = self._loop.create_future()
+        await self._queue.put((message, written))
+        return written
+
+    async def drain(self):
+        """Wait until every queued message has been written."""
+        if self._queue is not None and self._loop is asyncio.get_running_loop():
+            await self._queue.join()
+
+    def backlog(self):
+        """Number of messages waiting to be written."""
+        return len(self._in_flight) + (self._queue.qsize() if self._queue is not None else 0)
+
+    def drain_sync(self):
+        """
+        Write whatever is still queued or in flight without an event loop, e.g.
+        at exit or when the loop the writer ran on has gone away. Nobody is
+        left to await the futures, so they are not set.
+        """
+        if self._queue is None:
+            return
+        pending, self._in_flight = self._in_flight, []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        if not pending:
+            return
+        messages = [message for message, _ in pending]
+        # The loop may have stopped after the in-flight batch was committed
+        written = set(Message.objects.filter(
+            id__in=[message.id for message in messages if message.id is not None]
+        ).values_list('id', flat=True))
+        messages = [message for message in messages if message.id not in written]
+        if messages:
+            self._save(messages)
+
+    async def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First use, or the previous loop has gone away (e.g. between test
+            # runs). Write what it left queued before starting over.
+            if self._queue is not None:
+                await database_sync_to_async(self.drain_sync)()
+            self._loop = loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = self._in_flight = [await self._queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            messages = [message for message, _ in batch]
+            for attempt in range(self.retries + 1):
+                try:
+                    save = DB_SECONDS.time(handler='flush_batch')(self._save_batch)
+                    await database_sync_to_async(save)(messages)
+                    break
+                except Exception:
+                    if attempt == self.retries:
+                        logger.exception('Failed to persist %d chat messages, writing them one by one', len(batch))
+                        await database_sync_to_async(self._save_each)(messages)
+                    else:
+                        logger.warning('Failed to persist %d chat messages, retrying', len(batch), exc_info=True)
+                        await asyncio.sleep(self.flush_interval * 2 ** attempt)
+
+            # Not in a finally: if the loop is torn down mid-batch, the batch
+            # stays in flight for drain_sync
+            self._in_flight = []
+            for message, written in batch:
+                if written.cancelled():
+                    pass  # The sender went away
+                elif message.id is None:
+                    written.set_exception(RuntimeError(f'Chat message in room {message.room_id} was not saved'))
+                else:
+                    written.set_result((message.id, message.timestamp.isoformat()))
+                self._queue.task_done()
+
+    @staticmethod
+    def _save_batch(messages):
+        try:
+            save_messages(messages)
+        except Exception:
+            # bulk_create may have set ids before the transaction rolled back
+            for message in messages:
+                message.id = None
+            raise
+
+    def _save(self, messages):
+        try:
+            self._save_batch(messages)
+        except Exception:
+            logger.exception('Failed to persist %d chat messages, writing them one by one', len(messages))
+            self._save_each(messages)
+
+    @classmethod
+    def _save_each(cls, messages):
+        for message in messages:
+            try:
+                cls._save_batch([message])
+            except Exception:
+                logger.exception('Dropping chat message in room %s', message.room_id)
+
+
+_writer = None
+
+
+def get_message_writer():
+    """Return the process-wide writer, or None when write-behind is disabled."""
+    global _writer
+    if not WRITE_BEHIND['ENABLED']:
+        return None
+    if _writer is None:
+        if not connections[DEFAULT_DB_ALIAS].features.can_return_rows_from_bulk_insert:
+            raise ImproperlyConfigured(
+                'CHAT_WRITE_BEHIND needs a database that returns the ids of bulk-inserted rows'
+            )
+        _writer = MessageWriter(
+            batch_size=WRITE_BEHIND['BATCH_SIZE'],
+            flush_interval=WRITE_BEHIND['FLUSH_INTERVAL'],
+            max_queue=WRITE_BEHIND['MAX_QUEUE'],
+            retries=WRITE_BEHIND['RETRIES'],
+        )
+        atexit.register(_writer.drain_sync)
+    return _writer
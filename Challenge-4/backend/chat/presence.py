@@ -0,0 +1,311 @@
+"""
+Who is online in each chat room.
+
+ChatConsumer registers every socket on connect and removes it on disconnect.
+Entries carry a TTL, and each server process refreshes its own sockets from a
+single heartbeat loop. Sockets of a process that died without disconnecting
+expire instead of staying online forever. A user is online while they have at
+least one live socket in the room.
+
+Two backends, picked by CHAT_PRESENCE['BACKEND']:
+
+* ``memory`` keeps everything in this process and goes with the in-memory
+  channel layer.
+* ``redis`` keeps it in Redis so every process sees the same state. It goes
+  with the Redis channel layer. Updates run as Lua scripts, so concurrent
+  processes cannot double-count a socket.
+
+Online counts are kept up to date on every change, so reading them is O(1)
+per room.
+"""
+import asyncio
+import logging
+import threading
+import time
+import redis
+import redis.asyncio
+from channels.layers import get_channel_layer
+from django.conf import settings
+from .encoding import dumps
+
+logger = logging.getLogger(__name__)
+
+PRESENCE = {
+    'BACKEND': 'memory',
+    'TTL': 60,  # seconds a socket stays online without a heartbeat
+    'HEARTBEAT': 20,  # seconds between refreshes of this process's sockets
+    'REDIS_URL': 'redis://localhost:6379/0',
+    **getattr(settings, 'CHAT_PRESENCE', {}),
+}
+
+
+class BasePresence:
+    def __init__(self, ttl=60, heartbeat=20):
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        # (room, user_id, channel_name) of sockets connected to this process
+        self._local = set()
+        self._loop = None
+
+    async def join(self, room, user, channel):
+        """Register a socket; returns (user came online, online count)."""
+        self._ensure_heartbeat()
+        self._local.add((room, user.id, channel))
+        return await self._join(room, user.id, user.username, channel)
+
+    async def leave(self, room, user, channel):
+        """Remove a socket; returns (user went offline, online count)."""
+        self._local.discard((room, user.id, channel))
+        return await self._leave(room, user.id, channel)
+
+    def _ensure_heartbeat(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # First socket, or the previous loop has gone away (e.g. between test runs)
+            self._loop = loop
+            self._heartbeat_task = loop.create_task(self._run_heartbeat())
+
+    async def _run_heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat)
+            try:
+                await self._touch(list(self._local))
+                for room, (left, online) in (await self._expire()).items():
+                    if left:
+                        await publish(room, left=left, online=online)
+            except Exception:
+                logger.exception('Presence heartbeat failed')
+
+
+class MemoryPresence(BasePresence):
+    def __init__(self, ttl=60, heartbeat=20):
+        super().__init__(ttl, heartbeat)
+        # room -> {user_id: [username, {channel_name: expires_at}]}
+        self._rooms = {}
+        # Views read counts from worker threads while consumers write on the event loop
+        self._lock = threading.Lock()
+
+    async def _join(self, room, user_id, username, channel):
+        with self._lock:
+            users = self._rooms.setdefault(room, {})
+            entry = users.setdefault(user_id, [username, {}])
+            first = not entry[1]
+            entry[1][channel] = time.time() + self.ttl
+            return first, len(users)
+
+    async def _leave(self, room, user_id, channel):
+        with self._lock:
+            users = self._rooms.get(room, {})
+            entry = users.get(user_id)
+            last = False
+            if entry is not None and entry[1].pop(channel, None) is not None and not entry[1]:
+                del users[user_id]
+                last = True
+            if not users:
+                self._rooms.pop(room, None)
+            return last, len(users)
+
+    async def _touch(self, sockets):
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            for room, user_id, channel in sockets:
+                entry = self._rooms.get(room, {}).get(user_id)
+                if entry is not None and channel in entry[1]:
+                    entry[1][channel] = expires_at
+
+    async def _expire(self):
+        now = time.time()
+        changes = {}
+        with self._lock:
+            for room, users in list(self._rooms.items()):
+                left = []
+                for user_id, (username, sockets) in list(users.items()):
+                    for channel, expires_at in list(sockets.items()):
+                        if expires_at < now:
+                            del sockets[channel]
+                    if not sockets:
+                        del users[user_id]
+                        left.append(username)
+                if left:
+                    changes[room] = (left, len(users))
+                if not users:
+                    del self._rooms[room]
+        return changes
+
+    async def online(self, room):
+        with self._lock:
+            return sorted(username for username, _ in self._rooms.get(room, {}).values())
+
+    def online_user_ids(self, room):
+        with self._lock:
+            return set(self._rooms.get(room, {}))
+
+    def counts(self, rooms):
+        with self._lock:
+            return {room: len(self._rooms.get(room, ())) for room in rooms}
+
+    async def aonline_user_ids(self, room):
+        return self.online_user_ids(room)
+
+    async def acounts(self, rooms):
+        return self.counts(rooms)
+
+
+# KEYS: sockets zset, refs hash, users hash, rooms set
+# ARGV: socket member, expires_at, user id, username, room
+JOIN_SCRIPT = """
+local first = 0
+if redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1]) == 1 then
+    if redis.call('HINCRBY', KEYS[2], ARGV[3], 1) == 1 then
+        redis.call('HSET', KEYS[3], ARGV[3], ARGV[4])
+        first = 1
+    end
+end
+redis.call('SADD', KEYS[4], ARGV[5])
+return {first, redis.call('HLEN', KEYS[3])}
+"""
+
+# KEYS: sockets zset, refs hash, users hash
+# ARGV: socket member, user id
+LEAVE_SCRIPT = """
+local last = 0
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 1 then
+    if redis.call('HINCRBY', KEYS[2], ARGV[2], -1) <= 0 then
+        redis.call('HDEL', KEYS[2], ARGV[2])
+        redis.call('HDEL', KEYS[3], ARGV[2])
+        last = 1
+    end
+end
+return {last, redis.call('HLEN', KEYS[3])}
+"""
+
+# KEYS: sockets zset, refs hash, users hash, rooms set
+# ARGV: now, room
+EXPIRE_SCRIPT = """
+local left = {}
+for _, member in ipairs(redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])) do
+    redis.call('ZREM', KEYS[1], member)
+    local user_id = string.match(member, '^(%d+):')
+    if redis.call('HINCRBY', KEYS[2], user_id, -1) <= 0 then
+        table.insert(left, redis.call('HGET', KEYS[3], user_id))
+        redis.call('HDEL', KEYS[2], user_id)
+        redis.call('HDEL', KEYS[3], user_id)
+    end
+end
+if redis.call('ZCARD', KEYS[1]) == 0 then
+    redis.call('SREM', KEYS[4], ARGV[2])
+end
+return {left, redis.call('HLEN', KEYS[3])}
+"""
+
+
+class RedisPresence(BasePresence):
+    prefix = 'chat:presence'
+
+    def __init__(self, url, ttl=60, heartbeat=20):
+        super().__init__(ttl, heartbeat)
+        self.url = url
+        # Synchronous views get their own client; consumers and async views use the asyncio one
+        self._sync = redis.Redis.from_url(url, decode_responses=True)
+        self._async = None
+        self._scripts = {}
+
+    def _keys(self, room):
+        base = f'{self.prefix}:{room}'
+        return [f'{base}:sockets', f'{base}:refs', f'{base}:users']
+
+    def _ensure_heartbeat(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # asyncio connections belong to the loop that opened them
+            self._async = redis.asyncio.Redis.from_url(self.url, decode_responses=True)
+            self._scripts = {
+                name: self._async.register_script(source)
+                for name, source in (('join', JOIN_SCRIPT), ('leave', LEAVE_SCRIPT), ('expire', EXPIRE_SCRIPT))
+            }
+        super()._ensure_heartbeat()
+
+    async def _join(self, room, user_id, username, channel):
+        first, online = await self._scripts['join'](
+            keys=self._keys(room) + [f'{self.prefix}:rooms'],
+            args=[f'{user_id}:{channel}', time.time() + self.ttl, user_id, username, room],
+        )
+        return bool(first), online
+
+    async def _leave(self, room, user_id, channel):
+        last, online = await self._scripts['leave'](
+            keys=self._keys(room), args=[f'{user_id}:{channel}', user_id],
+        )
+        return bool(last), online
+
+    async def _touch(self, sockets):
+        expires_at = time.time() + self.ttl
+        async with self._async.pipeline(transaction=False) as pipe:
+            for room, user_id, channel in sockets:
+                pipe.zadd(self._keys(room)[0], {f'{user_id}:{channel}': expires_at}, xx=True)
+            await pipe.execute()
+
+    async def _expire(self):
+        # Every process sweeps every room, so rooms whose processes all died still empty out
+        changes = {}
+        now = time.time()
+        for room in await self._async.smembers(f'{self.prefix}:rooms'):
+            left, online = await self._scripts['expire'](
+                keys=self._keys(room) + [f'{self.prefix}:rooms'], args=[now, room],
+            )
+            if left:
+                changes[room] = (left, online)
+        return changes
+
+    async def online(self, room):
+        return sorted(await self._async.hvals(self._keys(room)[2]))
+
+    def online_user_ids(self, room):
+        return {int(user_id) for user_id in self._sync.hkeys(self._keys(room)[2])}
+
+    async def aonline_user_ids(self, room):
+        self._ensure_heartbeat()
+        return {int(user_id) for user_id in await self._async.hkeys(self._keys(room)[2])}
+
+    def counts(self, rooms):
+        rooms = list(rooms)
+        with self._sync.pipeline(transaction=False) as pipe:
+            for room in rooms:
+                pipe.hlen(self._keys(room)[2])
+            return dict(zip(rooms, pipe.execute()))
+
+    async def acounts(self, rooms):
+        self._ensure_heartbeat()
+        rooms = list(rooms)
+        async with self._async.pipeline(transaction=False) as pipe:
+            for room in rooms:
+                pipe.hlen(self._keys(room)[2])
+            return dict(zip(rooms, await pipe.execute()))
+
+
+async def publish(room, joined=(), left=(), online=0):
+    """Push a presence diff to everyone connected to the room."""
+    # Same group name as ChatConsumer.room_group_name
+    await get_channel_layer().group_send(f'chat_{room}', {
+        'type': 'presence.update',
+        'frame': dumps({
+            'type': 'presence',
+            'joined': list(joined),
+            'left': list(left),
+            'online': online,
+        }),
+    })
+
+
+_presence = None
+
+
+def get_presence():
+    """Return the process-wide presence store."""
+    global _presence
+    if _presence is None:
+        if PRESENCE['BACKEND'] == 'redis':
+            _presence = RedisPresence(PRESENCE['REDIS_URL'], ttl=PRESENCE['TTL'], heartbeat=PRESENCE['HEARTBEAT'])
+        else:
+            _presence = MemoryPresence(ttl=PRESENCE['TTL'], heartbeat=PRESENCE['HEARTBEAT'])
+    return _presence
@@ -0,0 +1,238 @@
+"""
+Per-request profiling: query counts, DB time, duplicate SQL, rendering time
+and response size for a sample of requests, kept in a bounded ring buffer and
+summarised per view on demand.
+
+Enable it by adding ``chat.profiling.ProfilingMiddleware`` to MIDDLEWARE and
+tune it with the ``REQUEST_PROFILING`` setting.
+
+The blog project has its own copy of this module for sync DRF views. This one
+also profiles async views, whose queries run on sync_to_async threads. Chat
+views return JSON built in the view rather than rendered afterwards, so they
+use this module's ``JsonResponse``, and its encoding time is the render time.
+"""
+import random
+import re
+import threading
+import time
+from collections import Counter, deque, namedtuple
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse as BaseJsonResponse
+
+PROFILING = {
+    'ENABLED': True,
+    'SAMPLE_RATE': 1.0,
+    'BUFFER_SIZE': 2000,
+    **getattr(settings, 'REQUEST_PROFILING', {}),
+}
+
+# Upper bounds (ms) of the latency histogram buckets; the last one is open
+LATENCY_BUCKETS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r'\(\s*(?:%s|\?)(?:\s*,\s*(?:%s|\?))*\s*\)')
+
+
+def fingerprint(sql):
+    """Reduce a statement to its shape so repeats with different values match."""
+    sql = _LITERALS.sub('?', sql)
+    return _IN_LISTS.sub('(...)', sql)
+
+
+RequestSample = namedtuple('RequestSample', [
+    'view', 'method', 'status', 'duration_ms', 'queries', 'db_ms',
+    'render_ms', 'response_bytes', 'duplicates',
+])
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.render_seconds = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+
+# The recorder of the request being profiled. Async views run their queries
+# through sync_to_async on another thread and connection, which inherit this
+# context but not an execute_wrapper set on the event loop's.
+_current_recorder = ContextVar('profiling_recorder', default=None)
+
+
+def _record_query(execute, sql, params, many, context):
+    recorder = _current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def _watch_connections():
+    """Install _record_query on the calling thread's connections, once."""
+    for conn in connections.all():
+        if _record_query not in conn.execute_wrappers:
+            conn.execute_wrappers.append(_record_query)
+
+
+class JsonResponse(BaseJsonResponse):
+    """JsonResponse that counts the time spent encoding its body as render time."""
+
+    def __init__(self, *args, **kwargs):
+        start = time.perf_counter()
+        super().__init__(*args, **kwargs)
+        recorder = _current_recorder.get()
+        if recorder is not None:
+            recorder.render_seconds += time.perf_counter() - start
+
+
+def _percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class ProfileStore:
+    """Ring buffer of the most recent request samples."""
+
+    def __init__(self, size):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, sample):
+        with self._lock:
+            self._samples.append(sample)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+    def report(self):
+        """Summarise the buffered samples per view, slowest views first."""
+        with self._lock:
+            samples = list(self._samples)
+
+        by_view = {}
+        for sample in samples:
+            by_view.setdefault(sample.view, []).append(sample)
+
+        views = []
+        for view, view_samples in by_view.items():
+            durations = sorted(s.duration_ms for s in view_samples)
+            histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+            for duration in durations:
+                histogram[next((i for i, bound in enumerate(LATENCY_BUCKETS) if duration <= bound),
+                               len(LATENCY_BUCKETS))] += 1
+            duplicates = Counter()
+            for s in view_samples:
+                duplicates.update(dict(s.duplicates))
+            count = len(view_samples)
+            views.append({
+                'view': view,
+                'requests': count,
+                'errors': sum(1 for s in view_samples if s.status >= 500),
+                'latency_ms': {
+                    'p50': round(_percentile(durations, 50), 3),
+                    'p95': round(_percentile(durations, 95), 3),
+                    'p99': round(_percentile(durations, 99), 3),
+                    'max': round(durations[-1], 3),
+                },
+                'latency_histogram': {
+                    **{f'le_{bound}': n for bound, n in zip(LATENCY_BUCKETS, histogram)},
+                    'inf': histogram[-1],
+                },
+                'queries_avg': round(sum(s.queries for s in view_samples) / count, 2),
+                'queries_max': max(s.queries for s in view_samples),
+                'db_ms_avg': round(sum(s.db_ms for s in view_samples) / count, 3),
+                'render_ms_avg': round(sum(s.render_ms for s in view_samples) / count, 3),
+                'response_bytes_avg': round(sum(s.response_bytes for s in view_samples) / count),
+                'duplicate_queries': [
+                    {'sql': sql, 'executions': n} for sql, n in duplicates.most_common(5)
+                ],
+            })
+
+        views.sort(key=lambda v: v['latency_ms']['p95'], reverse=True)
+        return {'samples': len(samples), 'buffer_size': self._samples.maxlen, 'views': views}
+
+
+profile_store = ProfileStore(PROFILING['BUFFER_SIZE'])
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    # Async views run without a thread hop through this middleware
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self._sampled():
+            return self.get_response(request)
+
+        _watch_connections()
+        recorder = QueryRecorder()
+        request._profiling_render_start = None
+        start = time.perf_counter()
+        token = _current_recorder.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_recorder.reset(token)
+        self._record(request, response, recorder, start)
+        return response
+
+    async def __acall__(self, request):
+        if not self._sampled():
+            return await self.get_response(request)
+
+        # On the thread sync_to_async runs this request's queries on
+        await sync_to_async(_watch_connections)()
+        recorder = QueryRecorder()
+        request._profiling_render_start = None
+        start = time.perf_counter()
+        token = _current_recorder.set(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_recorder.reset(token)
+        self._record(request, response, recorder, start)
+        return response
+
+    def _sampled(self):
+        return PROFILING['ENABLED'] and random.random() < PROFILING['SAMPLE_RATE']
+
+    def _record(self, request, response, recorder, start):
+        end = time.perf_counter()
+        render_start = request._profiling_render_start
+        match = request.resolver_match
+        profile_store.add(RequestSample(
+            view=match.view_name if match else 'unresolved',
+            method=request.method,
+            status=response.status_code,
+            duration_ms=(end - start) * 1000,
+            queries=recorder.count,
+            db_ms=recorder.seconds * 1000,
+            # DRF and template responses are rendered after the view returns,
+            # chat's JsonResponse while the view builds it
+            render_ms=(end - render_start) * 1000 if render_start else recorder.render_seconds * 1000,
+            response_bytes=0 if response.streaming else len(response.content),
+            duplicates=tuple((sql, n) for sql, n in recorder.fingerprints.items() if n > 1),
+        ))
+
+    def process_template_response(self, request, response):
+        request._profiling_render_start = time.perf_counter()
+        return response
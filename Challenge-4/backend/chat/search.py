@@ -0,0 +1,212 @@
+"""
+Full-text search over chat messages.
+
+Two backends, picked by CHAT_SEARCH['BACKEND']:
+
+* ``fts5`` queries the SQLite FTS5 index ``chat_message_fts``, keyed by
+  message id, and ranks results with bm25.
+* ``python`` tokenizes messages here and keeps an inverted index in the
+  MessageTerm table. It works on any database and ranks with a BM25-style
+  idf weight.
+
+``auto`` uses FTS5 when its table exists. Migration 0008 creates it only on
+SQLite builds that have FTS5.
+
+Both indexes are updated as messages are saved and deleted, and
+``manage.py rebuild_search_index`` rebuilds them in bulk. Searches match
+every word of the query, are limited to rooms the user can read, and are
+ordered by relevance, then newest first. They are paged by page number, like
+blog search: scores move whenever the index changes, so a cursor holding the
+last score seen would skip or repeat results.
+"""
+import math
+import re
+from collections import Counter
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Count, F, FloatField, Max, Q, Sum, Value, When
+from .models import Message, MessageTerm, Room
+
+SEARCH = {
+    'BACKEND': 'auto',
+    'PAGE_SIZE': 20,
+    'PAGE_MAX': 50,
+    **getattr(settings, 'CHAT_SEARCH', {}),
+}
+
+FTS_TABLE = 'chat_message_fts'
+TERM_LENGTH = MessageTerm._meta.get_field('term').max_length
+WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Split text into the lowercase words both backends index and match."""
+    return [word for word in WORD.findall(text.lower()) if len(word) <= TERM_LENGTH]
+
+
+class Fts5Search:
+    name = 'fts5'
+
+    def index(self, messages):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE}(rowid, content) VALUES (%s, %s)',
+                [(message.id, message.content) for message in messages],
+            )
+
+    def remove(self, messages):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                [(message.id,) for message in messages],
+            )
+
+    def rebuild(self, batch_size):
+        messages = Message._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            last_id = 0
+            while True:
+                cursor.execute(
+                    f'SELECT MAX(id) FROM (SELECT id FROM {messages} WHERE id > %s ORDER BY id LIMIT %s)',
+                    [last_id, batch_size],
+                )
+                upto = cursor.fetchone()[0]
+                if upto is None:
+                    break
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE}(rowid, content) SELECT id, content FROM {messages} '
+                    'WHERE id > %s AND id <= %s',
+                    [last_id, upto],
+                )
+                last_id = upto
+
+    def search(self, terms, rooms, offset, limit):
+        """Return up to ``limit`` (message id, score) pairs, best first, skipping the first ``offset``."""
+        rooms_sql, rooms_params = rooms.values('id').query.sql_with_params()
+        # bm25 is lower for better matches; negate it so every backend sorts score descending
+        score = f'-bm25({FTS_TABLE})'
+        sql = (
+            f'SELECT m.id, {score} FROM {FTS_TABLE} '
+            f'JOIN {Message._meta.db_table} m ON m.id = {FTS_TABLE}.rowid '
+            f'WHERE {FTS_TABLE} MATCH %s AND m.room_id IN ({rooms_sql})'
+        )
+        params = [' '.join(f'"{term}"' for term in terms), *rooms_params]
+        sql += f' ORDER BY {score} DESC, m.timestamp DESC, m.id DESC LIMIT %s OFFSET %s'
+        params += [limit, offset]
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+class PythonSearch:
+    name = 'python'
+
+    def index(self, messages):
+        self._insert((message.id, message.room_id, message.content) for message in messages)
+
+    def remove(self, messages):
+        # MessageTerm rows are deleted with their message by the cascade
+        pass
+
+    def rebuild(self, batch_size):
+        MessageTerm.objects.all().delete()
+        last_id = 0
+        while True:
+            batch = list(
+                Message.objects.filter(pk__gt=last_id).order_by('pk')
+                .values_list('id', 'room_id', 'content')[:batch_size]
+            )
+            if not batch:
+                break
+            self._insert(batch)
+            last_id = batch[-1][0]
+
+    def _insert(self, messages):
+        # executemany rather than bulk_create: a message has a row per distinct
+        # word, and building model instances for them dominates a rebuild
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {MessageTerm._meta.db_table} (term, message_id, room_id, count) '
+                'VALUES (%s, %s, %s, %s)',
+                [
+                    (term, message_id, room_id, count)
+                    for message_id, room_id, content in messages
+                    for term, count in Counter(tokenize(content)).items()
+                ],
+            )
+
+    def search(self, terms, rooms, offset, limit):
+        """Return up to ``limit`` (message id, score) pairs, best first, skipping the first ``offset``."""
+        postings = MessageTerm.objects.filter(term__in=terms)
+        frequencies = dict(postings.order_by().values_list('term').annotate(n=Count('*')))
+        if len(frequencies) < len(terms):
+            # Some word appears in no message at all
+            return []
+
+        # BM25's idf: words found in fewer messages weigh more
+        total = Room.objects.aggregate(n=Sum('message_count'))['n'] or 0
+        score = Sum(Case(
+            *[When(term=term, then=F('count') * Value(math.log(1 + (total - n + 0.5) / (n + 0.5))))
+              for term, n in frequencies.items()],
+            output_field=FloatField(),
+        ))
+        hits = (
+            postings.filter(room__in=rooms).values('message_id')
+            .annotate(matched=Count('*'), score=score, timestamp=Max('message__timestamp'))
+            .filter(matched=len(terms))
+        )
+        hits = hits.order_by('-score', '-timestamp', '-message_id')[offset:offset + limit]
+        return [(hit['message_id'], hit['score']) for hit in hits]
+
+
+_backend = None
+
+
+def get_search_backend():
+    """Return the process-wide search backend."""
+    global _backend
+    if _backend is None:
+        name = SEARCH['BACKEND']
+        if name == 'auto':
+            name = 'fts5' if FTS_TABLE in connection.introspection.table_names() else 'python'
+        _backend = Fts5Search() if name == 'fts5' else PythonSearch()
+    return _backend
+
+
+def find_messages(user, query, room=None, page=1, limit=SEARCH['PAGE_SIZE']):
+    """
+    Return page ``page`` (from 1) of the messages matching every word of
+    ``query``, from ``room`` or else from every room ``user`` can read, plus
+    whether there is a next page. Callers check access to ``room``.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return [], False
+    if room is not None:
+        rooms = Room.objects.filter(pk=room.pk)
+    else:
+        rooms = Room.objects.filter(
+            Q(privacy='public') |
+            Q(privacy='private', id__in=user.joined_rooms.values('id'))
+        )
+
+    # One extra row tells whether there is a next page without counting every match
+    hits = get_search_backend().search(terms, rooms, (page - 1) * limit, limit + 1)
+    has_next = len(hits) > limit
+    hits = hits[:limit]
+    messages = {
+        message['id']: message for message in Message.objects.filter(id__in=[message_id for message_id, _ in hits])
+        .values('id', 'content', 'timestamp', 'user__username', 'room__name')
+    }
+    # A message deleted since the search is left out of its page
+    hits = [(messages[message_id], score) for message_id, score in hits if message_id in messages]
+
+    return [{
+        'id': message['id'],
+        'room': message['room__name'],
+        'message': message['content'],
+        'username': message['user__username'],
+        'timestamp': message['timestamp'].isoformat(),
+    } for message, _ in hits], has_next
@@ -0,0 +1,113 @@
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_init, post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+from .auth import token_user_cache
+from .authentication import revoke_tokens
+from .counters import add_participants, record_messages
+from .models import ClaimsUser, Room, Message
+from .search import get_search_backend
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=ClaimsUser)
+@receiver(post_delete, sender=User)
+def invalidate_cached_tokens(sender, instance, **kwargs):
+    # Deactivation, password changes and deletions must not be served from the
+    # WebSocket auth cache
+    token_user_cache.invalidate_user(instance.pk)
+
+
+# Signed into tokens by add_user_claims, or (password) must not outlive a change
+CREDENTIAL_FIELDS = ('password', 'username', 'is_active')
+
+
+def _remember_credentials(instance):
+    # Deferred fields aren't in __dict__ and are left out
+    instance._saved_credentials = {
+        name: instance.__dict__[name] for name in CREDENTIAL_FIELDS if name in instance.__dict__
+    }
+
+
+@receiver(post_init, sender=User)
+@receiver(post_init, sender=ClaimsUser)
+def remember_loaded_credentials(sender, instance, **kwargs):
+    _remember_credentials(instance)
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=ClaimsUser)
+def revoke_tokens_on_credential_change(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding:
+        return
+    fields = set(CREDENTIAL_FIELDS) - instance.get_deferred_fields()
+    if update_fields is not None:
+        fields &= set(update_fields)
+    if not fields:
+        return
+    # Compared with the values the instance was loaded with; only fields loaded
+    # later, e.g. a deferred password, need a query
+    saved = getattr(instance, '_saved_credentials', {})
+    changed = any(saved[name] != getattr(instance, name) for name in fields & saved.keys())
+    unknown = fields - saved.keys()
+    if not changed and unknown:
+        current = User.objects.filter(pk=instance.pk).values(*unknown).first()
+        changed = bool(current) and any(current[name] != getattr(instance, name) for name in unknown)
+    if changed:
+        revoke_tokens(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=ClaimsUser)
+def remember_saved_credentials(sender, instance, **kwargs):
+    _remember_credentials(instance)
+
+
+@receiver(m2m_changed, sender=Room.participants.through)
+def update_participant_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    # pk_set only holds memberships that were actually added or removed
+    if action in ('post_add', 'post_remove'):
+        delta = 1 if action == 'post_add' else -1
+        if reverse:
+            # user.joined_rooms.add(*rooms): each of those rooms changes by one
+            add_participants(pk_set, delta)
+        else:
+            add_participants([instance.pk], delta * len(pk_set))
+    elif action == 'pre_clear' and reverse:
+        instance._cleared_room_ids = list(instance.joined_rooms.values_list('id', flat=True))
+    elif action == 'post_clear':
+        if reverse:
+            add_participants(instance._cleared_room_ids, -1)
+        else:
+            Room.objects.filter(pk=instance.pk).update(participant_count=0)
+
+
+@receiver(pre_delete, sender=User)
+def leave_rooms_on_user_delete(sender, instance, **kwargs):
+    # Memberships are removed by the cascade, which sends no m2m_changed
+    add_participants(instance.joined_rooms.values('id'), -1)
+
+
+@receiver(post_save, sender=Message)
+def count_new_message(sender, instance, created, **kwargs):
+    if created:
+        record_messages(instance.room_id, 1, instance.timestamp, instance.content)
+
+
+@receiver(post_delete, sender=Message)
+def uncount_deleted_message(sender, instance, **kwargs):
+    # The last-message fields are left alone; repair_room_counters recomputes them
+    Room.objects.filter(pk=instance.room_id, message_count__gt=0).update(
+        message_count=F('message_count') - 1
+    )
+
+
+@receiver(post_save, sender=Message)
+def index_new_message(sender, instance, created, **kwargs):
+    if created:
+        get_search_backend().index([instance])
+
+
+@receiver(post_delete, sender=Message)
+def unindex_deleted_message(sender, instance, **kwargs):
+    get_search_backend().remove([instance])
@@ -1,3 +1,715 @@
-from django.test import TestCase
+import asyncio
+import json
+import re
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+from asgiref.sync import sync_to_async
+from channels.exceptions import ChannelFull
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+from .auth import token_user_cache
+from .batching import BATCHING, RoomBatcher, batch_frame
+from .authentication import add_user_claims, revoke_tokens, token_version
+from .counters import recompute_room_counters
+from .credentials import AUTH_RATE_LIMIT
+from .layers import ShardedInMemoryChannelLayer
+from .loaders import ROOM_ORDERINGS, decode_room_cursor, load_chat_history, load_room_page
+from .models import Message, Room
+from .presence import MemoryPresence
+from .persistence import WRITE_BEHIND, MessageWriter, save_messages
+from .profiling import PROFILING, profile_store
+from .search import Fts5Search, PythonSearch, find_messages
 
-# Create your tests here.
+
+def bearer(user):
+    return {'Authorization': f'Bearer {add_user_claims(AccessToken.for_user(user), user)}'}
+
+
+class AsyncViewProfilingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pass')
+        room = Room.objects.create(name='lobby', creator=self.user)
+        room.participants.add(self.user)
+        self.headers = bearer(self.user)
+        profile_store.clear()
+
+    @mock.patch.dict(PROFILING, {'ENABLED': True, 'SAMPLE_RATE': 1.0})
+    async def test_async_views_record_their_queries(self):
+        for path in ['/chat/rooms/', '/chat/room/lobby/participants/']:
+            response = await self.async_client.get(path, headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+
+        views = {view['view']: view for view in profile_store.report()['views']}
+        for name in ['list_rooms', 'room_participants']:
+            self.assertGreater(views[name]['queries_avg'], 0)
+            self.assertGreater(views[name]['db_ms_avg'], 0)
+            self.assertGreater(views[name]['render_ms_avg'], 0)
+
+    @mock.patch.dict(PROFILING, {'ENABLED': True, 'SAMPLE_RATE': 1.0})
+    def test_sync_requests_record_queries_and_encoding(self):
+        response = self.client.get('/chat/rooms/', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+
+        [view] = profile_store.report()['views']
+        self.assertEqual(view['queries_max'], 3)
+        self.assertGreater(view['render_ms_avg'], 0)
+
+
+class QueryBudgetTests(TestCase):
+    """Each path runs a fixed number of queries, however many rows there are."""
+
+    # Exact counts: fewer is a change too, so update the number to keep it tight
+    QUERY_BUDGETS = {
+        'chat_history': 1,
+        # The user row, then one query each for public and private rooms
+        'list_rooms': 3,
+        # As above, plus one more per part: only the first room has messages, so
+        # the page runs past the rooms with messages in both parts
+        'list_rooms_by_activity': 5,
+    }
+
+    def seed(self, size):
+        Room.objects.all().delete()
+        User.objects.all().delete()
+        users = User.objects.bulk_create([User(username=f'user{i}') for i in range(10)])
+        owner = users[0]
+        rooms = Room.objects.bulk_create([
+            Room(name=f'room{i}', creator=owner, privacy='private' if i % 2 else 'public')
+            for i in range(size)
+        ])
+        Membership = Room.participants.through
+        Membership.objects.bulk_create([Membership(room_id=room.id, user_id=owner.id) for room in rooms])
+        Message.objects.bulk_create([
+            Message(room=rooms[0], user=users[i % len(users)], content=f'message {i}') for i in range(size)
+        ])
+        return owner, rooms[0]
+
+    def test_paths_run_their_budget_at_every_size(self):
+        for size in [10, 1000]:
+            owner, room = self.seed(size)
+            headers = bearer(owner)
+            with self.subTest(path='chat_history', size=size):
+                with self.assertNumQueries(self.QUERY_BUDGETS['chat_history']):
+                    load_chat_history(room.id)
+            for path, query in [('list_rooms', ''), ('list_rooms_by_activity', '?sort=activity')]:
+                with self.subTest(path=path, size=size):
+                    with self.assertNumQueries(self.QUERY_BUDGETS[path]):
+                        response = self.client.get(f'/chat/rooms/{query}', headers=headers)
+                    self.assertEqual(response.status_code, 200)
+
+
+class RoomDirectoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        for name in ['help', 'General', 'gaming', 'Garden']:
+            Room.objects.create(name=name, creator=self.user)
+        Room.objects.create(name='Galaxy', creator=self.user, privacy='private').participants.add(self.user)
+        Room.objects.create(name='gated', creator=self.user, privacy='private')
+
+    def names(self, **kwargs):
+        rooms, _ = load_room_page(self.user, **kwargs)
+        return [room['name'] for room in rooms]
+
+    def test_names_sort_case_insensitively(self):
+        self.assertEqual(self.names(), ['Galaxy', 'gaming', 'Garden', 'General', 'help'])
+
+    def test_prefix_matches_any_case(self):
+        self.assertEqual(self.names(prefix='gen'), ['General'])
+        self.assertEqual(self.names(prefix='GA'), ['Galaxy', 'gaming', 'Garden'])
+
+    def test_pages_follow_the_cursor(self):
+        for sort in ROOM_ORDERINGS:
+            names, after = [], None
+            while True:
+                rooms, cursor = load_room_page(self.user, sort, after=after, limit=2)
+                names += [room['name'] for room in rooms]
+                if cursor is None:
+                    break
+                after = decode_room_cursor(sort, cursor)
+            self.assertEqual(names, ['Galaxy', 'gaming', 'Garden', 'General', 'help'], sort)
+
+
+# Plan lines that mean a query reads a whole table or sorts outside an index
+BAD_PLAN = re.compile(r'\bSCAN (?!.*\bUSING (COVERING )?INDEX\b)|USE TEMP B-TREE')
+TEMP_SORT = re.compile(r'USE TEMP B-TREE')
+# The private half of the room directory is read through the user's memberships
+# and sorted afterwards. That sort only ever holds one user's rooms.
+PER_USER = re.compile(r'SEARCH chat_room_participants USING (COVERING )?INDEX \S+ \(user_id=\?\)')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plan checks only understand SQLite plans')
+class QueryPlanTests(TestCase):
+    """Every statement the chat loaders run reads through an index, never a full scan or a temporary sort."""
+
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create([User(username=f'user{i}') for i in range(20)])
+        rooms = Room.objects.bulk_create([
+            Room(name=f'room{i}', creator=users[i % 20], privacy='private' if i % 4 == 0 else 'public')
+            for i in range(400)
+        ])
+        Membership = Room.participants.through
+        Membership.objects.bulk_create([Membership(room_id=room.id, user_id=room.creator_id) for room in rooms])
+        now = timezone.now()
+        Message.objects.bulk_create([
+            Message(room=rooms[i % 400], user=users[i % 20], content=f'message {i}',
+                    timestamp=now - timedelta(seconds=i))
+            for i in range(4000)
+        ])
+        recompute_room_counters(Room.objects.all())
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def statements(self):
+        """Yield (name, sql) for every statement the loaders run in each scenario."""
+        room = Room.objects.order_by('id').first()
+        user = room.creator
+        newest = Message.objects.filter(room=room).order_by('-timestamp', '-id').first()
+        scenarios = [
+            ('chat history snapshot', lambda: load_chat_history(room.id)),
+            ('chat history page', lambda: load_chat_history(room.id, before=(newest.timestamp, newest.id))),
+            ('rooms by name', lambda: load_room_page(user)),
+            ('rooms by name, next page', lambda: load_room_page(user, after=(room.name, None))),
+            ('rooms by name prefix', lambda: load_room_page(user, prefix='room12')),
+            ('rooms by recent activity', lambda: load_room_page(user, 'activity')),
+            ('rooms by recent activity, next page',
+             lambda: load_room_page(user, 'activity', after=(room.name, newest.timestamp))),
+            ('idle rooms', lambda: load_room_page(user, 'activity', after=(room.name, None))),
+        ]
+        for name, load in scenarios:
+            with CaptureQueriesContext(connection) as captured:
+                load()
+            for query in captured:
+                # The room directory reads public rooms and the user's private ones separately
+                part = ' (private rooms)' if Room.participants.through._meta.db_table in query['sql'] else ''
+                yield name + part, query['sql']
+
+    def test_loader_queries_use_indexes(self):
+        for name, sql in self.statements():
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = '\n'.join(' '.join(str(value) for value in row) for row in cursor.fetchall())
+            per_user = PER_USER.search(plan)
+            with self.subTest(name, plan=plan):
+                self.assertFalse(any(
+                    BAD_PLAN.search(line) and not (per_user and TEMP_SORT.search(line))
+                    for line in plan.splitlines()
+                ))
+
+
+class ClaimsAuthenticationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.headers = bearer(self.user)
+
+    def user_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/chat/rooms/', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return [query['sql'] for query in queries if 'FROM "auth_user"' in query['sql']]
+
+    def test_async_views_load_the_user_by_default(self):
+        self.assertEqual(len(self.user_queries()), 1)
+
+    @override_settings(REST_FRAMEWORK={
+        'DEFAULT_AUTHENTICATION_CLASSES': ('chat.authentication.ClaimsJWTAuthentication',),
+    })
+    def test_async_views_take_the_user_from_claims_when_opted_in(self):
+        self.assertEqual(self.user_queries(), [])
+
+
+class CredentialChangeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('alice', password='pass')
+        self.user = User.objects.get(username='alice')
+
+    def test_save_without_credential_change_only_writes(self):
+        self.user.first_name = 'Alice'
+        with self.assertNumQueries(1):
+            self.user.save(update_fields=['first_name'])
+        with self.assertNumQueries(1):
+            self.user.save()
+        self.assertEqual(token_version(self.user.pk), 0)
+
+    def test_credential_change_revokes_tokens(self):
+        self.user.username = 'alicia'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(token_version(self.user.pk), 1)
+
+
+class WebSocketRevocationTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='pass')
+        Room.objects.create(name='lobby', creator=self.user)
+        self.token = str(add_user_claims(AccessToken.for_user(self.user), self.user))
+        token_user_cache.clear()
+
+    async def connect(self):
+        from backend.asgi import application
+        communicator = WebsocketCommunicator(application, f'/ws/chat/lobby/?token={self.token}')
+        connected, _ = await communicator.connect()
+        await communicator.disconnect()
+        return connected
+
+    async def test_password_change_revokes_socket_token(self):
+        self.assertTrue(await self.connect())
+
+        def change_password():
+            self.user.set_password('new pass')
+            self.user.save()
+        await sync_to_async(change_password)()
+
+        self.assertFalse(await self.connect())
+
+    async def test_revoked_token_is_not_served_from_cache(self):
+        self.assertTrue(await self.connect())
+        self.assertIsNotNone(token_user_cache.get(self.token))
+
+        await sync_to_async(revoke_tokens)(self.user.pk)
+
+        self.assertIsNone(token_user_cache.get(self.token))
+        self.assertFalse(await self.connect())
+
+
+class RoomAccessTests(TransactionTestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.secret = Room.objects.create(name='secret', creator=self.bob, privacy='private')
+        self.secret.participants.add(self.bob)
+        self.tokens = {
+            user.username: add_user_claims(AccessToken.for_user(user), user) for user in [self.alice, self.bob]
+        }
+
+    async def first_frame(self, username, room_name):
+        from backend.asgi import application
+        token = self.tokens[username]
+        communicator = WebsocketCommunicator(application, f'/ws/chat/{room_name}/?token={token}')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        frame = await communicator.receive_output()
+        await communicator.disconnect()
+        return frame
+
+    async def test_missing_room_is_not_created(self):
+        frame = await self.first_frame('alice', 'nowhere')
+        self.assertEqual(frame, {'type': 'websocket.close', 'code': 4404})
+        self.assertFalse(await Room.objects.filter(name='nowhere').aexists())
+
+    async def test_private_room_refuses_non_participants(self):
+        frame = await self.first_frame('alice', 'secret')
+        self.assertEqual(frame, {'type': 'websocket.close', 'code': 4403})
+
+    async def test_private_room_admits_participants(self):
+        frame = await self.first_frame('bob', 'secret')
+        self.assertEqual(json.loads(frame['text'])['type'], 'presence_state')
+
+
+class MessageWriterTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.room = Room.objects.create(name='lobby', creator=self.user)
+
+    def send(self, writer, *contents):
+        async def run():
+            written = [await writer.enqueue(self.room, self.user, content) for content in contents]
+            return await asyncio.gather(*written)
+        return asyncio.run(run())
+
+    def test_ids_come_from_the_database(self):
+        writer = MessageWriter(flush_interval=0.01)
+        first = self.send(writer, 'one', 'two')
+        # Another writer, e.g. the admin or a second process, between batches
+        other = Message.objects.create(room=self.room, user=self.user, content='elsewhere')
+        second = self.send(writer, 'three')
+
+        ids = [message_id for message_id, _ in first + second]
+        self.assertEqual(len(set(ids + [other.id])), 4)
+        self.assertEqual(
+            list(Message.objects.filter(id__in=ids).order_by('id').values_list('content', flat=True)),
+            ['one', 'two', 'three'],
+        )
+
+    def test_failed_batch_is_retried(self):
+        writer = MessageWriter(flush_interval=0.01, retries=1)
+        calls = []
+
+        def flaky(messages, batch_size=None):
+            calls.append(len(messages))
+            if len(calls) == 1:
+                raise Exception('database is locked')
+            save_messages(messages, batch_size)
+
+        with mock.patch('chat.persistence.save_messages', flaky), self.assertLogs('chat.persistence', 'WARNING'):
+            (message_id, _), = self.send(writer, 'hello')
+        self.assertEqual(calls, [1, 1])
+        self.assertTrue(Message.objects.filter(id=message_id).exists())
+
+    def test_message_failing_on_its_own_errors_its_future(self):
+        writer = MessageWriter(flush_interval=0.01, retries=0)
+
+        def broken(messages, batch_size=None):
+            raise Exception('room deleted')
+
+        with mock.patch('chat.persistence.save_messages', broken), self.assertLogs('chat.persistence', 'ERROR'):
+            with self.assertRaises(RuntimeError):
+                self.send(writer, 'hello')
+        self.assertFalse(Message.objects.exists())
+
+    def test_queue_left_by_a_previous_loop_is_written(self):
+        writer = MessageWriter(flush_interval=60)
+
+        async def enqueue_only():
+            await writer.enqueue(self.room, self.user, 'queued')
+        asyncio.run(enqueue_only())
+        self.assertEqual(writer.backlog(), 1)
+
+        writer.flush_interval = 0.01
+        self.send(writer, 'next')
+        self.assertEqual(
+            sorted(Message.objects.values_list('content', flat=True)), ['next', 'queued']
+        )
+
+    @mock.patch.dict(WRITE_BEHIND, {'ENABLED': True, 'FLUSH_INTERVAL': 0.01})
+    @mock.patch('chat.persistence._writer', None)
+    def test_consumer_broadcasts_the_database_id(self):
+        from backend.asgi import application
+        token = str(add_user_claims(AccessToken.for_user(self.user), self.user))
+
+        async def chat():
+            communicator = WebsocketCommunicator(application, f'/ws/chat/lobby/?token={token}')
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            await communicator.receive_json_from()  # presence_state
+            await communicator.send_json_to({'message': 'hello'})
+            while True:
+                frame = await communicator.receive_json_from()
+                if frame['type'] == 'chat_message':
+                    break
+            await communicator.disconnect()
+            return frame
+
+        frame = asyncio.run(chat())
+        self.assertEqual(Message.objects.get(id=frame['id']).content, 'hello')
+
+
+class LoginLockoutTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user('bob', password='correct horse')
+        self.window = AUTH_RATE_LIMIT['WINDOW']
+        self.limit = AUTH_RATE_LIMIT['LOGIN_FAILURES_PER_USERNAME']
+
+    def login(self, password):
+        return self.client.post('/chat/auth/login/', {'username': 'bob', 'password': password}, content_type='application/json').status_code
+
+    @mock.patch('chat.credentials.time')
+    def test_lockout_window_slides(self, clock):
+        start = self.window * 1_000_000
+        clock.time.return_value = start
+        for _ in range(self.limit):
+            self.assertEqual(self.login('wrong'), 401)
+        # Locked out, even with the right password
+        self.assertEqual(self.login('correct horse'), 429)
+
+        # A window later every failure still overlaps the sliding window
+        clock.time.return_value = start + self.window
+        self.assertEqual(self.login('correct horse'), 429)
+
+        # Half a window on, only half of them count
+        clock.time.return_value = start + self.window * 1.5
+        self.assertEqual(self.login('correct horse'), 200)
+
+    def test_successful_logins_are_not_counted(self):
+        for _ in range(self.limit + 1):
+            self.assertEqual(self.login('correct horse'), 200)
+
+
+class RegistrationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def register(self, username):
+        return self.client.post(
+            '/chat/auth/register/', {'username': username, 'password': 'pass'}, content_type='application/json',
+        )
+
+    def test_taken_username_is_left_to_the_unique_constraint(self):
+        self.assertEqual(self.register('alice').status_code, 200)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.register('alice')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Username already exists'})
+        self.assertFalse([query for query in queries if query['sql'].startswith('SELECT')])
+
+
+class SearchTestsMixin:
+    backend = None
+
+    def setUp(self):
+        patcher = mock.patch('chat.search._backend', self.backend())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.lobby = Room.objects.create(name='lobby', creator=self.bob)
+        self.secret = Room.objects.create(name='secret', creator=self.bob, privacy='private')
+        self.secret.participants.add(self.bob)
+
+    def say(self, room, content):
+        return Message.objects.create(room=room, user=self.bob, content=content)
+
+    def contents(self, user, query, **kwargs):
+        results, _ = find_messages(user, query, **kwargs)
+        return [result['message'] for result in results]
+
+    def test_matches_every_word(self):
+        self.say(self.lobby, 'deploy the release today')
+        self.say(self.lobby, 'deploy tomorrow')
+        self.assertEqual(self.contents(self.alice, 'Deploy release'), ['deploy the release today'])
+        self.assertEqual(self.contents(self.alice, 'nothing matches'), [])
+
+    def test_private_rooms_need_membership(self):
+        self.say(self.lobby, 'launch plan')
+        self.say(self.secret, 'launch secret plan')
+        self.assertEqual(self.contents(self.alice, 'launch'), ['launch plan'])
+        self.secret.participants.add(self.alice)
+        self.assertCountEqual(self.contents(self.alice, 'launch'), ['launch plan', 'launch secret plan'])
+
+    def test_pages_do_not_overlap(self):
+        for i in range(5):
+            self.say(self.lobby, f'standup note {i}')
+        first, has_next = find_messages(self.alice, 'standup', page=1, limit=3)
+        second, has_more = find_messages(self.alice, 'standup', page=2, limit=3)
+        self.assertTrue(has_next)
+        self.assertFalse(has_more)
+        ids = [result['id'] for result in first + second]
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(len(set(ids)), 5)
+
+    def test_deleted_messages_are_not_found(self):
+        message = self.say(self.lobby, 'oops typo')
+        message.delete()
+        self.assertEqual(self.contents(self.alice, 'typo'), [])
+
+    def test_endpoint(self):
+        for i in range(3):
+            self.say(self.lobby, f'retro item {i}')
+        self.say(self.secret, 'retro secret')
+        headers = bearer(self.alice)
+
+        response = self.client.get('/chat/search/?q=retro&limit=2&page=2', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((len(body['results']), body['next_page'], body['previous_page']), (1, None, 1))
+
+        response = self.client.get('/chat/search/?q=retro&room=secret', headers=headers)
+        self.assertEqual(response.status_code, 403)
+        response = self.client.get('/chat/search/', headers=headers)
+        self.assertEqual(response.status_code, 400)
+
+
+class Fts5SearchTests(SearchTestsMixin, TestCase):
+    backend = Fts5Search
+
+
+class PythonSearchTests(SearchTestsMixin, TestCase):
+    backend = PythonSearch
+
+
+class MemoryPresenceTests(SimpleTestCase):
+    alice = SimpleNamespace(id=1, username='alice')
+    bob = SimpleNamespace(id=2, username='bob')
+
+    def test_online_while_any_socket_is_open(self):
+        presence = MemoryPresence()
+
+        async def run():
+            self.assertEqual(await presence.join('lobby', self.alice, 'a1'), (True, 1))
+            self.assertEqual(await presence.join('lobby', self.alice, 'a2'), (False, 1))
+            self.assertEqual(await presence.join('lobby', self.bob, 'b1'), (True, 2))
+            self.assertEqual(await presence.leave('lobby', self.alice, 'a1'), (False, 2))
+            self.assertEqual(await presence.online('lobby'), ['alice', 'bob'])
+            self.assertEqual(await presence.leave('lobby', self.alice, 'a2'), (True, 1))
+            self.assertEqual(presence.counts(['lobby', 'empty']), {'lobby': 1, 'empty': 0})
+        asyncio.run(run())
+
+    @mock.patch('chat.presence.time')
+    def test_sockets_expire_without_a_heartbeat(self, clock):
+        presence = MemoryPresence(ttl=60)
+
+        async def run():
+            clock.time.return_value = 1000
+            await presence.join('lobby', self.alice, 'a1')
+            await presence.join('lobby', self.bob, 'b1')
+
+            # Only alice's socket is still on this process to be refreshed
+            presence._local.discard(('lobby', self.bob.id, 'b1'))
+            clock.time.return_value = 1030
+            await presence._touch(list(presence._local))
+
+            clock.time.return_value = 1070
+            self.assertEqual(await presence._expire(), {'lobby': (['bob'], 1)})
+            self.assertEqual(await presence.online('lobby'), ['alice'])
+
+            clock.time.return_value = 1100
+            self.assertEqual(await presence._expire(), {'lobby': (['alice'], 0)})
+            self.assertEqual(presence.counts(['lobby']), {'lobby': 0})
+        asyncio.run(run())
+
+    @mock.patch('chat.presence.publish', new_callable=mock.AsyncMock)
+    def test_heartbeat_announces_expired_users(self, publish):
+        presence = MemoryPresence(ttl=0.01, heartbeat=0.02)
+
+        async def run():
+            await presence.join('lobby', self.alice, 'a1')
+            # A socket of a process that died without disconnecting
+            presence._local.clear()
+            await asyncio.sleep(0.1)
+        asyncio.run(run())
+        publish.assert_any_await('lobby', left=['alice'], online=0)
+
+
+class ShardedLayerTests(SimpleTestCase):
+    def test_group_send_reaches_members_across_shards(self):
+        layer = ShardedInMemoryChannelLayer(shards=4)
+
+        async def run():
+            channels = [await layer.new_channel() for _ in range(20)]
+            for channel in channels:
+                await layer.group_add('chat_lobby', channel)
+            await layer.group_discard('chat_lobby', channels[0])
+            await layer.group_send('chat_lobby', {'type': 'chat.message', 'frame': 'hi'})
+
+            received = [await layer.receive(channel) for channel in channels[1:]]
+            self.assertEqual({message['frame'] for message in received}, {'hi'})
+            # One copy shared by every member
+            self.assertEqual(len({id(message) for message in received}), 1)
+            self.assertEqual(layer.stats()['backlog'], 0)
+        asyncio.run(run())
+
+    def test_full_channels_are_skipped(self):
+        layer = ShardedInMemoryChannelLayer(capacity=1)
+
+        async def run():
+            slow, fast = await layer.new_channel(), await layer.new_channel()
+            await layer.group_add('chat_lobby', slow)
+            await layer.group_add('chat_lobby', fast)
+            await layer.group_send('chat_lobby', {'type': 'chat.message', 'n': 1})
+            await layer.receive(fast)
+            await layer.group_send('chat_lobby', {'type': 'chat.message', 'n': 2})
+
+            self.assertEqual((await layer.receive(fast))['n'], 2)
+            self.assertEqual((await layer.receive(slow))['n'], 1)
+            self.assertEqual(layer.dropped, 1)
+            await layer.send(slow, {'type': 'chat.message'})
+            with self.assertRaises(ChannelFull):
+                await layer.send(slow, {'type': 'chat.message'})
+        asyncio.run(run())
+
+    @mock.patch('chat.layers.time')
+    def test_expired_messages_are_swept_with_their_memberships(self, clock):
+        layer = ShardedInMemoryChannelLayer(expiry=60, shards=1)
+
+        async def run():
+            clock.time.return_value = clock.monotonic.return_value = 1000
+            layer._next_sweep = 1000 + layer._sweep_interval
+            idle = await layer.new_channel()
+            await layer.group_add('chat_lobby', idle)
+            await layer.group_send('chat_lobby', {'type': 'chat.message'})
+
+            clock.time.return_value = clock.monotonic.return_value = 1061
+            await layer.group_send('chat_lobby', {'type': 'chat.message'})
+            self.assertEqual(layer.dropped, 1)
+            self.assertEqual(layer.stats()['channels'], 0)
+            self.assertNotIn('chat_lobby', layer._shards[0].groups)
+        asyncio.run(run())
+
+
+class RoomBatcherTests(SimpleTestCase):
+    def batcher(self, **kwargs):
+        layer = mock.Mock(group_send=mock.AsyncMock())
+        return RoomBatcher(layer, 'chat_lobby', 'lobby', **kwargs), layer.group_send
+
+    def test_quiet_rooms_publish_each_message(self):
+        batcher, group_send = self.batcher(min_rate=20)
+        asyncio.run(batcher.send('{"n":1}', 0))
+        group_send.assert_awaited_once_with('chat_lobby', {'type': 'chat_message', 'frame': '{"n":1}'})
+
+    def test_busy_rooms_flush_one_batch_per_window(self):
+        batcher, group_send = self.batcher(min_rate=2, window=0.01)
+
+        async def run():
+            for n in range(5):
+                await batcher.send(f'{{"n":{n}}}', 0)
+            await asyncio.sleep(0.05)
+        asyncio.run(run())
+
+        events = [call.args[1] for call in group_send.await_args_list]
+        self.assertEqual([event['type'] for event in events], ['chat_message', 'chat_batch'])
+        self.assertEqual(events[1]['frames'], ['{"n":1}', '{"n":2}', '{"n":3}', '{"n":4}'])
+
+    def test_full_batch_flushes_without_waiting(self):
+        batcher, group_send = self.batcher(min_rate=0, max_batch=3, window=60)
+
+        async def run():
+            for n in range(3):
+                await batcher.send(f'{{"n":{n}}}', 0)
+        asyncio.run(run())
+        group_send.assert_awaited_once_with(
+            'chat_lobby', {'type': 'chat_batch', 'frames': ['{"n":0}', '{"n":1}', '{"n":2}']},
+        )
+
+    def test_batch_frame_joins_encoded_frames(self):
+        frame = batch_frame(['{"type":"chat_message","id":1}', '{"type":"chat_message","id":2}'])
+        self.assertEqual(json.loads(frame), {
+            'type': 'chat_batch',
+            'messages': [{'type': 'chat_message', 'id': 1}, {'type': 'chat_message', 'id': 2}],
+        })
+
+
+class BatchDeliveryTests(TransactionTestCase):
+    @mock.patch.dict(BATCHING, {'ENABLED': True, 'MIN_RATE': 0, 'WINDOW': 0.1})
+    def test_batch_consumers_get_one_frame_and_others_each_message(self):
+        from backend.asgi import application
+        user = User.objects.create_user('alice')
+        token = str(add_user_claims(AccessToken.for_user(user), user))
+
+        async def connect(query=''):
+            communicator = WebsocketCommunicator(application, f'/ws/chat/lobby/?token={token}{query}')
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            return communicator
+
+        async def frames(communicator):
+            received = []
+            while not await communicator.receive_nothing(0.3):
+                frame = await communicator.receive_json_from()
+                if frame['type'] in ('chat_message', 'chat_batch'):
+                    received.append(frame)
+            return received
+
+        async def run():
+            plain, batched = await connect(), await connect('&batch=1')
+            for n in range(3):
+                await plain.send_json_to({'message': f'message {n}'})
+            result = await frames(plain), await frames(batched)
+            await plain.disconnect()
+            await batched.disconnect()
+            return result
+
+        Room.objects.create(name='lobby', creator=user)
+        plain, batched = asyncio.run(run())
+        self.assertEqual([frame['message'] for frame in plain], ['message 0', 'message 1', 'message 2'])
+        self.assertEqual([frame['type'] for frame in batched], ['chat_batch'])
+        self.assertEqual([message['message'] for message in batched[0]['messages']],
+                         ['message 0', 'message 1', 'message 2'])
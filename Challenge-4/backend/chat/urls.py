@@ -9,4 +9,7 @@ urlpatterns = [
     path('room/<str:room_name>/join/', views.join_room, name='join_room'),
     path('room/<str:room_name>/invite/', views.invite_to_room, name='invite_to_room'),
     path('room/<str:room_name>/participants/', views.room_participants, name='room_participants'),
+    path('search/', views.search_messages, name='search_messages'),
+    path('profiling/', views.profiling_report, name='profiling_report'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
\ No newline at end of file
@@ -1,13 +1,66 @@
-from django.http import JsonResponse
+from functools import wraps
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.models import User
+from django.contrib import admin
 from django.contrib.auth.decorators import login_required
+from django.db import IntegrityError, transaction
+from django.shortcuts import render
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import APIException, NotAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.settings import api_settings
 from .models import Room, Message
+from .authentication import add_user_claims
+from .credentials import authenticate_user, check_registration_limit
+from .loaders import ROOM_ORDERINGS, ROOM_PAGE_MAX, ROOM_PAGE_SIZE, aload_room_page, decode_room_cursor
+from .profiling import JsonResponse, profile_store
+from .metrics import CHAT_METRICS, registry
+from .presence import get_presence
+from .search import SEARCH, find_messages
 import json
-from django.db.models import Q
+
+
+def async_api_view(methods):
+    """
+    @api_view(methods) + @permission_classes([IsAuthenticated]) for ``async
+    def`` views, which DRF 3.14 can't run without a thread hop. The view gets
+    a plain Django request with request.user set by the
+    DEFAULT_AUTHENTICATION_CLASSES, through ``aauthenticate`` where a class
+    has one (ClaimsJWTAuthentication) and on a worker thread otherwise. Errors
+    answer with DRF's status codes and bodies. Like DRF views, these are
+    exempt from CSRF checks, which only protect cookie sessions.
+    """
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse({'detail': f'Method "{request.method}" not allowed.'}, status=405,
+                                    headers={'Allow': ', '.join(methods)})
+            authenticators = [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+            try:
+                for authenticator in authenticators:
+                    if hasattr(authenticator, 'aauthenticate'):
+                        result = await authenticator.aauthenticate(request)
+                    else:
+                        result = await sync_to_async(authenticator.authenticate)(request)
+                    if result is not None:
+                        break
+                else:
+                    raise NotAuthenticated()
+            except APIException as exc:
+                detail = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+                return JsonResponse(detail, status=exc.status_code,
+                                    headers={'WWW-Authenticate': authenticators[0].authenticate_header(request)})
+            request.user, request.auth = result
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
 
 @api_view(['POST'])
 def register_user(request):
@@ -18,14 +71,19 @@ def register_user(request):
     if not username or not password:
         return JsonResponse({'error': 'Username and password are required'}, status=400)
     
+    check_registration_limit(request)
     try:
-        user = User.objects.create_user(username=username, password=password)
-        refresh = RefreshToken.for_user(user)
+        # A taken username fails on the unique constraint, without a lookup first
+        with transaction.atomic():
+            user = User.objects.create_user(username=username, password=password)
+        refresh = add_user_claims(RefreshToken.for_user(user), user)
         return JsonResponse({
             'status': 'success',
             'access_token': str(refresh.access_token),
             'refresh_token': str(refresh)
         })
+    except IntegrityError:
+        return JsonResponse({'error': 'Username already exists'}, status=400)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
 
@@ -35,23 +93,24 @@ def login_user(request):
     username = data.get('username')
     password = data.get('password')
     
-    try:
-        user = User.objects.get(username=username)
-        if user.check_password(password):
-            refresh = RefreshToken.for_user(user)
-            return JsonResponse({
-                'status': 'success',
-                'access_token': str(refresh.access_token),
-                'refresh_token': str(refresh)
-            })
-        else:
-            return JsonResponse({'error': 'Invalid credentials'}, status=401)
-    except User.DoesNotExist:
+    if not username or not password:
+        return JsonResponse({'error': 'Username and password are required'}, status=400)
+    
+    user, outcome = authenticate_user(request, username, password)
+    if outcome == 'success':
+        refresh = add_user_claims(RefreshToken.for_user(user), user)
+        return JsonResponse({
+            'status': 'success',
+            'access_token': str(refresh.access_token),
+            'refresh_token': str(refresh)
+        })
+    elif outcome == 'unknown_user':
         return JsonResponse({'error': 'User not found'}, status=404)
+    else:
+        return JsonResponse({'error': 'Invalid credentials'}, status=401)
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def create_room(request):
+@async_api_view(['POST'])
+async def create_room(request):
     data = json.loads(request.body)
     room_name = data.get('room_name')
     privacy = data.get('privacy', 'public')
@@ -60,12 +119,12 @@ def create_room(request):
         return JsonResponse({'status': 'error', 'message': 'Room name is required'}, status=400)
     
     try:
-        room = Room.objects.create(
+        room = await Room.objects.acreate(
             name=room_name,
             privacy=privacy,
             creator=request.user
         )
-        room.participants.add(request.user)
+        await room.participants.aadd(request.user)
         return JsonResponse({
             'status': 'success',
             'room': {
@@ -79,100 +138,155 @@ def create_room(request):
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def list_rooms(request):
-    # Get public rooms and private rooms where user is a participant
-    # Using Q objects to combine filters instead of union which causes ORDER BY issues
-    rooms = Room.objects.filter(
-        Q(privacy='public') | 
-        Q(privacy='private', participants=request.user)
-    ).distinct()
-    
-    return JsonResponse({
-        'rooms': [{
-            'id': room.id,
-            'name': room.name,
-            'privacy': room.privacy,
-            'creator': room.creator.username,
-            'created_at': room.created_at.isoformat(),
-            'participant_count': room.participants.count()
-        } for room in rooms]
-    })
+@async_api_view(['GET'])
+async def list_rooms(request):
+    # Public rooms and private rooms where user is a participant, one page at a time
+    sort = request.GET.get('sort', 'name')
+    if sort not in ROOM_ORDERINGS:
+        return JsonResponse({'error': f'sort must be one of: {", ".join(ROOM_ORDERINGS)}'}, status=400)
+    try:
+        limit = min(max(int(request.GET.get('limit', ROOM_PAGE_SIZE)), 1), ROOM_PAGE_MAX)
+        cursor = request.GET.get('cursor')
+        after = decode_room_cursor(sort, cursor) if cursor else None
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit or cursor'}, status=400)
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def join_room(request, room_name):
+    rooms, next_cursor = await aload_room_page(
+        request.user, sort, prefix=request.GET.get('q', ''), after=after, limit=limit
+    )
+    online = await get_presence().acounts(room['name'] for room in rooms)
+    for room in rooms:
+        room['online_count'] = online[room['name']]
+    return JsonResponse({'rooms': rooms, 'next_cursor': next_cursor})
+
+@async_api_view(['POST'])
+async def join_room(request, room_name):
     try:
-        room = Room.objects.get(name=room_name)
-        
-        # Check if user can join
-        if room.privacy == 'private' and request.user not in room.participants.all():
-            return JsonResponse({
-                'status': 'error',
-                'message': 'This is a private room. You need an invitation to join.'
-            }, status=403)
-        
-        room.participants.add(request.user)
-        return JsonResponse({'status': 'success', 'room_name': room_name})
+        room = await Room.objects.aget(name=room_name)
     except Room.DoesNotExist:
         return JsonResponse({
             'status': 'error',
             'message': 'Room not found'
         }, status=404)
+    
+    # Check if user can join
+    if room.privacy == 'private' and not await room.participants.filter(pk=request.user.pk).aexists():
+        return JsonResponse({
+            'status': 'error',
+            'message': 'This is a private room. You need an invitation to join.'
+        }, status=403)
+    
+    await room.participants.aadd(request.user)
+    return JsonResponse({'status': 'success', 'room_name': room_name})
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def invite_to_room(request, room_name):
+@async_api_view(['POST'])
+async def invite_to_room(request, room_name):
     try:
-        room = Room.objects.get(name=room_name)
-        
-        # Only creator or participants can invite others
-        if request.user != room.creator and request.user not in room.participants.all():
-            return JsonResponse({
-                'status': 'error',
-                'message': 'You do not have permission to invite users to this room'
-            }, status=403)
-        
-        data = json.loads(request.body)
-        username = data.get('username')
+        room = await Room.objects.aget(name=room_name)
+    except Room.DoesNotExist:
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Room not found'
+        }, status=404)
+    
+    # Only creator or participants can invite others
+    if request.user.pk != room.creator_id and not await room.participants.filter(pk=request.user.pk).aexists():
+        return JsonResponse({
+            'status': 'error',
+            'message': 'You do not have permission to invite users to this room'
+        }, status=403)
+    
+    data = json.loads(request.body)
+    username = data.get('username')
+    
+    if not username:
+        return JsonResponse({'status': 'error', 'message': 'Username is required'}, status=400)
         
-        if not username:
-            return JsonResponse({'status': 'error', 'message': 'Username is required'}, status=400)
-            
-        try:
-            user = User.objects.get(username=username)
-            room.participants.add(user)
-            return JsonResponse({'status': 'success', 'message': f'Invited {username} to the room'})
-        except User.DoesNotExist:
-            return JsonResponse({'status': 'error', 'message': 'User not found'}, status=404)
-            
+    try:
+        user = await User.objects.aget(username=username)
+    except User.DoesNotExist:
+        return JsonResponse({'status': 'error', 'message': 'User not found'}, status=404)
+    await room.participants.aadd(user)
+    return JsonResponse({'status': 'success', 'message': f'Invited {username} to the room'})
+
+@async_api_view(['GET'])
+async def room_participants(request, room_name):
+    try:
+        room = await Room.objects.aget(name=room_name)
     except Room.DoesNotExist:
         return JsonResponse({
             'status': 'error',
             'message': 'Room not found'
         }, status=404)
+    if room.privacy == 'private' and not await room.participants.filter(pk=request.user.pk).aexists():
+        return JsonResponse({
+            'status': 'error',
+            'message': 'You do not have access to this room'
+        }, status=403)
+        
+    participants = [user async for user in room.participants.only('id', 'username')]
+    online = await get_presence().aonline_user_ids(room_name)
+    return JsonResponse({
+        'participants': [{
+            'username': user.username,
+            'is_creator': user.id == room.creator_id,
+            'online': user.id in online
+        } for user in participants]
+    })
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
-def room_participants(request, room_name):
+def search_messages(request):
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'error': 'q is required'}, status=400)
     try:
-        room = Room.objects.get(name=room_name)
-        if room.privacy == 'private' and request.user not in room.participants.all():
+        limit = min(max(int(request.GET.get('limit', SEARCH['PAGE_SIZE'])), 1), SEARCH['PAGE_MAX'])
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit or page'}, status=400)
+
+    room = None
+    room_name = request.GET.get('room')
+    if room_name:
+        try:
+            room = Room.objects.get(name=room_name)
+        except Room.DoesNotExist:
+            return JsonResponse({
+                'status': 'error',
+                'message': 'Room not found'
+            }, status=404)
+        if room.privacy == 'private' and not room.participants.filter(pk=request.user.pk).exists():
             return JsonResponse({
                 'status': 'error',
                 'message': 'You do not have access to this room'
             }, status=403)
-            
-        participants = room.participants.all()
-        return JsonResponse({
-            'participants': [{
-                'username': user.username,
-                'is_creator': user == room.creator
-            } for user in participants]
-        })
-    except Room.DoesNotExist:
-        return JsonResponse({
-            'status': 'error',
-            'message': 'Room not found'
-        }, status=404)
+
+    results, has_next = find_messages(request.user, query, room=room, page=page, limit=limit)
+    return JsonResponse({
+        'results': results,
+        'next_page': page + 1 if has_next else None,
+        'previous_page': page - 1 if page > 1 else None,
+    })
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def profiling_report(request):
+    return JsonResponse(profile_store.report())
+
+def profiling_admin(request):
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Request profiling',
+        'report': profile_store.report(),
+    }
+    return render(request, 'admin/profiling_report.html', context)
+
+def metrics(request):
+    # Scraped by Prometheus rather than a user, so it takes a static bearer token instead of
+    # a JWT. Staff can also read it with their admin session; nobody else can.
+    token = CHAT_METRICS['TOKEN']
+    scraper = token and constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not (scraper or request.user.is_staff):
+        return HttpResponse(status=401, headers={'WWW-Authenticate': 'Bearer'})
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
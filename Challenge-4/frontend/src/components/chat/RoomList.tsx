@@ -15,9 +15,14 @@ interface RoomListProps {
   onJoinRoom: (roomName: string, privacy: 'public' | 'private') => void;
 }
 
+// Rooms fetched per page of the paginated room list
+const ROOM_PAGE_SIZE = 50;
+
 export function RoomList({ token, onJoinRoom }: RoomListProps) {
   const [rooms, setRooms] = useState<Room[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState<string | null>(null);
   const [isCreateModalOpen, setIsCreateModalOpen] = useState(false);
   const [isRequestModalOpen, setIsRequestModalOpen] = useState(false);
@@ -27,28 +32,32 @@ export function RoomList({ token, onJoinRoom }: RoomListProps) {
   const [selectedRoom, setSelectedRoom] = useState<Room | null>(null);
   const [searchQuery, setSearchQuery] = useState('');
 
-  const fetchRooms = useCallback(async () => {
+  // Loads the first page of rooms, or the page after `cursor` appended to the list
+  const fetchRooms = useCallback(async (cursor: string | null = null) => {
+    const setBusy = cursor ? setLoadingMore : setLoading;
     try {
-      setLoading(true);
+      setBusy(true);
       setError(null);
-      const response = await fetch('http://localhost:8000/chat/rooms/', {
+      const params = new URLSearchParams({ limit: String(ROOM_PAGE_SIZE) });
+      if (cursor) params.set('cursor', cursor);
+      const response = await fetch(`http://localhost:8000/chat/rooms/?${params}`, {
         headers: {
           'Authorization': `Bearer ${token}`
         }
       });
-      
+
+      const data = await response.json();
       if (response.ok) {
-        const data = await response.json();
-        setRooms(data.rooms);
+        setRooms(current => cursor ? [...current, ...data.rooms] : data.rooms);
+        setNextCursor(data.next_cursor);
       } else {
-        const data = await response.json();
-        setError(data.message || 'Failed to fetch rooms');
+        setError(data.message || data.error || 'Failed to fetch rooms');
       }
     } catch (err) {
       console.error('Failed to fetch rooms:', err);
       setError('Network error: Unable to fetch rooms');
     } finally {
-      setLoading(false);
+      setBusy(false);
     }
   }, [token]);
 
@@ -190,7 +199,7 @@ export function RoomList({ token, onJoinRoom }: RoomListProps) {
             </svg>
           </div>
           <button 
-            onClick={fetchRooms}
+            onClick={() => fetchRooms()}
             className="flex items-center gap-2 bg-gray-100 hover:bg-gray-200 text-gray-800 px-4 py-2 rounded-md transition-colors"
           >
             <ArrowPathIcon className="h-4 w-4" />
@@ -274,6 +283,18 @@ export function RoomList({ token, onJoinRoom }: RoomListProps) {
             ))}
           </div>
         )}
+        {/* Later pages are only fetched when asked for */}
+        {!loading && nextCursor && (
+          <div className="p-4 border-t border-gray-200 text-center">
+            <button
+              onClick={() => fetchRooms(nextCursor)}
+              disabled={loadingMore}
+              className="px-4 py-2 bg-gray-100 hover:bg-gray-200 text-gray-800 rounded-md transition-colors disabled:opacity-50"
+            >
+              {loadingMore ? 'Loading...' : 'Load more rooms'}
+            </button>
+          </div>
+        )}
       </div>
 
       {/* Create Room Modal */}
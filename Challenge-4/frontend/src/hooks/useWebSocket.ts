@@ -56,6 +56,9 @@ export function useWebSocket(token: string | null, roomName: string) {
       ws.onclose = (event) => {
         console.log(`WebSocket closed with code: ${event.code}, reason: ${event.reason}`);
         setConnectionStatus('closed');
+
+        // The room doesn't exist (4404) or is private (4403): retrying won't help
+        if (event.code === 4404 || event.code === 4403) return;
         
         // Attempt reconnection if we haven't exceeded max attempts
         if (reconnectAttemptsRef.current < maxReconnectAttempts) {
@@ -0,0 +1,5 @@
+"""
+In-process load tests for the four challenge backends.
+
+Run ``python -m benchmarks --help`` from the repository root.
+"""
@@ -0,0 +1,44 @@
+import argparse
+import importlib
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+TARGETS = ['tasks', 'accounts', 'blog', 'chat']
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description='Seed a throwaway database for one backend, drive its endpoints '
+                    'in-process and print a JSON report.',
+    )
+    parser.add_argument('target', choices=TARGETS + ['all'])
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='Multiplier for the seeded dataset sizes (default: 1.0)')
+    parser.add_argument('--output', type=Path,
+                        help='Write the report here instead of stdout; a directory for "all"')
+    args = parser.parse_args()
+
+    if args.target == 'all':
+        # Every project has its own settings module, so each runs in its own process
+        if args.output:
+            args.output.mkdir(parents=True, exist_ok=True)
+        for target in TARGETS:
+            command = [sys.executable, '-m', 'benchmarks', target, '--scale', str(args.scale)]
+            if args.output:
+                command += ['--output', str(args.output / f'{target}.json')]
+            subprocess.run(command, check=True)
+        return
+
+    module = importlib.import_module(f'benchmarks.{args.target}')
+    report = json.dumps(module.run(args.scale), indent=2)
+    if args.output:
+        args.output.write_text(report + '\n')
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Challenge 2: JWT registration, login and protected endpoints."""
+from .harness import Recorder, make_client, new_report, setup_django, timed_seed
+
+PROJECT = 'Challenge-2'
+SETTINGS = 'backend.settings'
+PASSWORD = 'bench-Password-123'
+# Login attempts in each attack-mix scenario; every one that reaches the
+# password hasher costs a full PBKDF2 run, so this is not scaled
+ATTACK_ATTEMPTS = 200
+
+
+def run(scale):
+    teardown = setup_django(PROJECT, SETTINGS)
+    try:
+        from django.contrib.auth.hashers import make_password
+        from django.contrib.auth.models import User
+
+        report = new_report('accounts', scale)
+
+        with timed_seed(report, 'users') as counts:
+            # Hash once and share it; hashing every seeded user would dominate the run
+            password = make_password(PASSWORD)
+            total = int(10_000 * scale)
+            User.objects.bulk_create([
+                User(username=f'user{i}', email=f'user{i}@example.com', password=password)
+                for i in range(total)
+            ], batch_size=5000)
+            counts['users'] = total
+
+        client = make_client()
+        scenarios = report['scenarios']
+
+        with Recorder('register') as rec:
+            for i in range(20):
+                with rec.measure():
+                    # From distinct clients; registrations are rate limited per address
+                    rec.check(client.post('/api/auth/register/', {
+                        'username': f'new{i}', 'email': f'new{i}@example.com',
+                        'password': PASSWORD, 'password2': PASSWORD,
+                    }, REMOTE_ADDR=f'198.51.100.{i}'))
+        scenarios.append(rec.report())
+
+        tokens = []
+        with Recorder('login') as rec:
+            for i in range(20):
+                with rec.measure():
+                    response = rec.check(client.post('/api/auth/login/', {'username': f'user{i}', 'password': PASSWORD}))
+                tokens.append(response.json())
+        scenarios.append(rec.report())
+
+        with Recorder('login, wrong password') as rec:
+            for i in range(20):
+                with rec.measure():
+                    rec.check(client.post('/api/auth/login/', {'username': f'user{i}', 'password': 'wrong'}),
+                              expected=(401,))
+        scenarios.append(rec.report())
+
+        from accounts.credentials import AUTH_RATE_LIMIT
+        for enabled in (False, True):
+            AUTH_RATE_LIMIT['ENABLED'] = enabled
+            scenarios.append(login_under_attack(
+                client, 'login under attack, ' + ('rate limited' if enabled else 'no rate limit'), total,
+            ))
+
+        with Recorder('refresh') as rec:
+            for pair in tokens:
+                with rec.measure():
+                    rec.check(client.post('/api/auth/refresh/', {'refresh': pair['refresh']}))
+        scenarios.append(rec.report())
+
+        with Recorder('protected endpoint') as rec:
+            for i in range(500):
+                access = tokens[i % len(tokens)]['access']
+                with rec.measure():
+                    rec.check(client.get('/api/auth/test/', HTTP_AUTHORIZATION=f'Bearer {access}'))
+        scenarios.append(rec.report())
+
+        with Recorder('logout') as rec:
+            for pair in tokens:
+                with rec.measure():
+                    rec.check(client.post('/api/auth/logout/', {'refresh': pair['refresh']},
+                                          HTTP_AUTHORIZATION=f'Bearer {pair["access"]}'))
+        scenarios.append(rec.report())
+
+        with Recorder('refresh, blacklisted token') as rec:
+            for pair in tokens:
+                with rec.measure():
+                    rec.check(client.post('/api/auth/refresh/', {'refresh': pair['refresh']}), expected=(401,))
+        scenarios.append(rec.report())
+
+        return report
+    finally:
+        teardown()
+
+
+def login_under_attack(client, name, users):
+    """
+    One legitimate login for every nine credential-stuffing attempts. Users
+    log in from their own addresses. The attackers share two addresses and
+    try a different username and password each time.
+    """
+    succeeded = rate_limited = 0
+    with Recorder(name, attempts=ATTACK_ATTEMPTS) as rec:
+        for i in range(ATTACK_ATTEMPTS):
+            if i % 10 == 0:
+                user = i // 10 % users
+                credentials = {'username': f'user{user}', 'password': PASSWORD}
+                address, expected = f'192.0.2.{user % 250}', (200,)
+            else:
+                credentials = {'username': f'user{i * 7 % users}', 'password': f'guess{i}'}
+                address, expected = f'203.0.113.{i % 2}', (401, 429)
+            with rec.measure():
+                response = rec.check(client.post('/api/auth/login/', credentials, REMOTE_ADDR=address), expected)
+            succeeded += response.status_code == 200
+            rate_limited += response.status_code == 429
+    report = rec.report()
+    report['successful_logins'] = succeeded
+    report['successful_logins_per_sec'] = round(succeeded / rec.elapsed, 2)
+    report['rate_limited'] = rate_limited
+    return report
@@ -0,0 +1,91 @@
+"""Challenge 3: the blog API."""
+from .harness import Recorder, make_client, new_report, setup_django, timed_seed
+
+PROJECT = 'Challenge-3/backend'
+SETTINGS = 'core.settings'
+PASSWORD = 'bench-Password-123'
+
+
+def run(scale):
+    teardown = setup_django(PROJECT, SETTINGS)
+    try:
+        from django.contrib.auth.hashers import make_password
+        from django.contrib.auth.models import User
+        from django.core.cache import caches
+        from blog.cache import CACHE_ALIAS
+        from blog.models import Post, Comment
+
+        report = new_report('blog', scale)
+
+        with timed_seed(report, 'blog') as counts:
+            password = make_password(PASSWORD)
+            users = User.objects.bulk_create([
+                User(username=f'user{i}', email=f'user{i}@example.com', password=password)
+                for i in range(int(1_000 * scale) or 1)
+            ], batch_size=5000)
+            posts = Post.objects.bulk_create([
+                Post(title=f'Post {i}', content='lorem ipsum ' * 50, author=users[i % len(users)])
+                for i in range(int(20_000 * scale) or 1)
+            ], batch_size=5000)
+            Comment.objects.bulk_create([
+                Comment(post=posts[i % len(posts)], author=users[i % len(users)], content=f'comment {i}')
+                for i in range(int(200_000 * scale))
+            ], batch_size=5000)
+            counts.update(users=len(users), posts=len(posts), comments=Comment.objects.count())
+
+        client = make_client()
+        post_ids = [post.id for post in posts[:200]]
+        scenarios = report['scenarios']
+        cache = caches[CACHE_ALIAS]
+
+        cache.clear()
+        with Recorder('feed first page, cold cache') as rec:
+            for _ in range(50):
+                cache.clear()
+                with rec.measure():
+                    rec.check(client.get('/api/posts/'))
+        scenarios.append(rec.report())
+
+        with Recorder('feed first page, warm cache') as rec:
+            for _ in range(200):
+                with rec.measure():
+                    rec.check(client.get('/api/posts/'))
+        scenarios.append(rec.report())
+
+        with Recorder('feed walk 50 pages') as rec:
+            url = '/api/posts/'
+            for _ in range(50):
+                with rec.measure():
+                    data = rec.check(client.get(url)).json()
+                if not data['next']:
+                    break
+                url = data['next']
+        scenarios.append(rec.report())
+
+        with Recorder('post detail') as rec:
+            for post_id in post_ids:
+                with rec.measure():
+                    rec.check(client.get(f'/api/posts/{post_id}/'))
+        scenarios.append(rec.report())
+
+        with Recorder('post comments page') as rec:
+            for post_id in post_ids:
+                with rec.measure():
+                    rec.check(client.get(f'/api/posts/{post_id}/comments/'))
+        scenarios.append(rec.report())
+
+        with Recorder('add comment') as rec:
+            for post_id in post_ids[:100]:
+                with rec.measure():
+                    rec.check(client.post(f'/api/posts/{post_id}/comments/', {'content': 'benchmark'}))
+        scenarios.append(rec.report())
+
+        with Recorder('login') as rec:
+            for i in range(10):
+                with rec.measure():
+                    rec.check(client.post('/api/auth/login/', {'username': f'user{i % len(users)}', 'password': PASSWORD}))
+        scenarios.append(rec.report())
+
+        return report
+    finally:
+        teardown()
@@ -0,0 +1,262 @@
+"""Challenge 4: the chat REST API and ChatConsumer over WebSockets."""
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+from .harness import Recorder, make_client, new_report, percentile, setup_django, timed_seed
+
+PROJECT = 'Challenge-4/backend'
+SETTINGS = 'backend.settings'
+
+# Redis is not needed in-process; the single-node layer keeps runs self-contained
+IN_MEMORY_LAYER = {'default': {'BACKEND': 'chat.layers.ShardedInMemoryChannelLayer'}}
+
+
+def run(scale, clients=50, messages_per_client=20):
+    # On disk: the mixed load reads rooms over HTTP while consumers write message counters
+    teardown = setup_django(
+        PROJECT, SETTINGS, test_database=Path(tempfile.gettempdir()) / 'bench_chat.sqlite3',
+        CHANNEL_LAYERS=IN_MEMORY_LAYER, CHAT_PRESENCE={'BACKEND': 'memory'},
+    )
+    try:
+        from django.contrib.auth.models import User
+        from django.utils import timezone
+        from rest_framework_simplejwt.tokens import AccessToken
+        from chat.authentication import add_user_claims
+        from chat.counters import recompute_room_counters
+        from chat.models import Room, Message
+
+        report = new_report('chat', scale)
+
+        with timed_seed(report, 'chat') as counts:
+            users = User.objects.bulk_create([User(username=f'user{i}') for i in range(max(clients, int(1_000 * scale)))])
+            # Every fourth room is private, but not the busy rooms[0] every client connects to
+            rooms = Room.objects.bulk_create([
+                Room(name=f'room{i}', creator=users[i % len(users)], privacy='private' if i % 4 == 1 else 'public')
+                for i in range(int(1_000 * scale) or 1)
+            ])
+            Membership = Room.participants.through
+            Membership.objects.bulk_create([
+                Membership(room_id=room.id, user_id=users[(room.id + j) % len(users)].id)
+                for room in rooms for j in range(10)
+            ], batch_size=5000, ignore_conflicts=True)
+
+            # Most traffic lands in one busy room, the rest is spread out
+            now = timezone.now()
+            total = int(1_000_000 * scale)
+            batch = []
+            for i in range(total):
+                room = rooms[0] if i % 2 else rooms[i % len(rooms)]
+                batch.append(Message(room=room, user=users[i % len(users)], content=f'message {i}',
+                                     timestamp=now - timezone.timedelta(milliseconds=total - i)))
+                if len(batch) == 10_000:
+                    Message.objects.bulk_create(batch)
+                    batch = []
+            Message.objects.bulk_create(batch)
+            # bulk_create skips the signals that maintain the room counters
+            recompute_room_counters(Room.objects.all())
+            counts.update(users=len(users), rooms=len(rooms), messages=total)
+
+        # Signed the way chat's login does, so HTTP requests take the claims path
+        tokens = [str(add_user_claims(AccessToken.for_user(user), user)) for user in users[:clients]]
+        scenarios = report['scenarios']
+        run_http(scenarios, rooms, users, tokens)
+        busy_room = rooms[0].name
+        asyncio.run(run_websockets(scenarios, busy_room, tokens, messages_per_client))
+        mount_sync_list_rooms()
+        for path, view in (('/chat/rooms/', 'async view'), ('/chat/rooms-sync/', 'sync DRF view')):
+            asyncio.run(run_mixed_load(scenarios, f'mixed load, list rooms ({view})', path, busy_room, tokens))
+        return report
+    finally:
+        teardown()
+
+
+def run_http(scenarios, rooms, users, tokens):
+    client = make_client(HTTP_AUTHORIZATION=f'Bearer {tokens[0]}')
+    public_rooms = [room.name for room in rooms if room.privacy == 'public'][:200]
+
+    with Recorder('list rooms') as rec:
+        for _ in range(50):
+            with rec.measure():
+                rec.check(client.get('/chat/rooms/'))
+    scenarios.append(rec.report())
+
+    with Recorder('list rooms by activity') as rec:
+        for _ in range(50):
+            with rec.measure():
+                rec.check(client.get('/chat/rooms/?sort=activity'))
+    scenarios.append(rec.report())
+
+    with Recorder('room participants') as rec:
+        for name in public_rooms:
+            with rec.measure():
+                rec.check(client.get(f'/chat/room/{name}/participants/'))
+    scenarios.append(rec.report())
+
+    with Recorder('join room') as rec:
+        for name in public_rooms:
+            with rec.measure():
+                rec.check(client.post(f'/chat/room/{name}/join/'))
+    scenarios.append(rec.report())
+
+    with Recorder('create room') as rec:
+        for i in range(100):
+            with rec.measure():
+                rec.check(client.post('/chat/room/create/', json.dumps({'room_name': f'bench{i}'}),
+                                      content_type='application/json'))
+    scenarios.append(rec.report())
+
+
+async def connect(room_name, token):
+    from channels.testing import WebsocketCommunicator
+    from backend.asgi import application
+
+    communicator = WebsocketCommunicator(application, f'/ws/chat/{room_name}/?token={token}')
+    connected, _ = await communicator.connect(timeout=30)
+    if connected:
+        # Presence snapshot, then the chat history snapshot
+        while (await communicator.receive_json_from(timeout=30))['type'] != 'chat_history':
+            pass
+    return communicator, connected
+
+
+async def run_websockets(scenarios, room_name, tokens, messages_per_client):
+    with Recorder('websocket connect + history', clients=len(tokens)) as rec:
+        async def timed_connect(token):
+            start = time.perf_counter()
+            communicator, connected = await connect(room_name, token)
+            rec.add(time.perf_counter() - start)
+            if not connected:
+                rec.errors += 1
+            return communicator
+
+        communicators = await asyncio.gather(*(timed_connect(token) for token in tokens))
+    scenarios.append(rec.report())
+
+    # Every client sends its messages one at a time and waits for its own echo,
+    # draining everyone else's broadcasts in the meantime
+    with Recorder('websocket broadcast round trip', clients=len(communicators),
+                  messages_per_client=messages_per_client,
+                  deliveries=len(communicators) ** 2 * messages_per_client) as rec:
+        async def chat(index, communicator):
+            for seq in range(messages_per_client):
+                text = f'{index}:{seq}'
+                start = time.perf_counter()
+                await communicator.send_json_to({'message': text})
+                while True:
+                    event = await communicator.receive_json_from(timeout=60)
+                    if event.get('message') == text:
+                        rec.add(time.perf_counter() - start)
+                        break
+
+        await asyncio.gather(*(chat(index, communicator) for index, communicator in enumerate(communicators)))
+    scenarios.append(rec.report())
+
+    await asyncio.gather(*(communicator.disconnect() for communicator in communicators))
+
+
+def mount_sync_list_rooms():
+    """
+    Mount list_rooms as it was before the async views, a synchronous DRF
+    view, at /chat/rooms-sync/ as the baseline for the mixed-load scenarios.
+    """
+    from django.http import JsonResponse
+    from django.urls import clear_url_caches, path
+    from rest_framework.decorators import api_view, permission_classes
+    from rest_framework.permissions import IsAuthenticated
+    from chat import urls
+    from chat.loaders import load_room_page
+    from chat.presence import get_presence
+
+    @api_view(['GET'])
+    @permission_classes([IsAuthenticated])
+    def list_rooms_sync(request):
+        rooms, next_cursor = load_room_page(request.user)
+        online = get_presence().counts(room['name'] for room in rooms)
+        for room in rooms:
+            room['online_count'] = online[room['name']]
+        return JsonResponse({'rooms': rooms, 'next_cursor': next_cursor})
+
+    urls.urlpatterns.append(path('rooms-sync/', list_rooms_sync))
+    clear_url_caches()
+
+
+async def asgi_get(path, token):
+    """Send one GET through the project's ASGI application, as a server would; returns the status."""
+    from backend.asgi import application
+
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'localhost'), (b'authorization', f'Bearer {token}'.encode())],
+        'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+    }
+    responded = asyncio.Event()
+    request_sent = False
+    status = None
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await responded.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+        elif not message.get('more_body'):
+            responded.set()
+
+    await application(scope, receive, send)
+    return status
+
+
+async def run_mixed_load(scenarios, name, path, room_name, tokens, requests=500, concurrency=25, chatters=20):
+    """
+    Time ``requests`` concurrent GETs of ``path``, ``concurrency`` at a time,
+    while ``chatters`` WebSocket clients keep sending messages to one room.
+    """
+    chatters = [communicator for communicator, connected in
+                await asyncio.gather(*(connect(room_name, token) for token in tokens[:chatters])) if connected]
+    stop = asyncio.Event()
+    round_trips = []
+
+    async def chat(index, communicator):
+        seq = 0
+        while not stop.is_set():
+            text = f'mixed {index}:{seq}'
+            start = time.perf_counter()
+            await communicator.send_json_to({'message': text})
+            while (await communicator.receive_json_from(timeout=60)).get('message') != text:
+                pass
+            round_trips.append(time.perf_counter() - start)
+            seq += 1
+
+    chatting = [asyncio.create_task(chat(index, communicator)) for index, communicator in enumerate(chatters)]
+    slots = asyncio.Semaphore(concurrency)
+    with Recorder(name, concurrency=concurrency, websocket_clients=len(chatters)) as rec:
+        async def get(i):
+            async with slots:
+                start = time.perf_counter()
+                status = await asgi_get(path, tokens[i % len(tokens)])
+                rec.add(time.perf_counter() - start)
+                if status != 200:
+                    rec.errors += 1
+
+        await asyncio.gather(*(get(i) for i in range(requests)))
+    stop.set()
+    await asyncio.gather(*chatting)
+    await asyncio.gather(*(communicator.disconnect() for communicator in chatters))
+
+    report = rec.report()
+    round_trips.sort()
+    report['websocket_messages'] = len(round_trips)
+    report['websocket_round_trip_ms'] = {
+        'p50': round(percentile(round_trips, 50) * 1000, 3),
+        'p95': round(percentile(round_trips, 95) * 1000, 3),
+    }
+    scenarios.append(report)
@@ -0,0 +1,177 @@
+"""
+Shared plumbing for the benchmark targets: bootstrapping one of the Django
+projects in-process on a throwaway test database, counting queries across
+threads, and turning raw timings into the JSON report.
+"""
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+def setup_django(project_dir, settings_module, test_database=None, **overrides):
+    """
+    Import and configure one of the challenge projects, apply ``overrides`` to
+    its settings and create a fresh test database. Returns a callable that
+    destroys the database again.
+
+    The test database is SQLite in memory unless ``test_database`` names a
+    file. Connections to the in-memory one lock whole tables against each
+    other and fail instead of waiting, so scenarios that read and write from
+    several threads at once need a file.
+    """
+    sys.path.insert(0, str(REPO_ROOT / project_dir))
+    os.environ['DJANGO_SETTINGS_MODULE'] = settings_module
+
+    import django
+    from django.conf import settings
+    django.setup()
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+
+    import logging
+    # 4xx responses are part of several scenarios; keep them out of the output
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+
+    from django.db import connection
+    from django.db.backends.signals import connection_created
+    if test_database is not None:
+        connection.settings_dict['TEST']['NAME'] = str(test_database)
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+    # Count queries on every connection, including the ones opened by
+    # database_sync_to_async worker threads
+    connection_created.connect(_install_query_counter)
+    _install_query_counter(connection=connection)
+
+    return lambda: connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+def make_client(**defaults):
+    from django.test import Client
+    # Some projects leave ALLOWED_HOSTS empty in development, which only admits localhost
+    return Client(SERVER_NAME='localhost', **defaults)
+
+
+class QueryCounter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.value += 1
+        return execute(sql, params, many, context)
+
+
+query_counter = QueryCounter()
+
+
+def _install_query_counter(connection, **kwargs):
+    if query_counter not in connection.execute_wrappers:
+        connection.execute_wrappers.append(query_counter)
+
+
+def peak_rss_kb():
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    """Collects per-operation latencies for one scenario."""
+
+    def __init__(self, name, **details):
+        self.name = name
+        self.details = details
+        self.latencies = []
+        self.errors = 0
+        self._start = None
+        self._queries = 0
+
+    def __enter__(self):
+        self._queries = query_counter.value
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self._start
+        self.queries = query_counter.value - self._queries
+
+    @contextmanager
+    def measure(self):
+        start = time.perf_counter()
+        yield
+        self.latencies.append(time.perf_counter() - start)
+
+    def add(self, seconds):
+        self.latencies.append(seconds)
+
+    def check(self, response, expected=(200, 201, 204)):
+        if response.status_code not in expected:
+            self.errors += 1
+        return response
+
+    def report(self):
+        latencies = sorted(self.latencies)
+        operations = len(latencies)
+        return {
+            'name': self.name,
+            **self.details,
+            'operations': operations,
+            'errors': self.errors,
+            'seconds': round(self.elapsed, 4),
+            'throughput_per_sec': round(operations / self.elapsed, 2) if self.elapsed else 0.0,
+            'latency_ms': {
+                'mean': round(statistics.fmean(latencies) * 1000, 3) if latencies else 0.0,
+                'p50': round(percentile(latencies, 50) * 1000, 3),
+                'p95': round(percentile(latencies, 95) * 1000, 3),
+                'p99': round(percentile(latencies, 99) * 1000, 3),
+                'max': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+            },
+            'queries': {
+                'total': self.queries,
+                'per_operation': round(self.queries / operations, 2) if operations else 0.0,
+            },
+            'peak_rss_kb': peak_rss_kb(),
+        }
+
+
+@contextmanager
+def timed_seed(report, name):
+    start = time.perf_counter()
+    counts = {}
+    yield counts
+    report['seed'][name] = {**counts, 'seconds': round(time.perf_counter() - start, 3)}
+
+
+def new_report(target, scale):
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'target': target,
+        'commit': commit,
+        'python': platform.python_version(),
+        'scale': scale,
+        'seed': {},
+        'scenarios': [],
+    }
@@ -0,0 +1,71 @@
+"""Challenge 1: the to-do list API."""
+import datetime
+import json
+from .harness import Recorder, make_client, new_report, setup_django, timed_seed
+
+PROJECT = 'Challenge-1/backend'
+SETTINGS = 'todo_project.settings'
+
+
+def run(scale):
+    teardown = setup_django(PROJECT, SETTINGS)
+    try:
+        from tasks.models import Task
+
+        report = new_report('tasks', scale)
+        today = datetime.date.today()
+
+        with timed_seed(report, 'tasks') as counts:
+            total = int(100_000 * scale)
+            Task.objects.bulk_create([
+                Task(title=f'Task {i}', description='seeded', due_date=today + datetime.timedelta(days=i % 365),
+                     completed=i % 3 == 0)
+                for i in range(total)
+            ], batch_size=5000)
+            counts['tasks'] = total
+
+        client = make_client()
+        ids = list(Task.objects.values_list('id', flat=True)[:500])
+        scenarios = report['scenarios']
+
+        with Recorder('list all tasks') as rec:
+            for _ in range(5):
+                with rec.measure():
+                    rec.check(client.get('/api/tasks/'))
+        scenarios.append(rec.report())
+
+        with Recorder('retrieve task') as rec:
+            for task_id in ids:
+                with rec.measure():
+                    rec.check(client.get(f'/api/tasks/{task_id}/'))
+        scenarios.append(rec.report())
+
+        with Recorder('create task') as rec:
+            for i in range(200):
+                with rec.measure():
+                    rec.check(client.post('/api/tasks/', {'title': f'New {i}', 'due_date': str(today)},
+                                          content_type='application/json'))
+        scenarios.append(rec.report())
+
+        with Recorder('complete task') as rec:
+            for task_id in ids[:200]:
+                with rec.measure():
+                    rec.check(client.patch(f'/api/tasks/{task_id}/', {'completed': True},
+                                           content_type='application/json'))
+        scenarios.append(rec.report())
+
+        with Recorder('bulk sync 1000 tasks', batch=1000) as rec:
+            for _ in range(3):
+                payload = [{'title': f'Sync {i}', 'due_date': str(today)} for i in range(1000)]
+                with rec.measure():
+                    created = rec.check(client.post('/api/tasks/bulk/', json.dumps(payload),
+                                                    content_type='application/json')).json()
+                    synced = [task['id'] for task in created]
+                    rec.check(client.patch('/api/tasks/bulk/', [{'id': i, 'completed': True} for i in synced],
+                                           content_type='application/json'))
+                    rec.check(client.delete('/api/tasks/bulk/', {'ids': synced}, content_type='application/json'))
+        scenarios.append(rec.report())
+
+        return report
+    finally:
+        teardown()